@@ -0,0 +1,153 @@
+"""
+CPU で ACT を動かすための最適化
+
+ACTPolicy.from_pretrained の後に optimize_policy() をかける。どれも設定で個別に選べる。
+
+- quantize: Linear 層を動的 int8 量子化する (torch.ao.quantization.quantize_dynamic)
+- compile: "torch_compile" (torch.compile) または "torchscript" (torch.jit.trace)。
+  どちらも最初の推論で実際の観測を使って作り、失敗したら通常の実行に戻す
+- num_threads / interop_threads: torch のスレッド数
+
+記録済みの観測 (save_observations で保存したもの) を渡すと、最適化前後の行動チャンクの差
+(正規化された行動空間での絶対誤差) を測り、許容値を超えたら fp32 のポリシーに戻す。
+"""
+
+import copy
+import time
+
+import torch
+from torch import nn
+
+
+def set_threads(num_threads: int = None, interop_threads: int = None):
+    if num_threads:
+        torch.set_num_threads(num_threads)
+    if interop_threads:
+        try:
+            torch.set_num_interop_threads(interop_threads)
+        except RuntimeError as e:
+            # 一度でも並列処理が走った後は変更できない
+            print(f"[ActOptimize] interop threads not changed: {e}")
+
+
+def quantize_linear(model: nn.Module) -> nn.Module:
+    return torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+
+
+class _ActionsOnly(nn.Module):
+    """ACT の forward は (actions, (mu, log_sigma)) を返すので、trace できるよう actions だけにする"""
+
+    def __init__(self, model: nn.Module):
+        super().__init__()
+        self.model = model
+
+    def forward(self, batch):
+        return self.model(batch)[0]
+
+
+class _LazyOptimized(nn.Module):
+    """最初の forward の入力で trace / compile し、以降はそれを使う"""
+
+    def __init__(self, model: nn.Module, method: str):
+        super().__init__()
+        self.model = model
+        self.method = method
+        self._fn = None
+
+    def _build(self, batch):
+        start = time.monotonic()
+        try:
+            if self.method == "torchscript":
+                with torch.inference_mode(False), torch.no_grad():
+                    traced = torch.jit.trace(_ActionsOnly(self.model).eval(), (batch,), strict=False)
+                try:
+                    fn = torch.jit.optimize_for_inference(torch.jit.freeze(traced))
+                except Exception:
+                    # 量子化済みの演算などで freeze できなければ trace のまま使う
+                    fn = traced
+            elif self.method == "torch_compile":
+                fn = torch.compile(_ActionsOnly(self.model).eval(), dynamic=False)
+                fn(batch)
+            else:
+                raise ValueError(f"Unknown compile method: {self.method}")
+            print(f"[ActOptimize] {self.method} ready ({time.monotonic() - start:.1f}s)")
+        except Exception as e:
+            print(f"[ActOptimize] {self.method} failed, running eager: {e}")
+            fn = _ActionsOnly(self.model)
+        self._fn = fn
+
+    def forward(self, batch):
+        if self._fn is None:
+            self._build(batch)
+        return self._fn(batch), (None, None)
+
+
+def optimize_policy(
+    policy,
+    quantize: bool = False,
+    compile: str = None,
+    num_threads: int = None,
+    interop_threads: int = None,
+):
+    """policy.model を置き換えて返す (policy 自体もそのまま使える)"""
+    set_threads(num_threads, interop_threads)
+    policy.eval()
+    if quantize:
+        policy.model = quantize_linear(policy.model)
+    if compile:
+        policy.model = _LazyOptimized(policy.model, compile)
+    print(
+        f"[ActOptimize] quantize={quantize} compile={compile} "
+        f"threads={torch.get_num_threads()}/{torch.get_num_interop_threads()}"
+    )
+    return policy
+
+
+def save_observations(batches, path: str):
+    """select_action に渡る (前処理済みの) 観測のリストを保存する"""
+    torch.save([{k: v.detach().cpu() for k, v in b.items() if torch.is_tensor(v)} for b in batches], path)
+
+
+def load_observations(path: str):
+    return torch.load(path, map_location="cpu")
+
+
+@torch.inference_mode()
+def action_drift(reference, candidate, batches) -> dict:
+    """2 つのポリシーの行動チャンクの差 (正規化された行動空間)"""
+    max_abs, total_abs, count = 0.0, 0.0, 0
+    for batch in batches:
+        expected = reference.predict_action_chunk(dict(batch))
+        actual = candidate.predict_action_chunk(dict(batch))
+        diff = (actual.float() - expected.float()).abs()
+        max_abs = max(max_abs, float(diff.max()))
+        total_abs += float(diff.sum())
+        count += diff.numel()
+    return {"samples": len(batches), "max_abs": max_abs, "mean_abs": total_abs / max(count, 1)}
+
+
+def optimize_with_parity(policy, config: dict, observations=None):
+    """
+    config: {"quantize", "compile", "num_threads", "interop_threads", "parity_tolerance"}
+    observations: 記録済み観測のリストまたはそのパス。None ならパリティ検査をしない
+
+    Returns:
+        (使うポリシー, ドリフトの結果 or None)
+    """
+    config = dict(config)
+    tolerance = config.pop("parity_tolerance", None)
+    if isinstance(observations, str):
+        observations = load_observations(observations)
+    changes_output = config.get("quantize") or config.get("compile")
+    reference = copy.deepcopy(policy) if observations and changes_output else None
+
+    optimized = optimize_policy(policy, **config)
+    if reference is None:
+        return optimized, None
+
+    drift = action_drift(reference, optimized, observations)
+    print(f"[ActOptimize] parity: {drift}")
+    if tolerance is not None and drift["max_abs"] > tolerance:
+        print(f"[ActOptimize] drift {drift['max_abs']:.4f} > {tolerance}, falling back to fp32")
+        return reference, drift
+    return optimized, drift
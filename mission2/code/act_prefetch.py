@@ -0,0 +1,238 @@
+"""
+ACT の行動チャンクを先読みするポリシーラッパー
+
+record_loop は毎 tick policy.select_action() を呼び、ACT は行動キューが空になった tick で
+同期的にチャンクを推論するので、その tick だけ 30 FPS の周期に間に合わない。
+
+ChunkPrefetchPolicy は、実行中のチャンクが残り lead ステップになった時点の観測で
+次のチャンクをワーカースレッドに推論させ、select_action は手元のチャンクから即座に返す。
+新旧のチャンクが重なる区間は次のどれかで合成する:
+
+- "replace":  届いた時点で新しいチャンクに切り替える
+- "linear":   blend_steps tick かけて旧チャンクから新チャンクへ線形に移る
+- "ensemble": ACT の temporal ensembling と同じく、重なっているチャンクを exp(-m * i) で重み付け平均する
+
+チャンクの先頭は「推論に使った観測の tick」の行動なので、届くまでにかかった tick 数だけ
+先に進めた位置から使う。mode="sync" では元の select_action をそのまま呼んで同じ統計だけ取る。
+"""
+
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import torch
+
+
+class ChunkPrefetchPolicy:
+    def __init__(
+        self,
+        policy,
+        fps: float = 30,
+        mode: str = "async",
+        lead: int = 10,
+        blend: str = "linear",
+        blend_steps: int = 10,
+        ensemble_coeff: float = 0.01,
+        miss_tolerance: float = 0.2,
+        tracer=None,
+    ):
+        """
+        Args:
+            policy: ACTPolicy (predict_action_chunk / select_action / reset を持つもの)
+            lead: 実行中のチャンクが残り何ステップになったら次を推論し始めるか
+            miss_tolerance: tick の間隔が (1 + miss_tolerance) / fps を超えたら締め切り超過として数える
+        """
+        if mode not in ("sync", "async"):
+            raise ValueError(f"Unknown mode: {mode}")
+        if blend not in ("replace", "linear", "ensemble"):
+            raise ValueError(f"Unknown blend: {blend}")
+        self.policy = policy
+        self.period = 1.0 / fps
+        self.mode = mode
+        self.lead = lead
+        self.blend = blend
+        self.blend_steps = max(blend_steps, 1)
+        self.ensemble_coeff = ensemble_coeff
+        self.miss_tolerance = miss_tolerance
+        self.tracer = tracer
+
+        config = getattr(policy, "config", None)
+        self.horizon = getattr(config, "n_action_steps", None) or getattr(config, "chunk_size", 1)
+
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="act-prefetch")
+        self._lock = threading.Lock()
+        self._future = None
+        self._chunks = deque()  # (開始 tick, 到着 tick, (B, C, D) のチャンク)
+        self._tick = 0
+        self._last_call = None
+        self.last_episode = None
+        self._reset_counters()
+
+    def __getattr__(self, name):
+        # config など、ラップしていない属性は元のポリシーのものを返す
+        if name == "policy":
+            raise AttributeError(name)
+        return getattr(self.policy, name)
+
+    def _reset_counters(self):
+        self.ticks = 0
+        self.misses = 0
+        self.stalls = 0
+        self.stall_time = 0.0
+        self.chunks = 0
+        self.chunk_time = 0.0
+        self.worst_interval = 0.0
+        self._call_times = []
+
+    def reset(self):
+        """エピソードの開始時に record_loop から呼ばれる"""
+        if self._future is not None:
+            self._future.cancel()
+            try:
+                self._future.result()
+            except Exception:
+                pass
+            self._future = None
+        if self.ticks:
+            self.last_episode = self.stats()
+        self._chunks.clear()
+        self._tick = 0
+        self._last_call = None
+        self._reset_counters()
+        self.policy.reset()
+
+    def _infer(self, batch, start_tick: int):
+        begin = time.monotonic()
+        with torch.inference_mode():
+            chunk = self.policy.predict_action_chunk(batch)
+        elapsed = time.monotonic() - begin
+        with self._lock:
+            self.chunks += 1
+            self.chunk_time += elapsed
+        if self.tracer:
+            self.tracer.record("policy_chunk", elapsed, begin)
+        return start_tick, chunk
+
+    def _accept(self, start_tick: int, chunk):
+        self._chunks.append((start_tick, self._tick, chunk))
+
+    def _collect(self, block: bool) -> bool:
+        if self._future is None:
+            return False
+        if not block and not self._future.done():
+            return False
+        start_tick, chunk = self._future.result()
+        self._future = None
+        self._accept(start_tick, chunk)
+        return True
+
+    def _newest_offset(self):
+        if not self._chunks:
+            return None
+        start, _, _ = self._chunks[-1]
+        return self._tick - start
+
+    def select_action(self, batch):
+        call_start = time.monotonic()
+        if self._last_call is not None:
+            interval = call_start - self._last_call
+            self.worst_interval = max(self.worst_interval, interval)
+            if interval > self.period * (1.0 + self.miss_tolerance):
+                self.misses += 1
+        self._last_call = call_start
+        self.ticks += 1
+
+        if self.mode == "sync":
+            action = self.policy.select_action(batch)
+        else:
+            action = self._select_async(batch)
+
+        elapsed = time.monotonic() - call_start
+        self._call_times.append(elapsed)
+        if self.tracer:
+            self.tracer.record("policy_select_action", elapsed, call_start)
+        self._tick += 1
+        return action
+
+    def _select_async(self, batch):
+        self._collect(block=False)
+
+        offset = self._newest_offset()
+        chunk_size = self._chunks[-1][2].shape[1] if self._chunks else 0
+        if offset is None or offset >= chunk_size:
+            # 手元に使えるチャンクが無い: 推論中のものを待つか、その場で推論する (ここで周期を落とす)
+            stall_start = time.monotonic()
+            self._collect(block=True)
+            offset = self._newest_offset()
+            if offset is None or offset >= self._chunks[-1][2].shape[1]:
+                self._accept(*self._infer(batch, self._tick))
+            self.stalls += 1
+            self.stall_time += time.monotonic() - stall_start
+            if self.tracer:
+                self.tracer.record("policy_stall", time.monotonic() - stall_start, stall_start)
+            offset = self._newest_offset()
+
+        # 残りが lead ステップになったら、今の観測で次のチャンクを裏で推論する
+        if self._future is None and offset >= max(self.horizon - self.lead, 1):
+            self._future = self._pool.submit(self._infer, batch, self._tick)
+
+        return self._blend()
+
+    def _blend(self):
+        # 範囲外になったチャンクを捨てる
+        while len(self._chunks) > 1:
+            start, _, chunk = self._chunks[0]
+            if self._tick - start < chunk.shape[1]:
+                break
+            self._chunks.popleft()
+
+        start, arrived, chunk = self._chunks[-1]
+        newest = chunk[:, self._tick - start]
+        if len(self._chunks) == 1 or self.blend == "replace":
+            if self.blend != "ensemble":
+                # 新しいチャンクしか使わないモードでは古いものを残さない
+                while len(self._chunks) > 1:
+                    self._chunks.popleft()
+            return newest
+
+        if self.blend == "linear":
+            old_start, _, old_chunk = self._chunks[-2]
+            w = min(1.0, (self._tick - arrived + 1) / self.blend_steps)
+            if w >= 1.0:
+                while len(self._chunks) > 1:
+                    self._chunks.popleft()
+                return newest
+            return (1.0 - w) * old_chunk[:, self._tick - old_start] + w * newest
+
+        # ensemble: 古いチャンクほど添字 i が小さい (ACT と同じく w_i = exp(-m * i))
+        actions = [c[:, self._tick - s] for s, _, c in self._chunks]
+        weights = [math.exp(-self.ensemble_coeff * i) for i in range(len(actions))]
+        total = sum(weights)
+        return sum(w * a for w, a in zip(weights, actions)) / total
+
+    def stats(self) -> dict:
+        times = sorted(self._call_times)
+
+        def pct(p):
+            return times[min(int(len(times) * p / 100), len(times) - 1)] * 1000 if times else 0.0
+
+        with self._lock:
+            chunk_ms = self.chunk_time / self.chunks * 1000 if self.chunks else 0.0
+        return {
+            "mode": self.mode if self.mode == "sync" else f"async/{self.blend}",
+            "ticks": self.ticks,
+            "deadline_misses": self.misses,
+            "miss_rate": self.misses / max(self.ticks - 1, 1),
+            "stalls": self.stalls,
+            "stall_ms": round(self.stall_time * 1000, 1),
+            "chunks": self.chunks,
+            "chunk_ms": round(chunk_ms, 2),
+            "select_p50_ms": round(pct(50), 2),
+            "select_p99_ms": round(pct(99), 2),
+            "worst_interval_ms": round(self.worst_interval * 1000, 1),
+        }
+
+    def close(self):
+        self._pool.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,119 @@
+"""
+ACT の CPU 最適化 (act_optimize.py) のモード別ベンチマーク
+
+記録済みの観測で predict_action_chunk を繰り返し呼び、モード (fp32 / int8 / torch.compile /
+TorchScript とその組み合わせ) x スレッド数ごとのレイテンシ (p50/p99)・スループットと、
+fp32 に対する行動のずれを出す。
+
+観測は --observations の .pt (act_optimize.save_observations 形式) か、--dataset の
+LeRobotDataset から読んで前処理したものを使う。--save-observations で保存すると
+main.py のパリティ検査 (ACT_PARITY_OBSERVATIONS) にそのまま使える。
+
+使い方 (mission2/code から):
+    python -m benchmarks.bench_act_optimize --dataset <repo_id> --save-observations act_observations.pt
+    python -m benchmarks.bench_act_optimize --observations act_observations.pt --threads 1 2 4
+"""
+
+import argparse
+import copy
+import time
+
+import torch
+
+from config import HF_MODEL_ID
+from act_optimize import (
+    action_drift,
+    load_observations,
+    optimize_policy,
+    save_observations,
+    set_threads,
+)
+from benchmarks.stats import summarize
+
+MODES = {
+    "fp32": {},
+    "int8": {"quantize": True},
+    "torchscript": {"compile": "torchscript"},
+    "compile": {"compile": "torch_compile"},
+    "int8+torchscript": {"quantize": True, "compile": "torchscript"},
+    "int8+compile": {"quantize": True, "compile": "torch_compile"},
+}
+
+
+def observations_from_dataset(policy, repo_id: str, samples: int):
+    from lerobot.datasets.lerobot_dataset import LeRobotDataset
+    from lerobot.policies.factory import make_pre_post_processors
+
+    dataset = LeRobotDataset(repo_id)
+    preprocessor, _ = make_pre_post_processors(
+        policy_cfg=policy.config, pretrained_path=HF_MODEL_ID, dataset_stats=dataset.meta.stats
+    )
+    keys = list(policy.config.input_features)
+    step = max(len(dataset) // samples, 1)
+    batches = []
+    for index in range(0, len(dataset), step)[:samples]:
+        frame = dataset[index]
+        # 前処理 (正規化・バッチ次元の追加) は record_loop の中と同じもの
+        batch = preprocessor({key: frame[key] for key in keys})
+        batches.append({key: batch[key] for key in keys})
+    return batches
+
+
+@torch.inference_mode()
+def time_policy(policy, batches, runs: int, warmup: int):
+    for i in range(warmup):
+        policy.predict_action_chunk(dict(batches[i % len(batches)]))
+    durations = []
+    for i in range(runs):
+        start = time.perf_counter()
+        policy.predict_action_chunk(dict(batches[i % len(batches)]))
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ACT CPU optimization benchmark")
+    parser.add_argument("--policy", type=str, default=HF_MODEL_ID)
+    parser.add_argument("--observations", type=str, default=None)
+    parser.add_argument("--dataset", type=str, default=None, help="観測を取り出す LeRobotDataset")
+    parser.add_argument("--samples", type=int, default=32)
+    parser.add_argument("--save-observations", type=str, default=None)
+    parser.add_argument("--modes", nargs="+", default=list(MODES), choices=list(MODES))
+    parser.add_argument("--threads", type=int, nargs="+", default=[torch.get_num_threads()])
+    parser.add_argument("--runs", type=int, default=50)
+    parser.add_argument("--warmup", type=int, default=3)
+    args = parser.parse_args()
+
+    from lerobot.policies.act.modeling_act import ACTPolicy
+
+    base = ACTPolicy.from_pretrained(args.policy)
+    base.eval()
+
+    if args.observations:
+        batches = load_observations(args.observations)
+    elif args.dataset:
+        batches = observations_from_dataset(base, args.dataset, args.samples)
+    else:
+        parser.error("--observations or --dataset is required")
+    print(f"{len(batches)} observations")
+    if args.save_observations:
+        save_observations(batches, args.save_observations)
+        print(f"saved to {args.save_observations}")
+
+    for mode in args.modes:
+        policy = optimize_policy(copy.deepcopy(base), **MODES[mode])
+        drift = action_drift(base, policy, batches) if MODES[mode] else None
+        for threads in args.threads:
+            set_threads(threads)
+            durations = time_policy(policy, batches, args.runs, args.warmup)
+            line = (
+                f"{mode:<18} threads={threads:<3} {summarize(durations)} ms "
+                f"({len(durations) / sum(durations):.1f} chunks/s)"
+            )
+            if drift:
+                line += f" drift max={drift['max_abs']:.4f} mean={drift['mean_abs']:.5f}"
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
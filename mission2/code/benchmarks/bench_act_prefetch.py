@@ -0,0 +1,94 @@
+"""
+ACT の同期推論とチャンク先読み (act_prefetch.py) の締め切り超過の比較
+
+FPS 周期のループで毎 tick select_action を呼び、周期の超過回数・select_action の所要時間・
+tick 間の行動の跳び (チャンクの継ぎ目での不連続) を出す。
+既定では sim/fake_policy.py の FakeActPolicy (チャンク推論 --latency 秒) を使い、
+--policy を渡すと ACTPolicy.from_pretrained で読んだ実物をランダムな観測で動かす。
+
+使い方 (mission2/code から):
+    python -m benchmarks.bench_act_prefetch --ticks 600 --latency 0.08
+    python -m benchmarks.bench_act_prefetch --policy <HF_MODEL_ID>
+"""
+
+import argparse
+import time
+
+import torch
+
+from config import FPS
+from act_prefetch import ChunkPrefetchPolicy
+from sim.fake_policy import FakeActPolicy
+
+
+def load_policy(args):
+    if not args.policy:
+        return FakeActPolicy(args.chunk_size, args.n_action_steps, latency=args.latency)
+    from lerobot.policies.act.modeling_act import ACTPolicy
+
+    policy = ACTPolicy.from_pretrained(args.policy)
+    policy.eval()
+    return policy
+
+
+def make_batch(policy, tick: int):
+    features = getattr(policy.config, "input_features", None)
+    if not features:
+        return {"observation.state": torch.full((1, 6), float(tick % 50))}
+    return {key: torch.rand(1, *ft.shape) for key, ft in features.items()}
+
+
+def run(policy, args, **kwargs):
+    wrapper = ChunkPrefetchPolicy(policy, fps=args.fps, **kwargs)
+    wrapper.reset()
+    period = 1.0 / args.fps
+    jumps = []
+    previous = None
+    next_tick = time.perf_counter()
+    for tick in range(args.ticks):
+        delay = next_tick - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        with torch.inference_mode():
+            action = wrapper.select_action(make_batch(policy, tick))
+        if previous is not None:
+            jumps.append(float((action - previous).abs().max()))
+        previous = action
+        next_tick = max(next_tick + period, time.perf_counter())
+    stats = wrapper.stats()
+    wrapper.close()
+    jumps.sort()
+    stats["jump_p99"] = round(jumps[int(len(jumps) * 0.99)] if jumps else 0.0, 3)
+    stats["jump_max"] = round(jumps[-1] if jumps else 0.0, 3)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ACT chunk prefetch benchmark")
+    parser.add_argument("--policy", type=str, default=None, help="ACTPolicy の HF ID またはパス")
+    parser.add_argument("--fps", type=float, default=FPS)
+    parser.add_argument("--ticks", type=int, default=600)
+    parser.add_argument("--latency", type=float, default=0.08, help="FakeActPolicy のチャンク推論時間")
+    parser.add_argument("--chunk-size", type=int, default=100)
+    parser.add_argument("--n-action-steps", type=int, default=50)
+    parser.add_argument("--lead", type=int, default=10)
+    args = parser.parse_args()
+
+    policy = load_policy(args)
+    configs = [
+        ("sync", {"mode": "sync"}),
+        ("async/replace", {"mode": "async", "blend": "replace", "lead": args.lead}),
+        ("async/linear", {"mode": "async", "blend": "linear", "lead": args.lead}),
+        ("async/ensemble", {"mode": "async", "blend": "ensemble", "lead": args.lead}),
+    ]
+    print(f"{'mode':<16}{'misses':>8}{'stalls':>8}{'p50 ms':>9}{'p99 ms':>9}{'worst ms':>10}{'jump p99':>10}{'jump max':>10}")
+    for label, kwargs in configs:
+        s = run(policy, args, **kwargs)
+        print(
+            f"{label:<16}{s['deadline_misses']:>8}{s['stalls']:>8}{s['select_p50_ms']:>9.2f}"
+            f"{s['select_p99_ms']:>9.2f}{s['worst_interval_ms']:>10.1f}{s['jump_p99']:>10.3f}{s['jump_max']:>10.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
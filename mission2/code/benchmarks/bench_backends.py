@@ -0,0 +1,85 @@
+"""
+口の状態分類バックエンドのマイクロベンチマーク (合成フレーム)
+
+使い方 (mission2/code から):
+    python -m benchmarks.bench_backends --backends ultralytics onnx torchscript
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from config import MOUTH_MODEL_PATH, MOUTH_IMGSZ, MOUTH_CAMERA_WIDTH, MOUTH_CAMERA_HEIGHT
+from yolo.backends import BACKENDS, make_backend, resolve_model_path
+from benchmarks.stats import percentile
+
+
+def synthetic_frames(count, width, height, seed=0):
+    rng = np.random.default_rng(seed)
+    return [rng.integers(0, 256, (height, width, 3), dtype=np.uint8) for _ in range(count)]
+
+
+def time_calls(fn, frames, runs):
+    durations = []
+    for i in range(runs):
+        frame = frames[i % len(frames)]
+        start = time.perf_counter()
+        fn(frame)
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def report(label, durations):
+    print(
+        f"{label:<22} p50={percentile(durations, 50) * 1000:7.2f} ms "
+        f"p99={percentile(durations, 99) * 1000:7.2f} ms "
+        f"({len(durations) / sum(durations):6.1f} FPS)"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mouth classifier backend benchmark")
+    parser.add_argument("--model", type=str, default=MOUTH_MODEL_PATH)
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS))
+    parser.add_argument("--imgsz", type=int, default=MOUTH_IMGSZ)
+    parser.add_argument("--width", type=int, default=MOUTH_CAMERA_WIDTH)
+    parser.add_argument("--height", type=int, default=MOUTH_CAMERA_HEIGHT)
+    parser.add_argument("--runs", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--threads", type=int, default=None)
+    parser.add_argument(
+        "--baseline",
+        action="store_true",
+        help="従来の YOLO(...)(frame) 呼び出しも計測する",
+    )
+    args = parser.parse_args()
+
+    frames = synthetic_frames(16, args.width, args.height)
+
+    if args.baseline:
+        from ultralytics import YOLO
+
+        model = YOLO(args.model)
+        fn = lambda frame: model(frame, verbose=False)
+        time_calls(fn, frames, args.warmup)
+        report("ultralytics (raw)", time_calls(fn, frames, args.runs))
+
+    for name in args.backends:
+        path = resolve_model_path(name, args.model)
+        if not path.exists():
+            print(f"{name:<22} skipped ({path} not found)")
+            continue
+        try:
+            backend = make_backend(name, str(path), args.imgsz, args.threads)
+        except ImportError as e:
+            print(f"{name:<22} skipped ({e})")
+            continue
+        backend.warmup(args.warmup)
+        report(name, time_calls(backend.predict, frames, args.runs))
+        preprocess = time_calls(backend.preprocess, frames, args.runs)
+        report(f"  {name} preprocess", preprocess)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+BLE 送信のオフラインベンチマーク
+
+使い方 (mission2/code から):
+    python -m benchmarks.bench_ble --connect-delay 1.5 --sends 20
+"""
+
+import argparse
+import asyncio
+import time
+
+from ble_controller import BLEController
+from sim.fake_ble import FakeBlePeripheral
+from benchmarks.stats import summarize
+
+
+def bench_per_call(peripheral, sends):
+    """従来の send(): 毎回 接続 -> 探索 -> 書き込み -> 切断"""
+    ble = BLEController(client_factory=peripheral.client_factory)
+    durations = []
+    for i in range(sends):
+        start = time.perf_counter()
+        asyncio.run(ble.send(str(100 + i)))
+        durations.append(time.perf_counter() - start)
+        ble.char_uuid = None
+    return durations
+
+
+def bench_session(peripheral, sends, interval):
+    ble = BLEController(client_factory=peripheral.client_factory)
+    start = time.perf_counter()
+    ble.start()
+    ble.connected.wait()
+    connect_time = time.perf_counter() - start
+
+    submit_durations = []
+    for i in range(sends):
+        start = time.perf_counter()
+        ble.submit(100 + i)
+        submit_durations.append(time.perf_counter() - start)
+        time.sleep(interval)
+
+    deadline = time.perf_counter() + 10
+    while ble.pending() and time.perf_counter() < deadline:
+        time.sleep(0.01)
+    ble.stop()
+    return connect_time, submit_durations, list(ble.latencies), ble.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="BLE session benchmark")
+    parser.add_argument("--connect-delay", type=float, default=1.5)
+    parser.add_argument("--write-delay", type=float, default=0.01)
+    parser.add_argument("--sends", type=int, default=20)
+    parser.add_argument("--interval", type=float, default=0.05)
+    parser.add_argument(
+        "--drop-every", type=int, default=5, help="N 回の書き込みごとに切断"
+    )
+    args = parser.parse_args()
+
+    peripheral = FakeBlePeripheral(args.connect_delay, args.write_delay)
+    per_call = bench_per_call(peripheral, min(args.sends, 5))
+    print(f"[per-call send]   blocking (ms): {summarize(per_call)}")
+
+    peripheral = FakeBlePeripheral(args.connect_delay, args.write_delay)
+    connect_time, submits, latencies, stats = bench_session(
+        peripheral, args.sends, args.interval
+    )
+    print(f"[session]         connect: {connect_time * 1000:.1f} ms")
+    print(f"[session]         submit (us): {summarize(submits, 1e6)}")
+    print(f"[session]         queue->write (ms): {summarize(latencies)}")
+
+    peripheral = FakeBlePeripheral(
+        args.connect_delay / 10, args.write_delay, drop_every=args.drop_every
+    )
+    _, _, latencies, stats = bench_session(peripheral, args.sends, args.interval)
+    print(f"[reconnect]       queue->write (ms): {summarize(latencies)}")
+    print(
+        f"[reconnect]       received={len(peripheral.received)}/{args.sends} "
+        f"connects={stats['connects']} reconnects={stats['reconnects']} "
+        f"coalesced={stats['coalesced']}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+口の検出をスレッドで動かした場合と別プロセスで動かした場合の、制御ループのジッタ比較
+
+record_loop の代わりに、Python の処理 (--work-ms) を挟む FPS 周期のループを
+メインプロセスで回し、周期の遅れ (実際の開始時刻 - 予定時刻) と処理時間の伸びを測る。
+検出は合成カメラ (sim/fake_camera.py) のフレームで毎フレーム推論させる。
+
+使い方 (mission2/code から):
+    python -m benchmarks.bench_detector_mode --modes none thread process --duration 20
+"""
+
+import argparse
+import threading
+import time
+
+from config import FPS, MOUTH_MODEL_PATH, MOUTH_BACKEND, MOUTH_IMGSZ, MOUTH_NUM_THREADS
+from sim.fake_camera import FakeCamera
+from yolo.detector_process import DetectorProcess
+from yolo.frame_grabber import FrameGrabber
+from yolo.mouth_detector import MouthDetector
+from benchmarks.stats import summarize
+
+
+def busy_work(ms: float):
+    """GIL を握ったままの Python 処理 (前処理・辞書の組み立てなどの代わり)"""
+    deadline = time.perf_counter() + ms / 1000
+    x = 0
+    while time.perf_counter() < deadline:
+        x += sum(i * i for i in range(100))
+    return x
+
+
+def control_loop(fps: float, duration: float, work_ms: float):
+    period = 1.0 / fps
+    lateness, work = [], []
+    next_tick = time.perf_counter()
+    end = next_tick + duration
+    while next_tick < end:
+        delay = next_tick - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        start = time.perf_counter()
+        lateness.append(start - next_tick)
+        busy_work(work_ms)
+        work.append(time.perf_counter() - start)
+        next_tick += period
+        # 大きく遅れたら周期を詰めずに取り直す (record_loop と同じ)
+        next_tick = max(next_tick, time.perf_counter())
+    return lateness, work
+
+
+def make_detector(mode: str, args):
+    camera = FakeCamera(args.width, args.height, args.camera_fps)
+    if mode == "thread":
+        return MouthDetector(
+            args.model,
+            backend=args.backend,
+            imgsz=args.imgsz,
+            num_threads=args.threads,
+            source=FrameGrabber(camera).start(),
+        )
+    return DetectorProcess(
+        {
+            "model_path": args.model,
+            "backend": args.backend,
+            "imgsz": args.imgsz,
+            "num_threads": args.threads,
+            "trace": False,
+        },
+        sources=[camera],
+    ).start()
+
+
+def run(mode: str, args):
+    events = {"stop_monitor": False}
+    thread = None
+    if mode != "none":
+        detector = make_detector(mode, args)
+        thread = threading.Thread(
+            target=detector.detect_mouth_state, args=(events, threading.Event()), daemon=True
+        )
+        thread.start()
+        # 検出が定常状態になるまで待つ
+        time.sleep(1.0)
+    lateness, work = control_loop(args.fps, args.duration, args.work_ms)
+    events["stop_monitor"] = True
+    if thread:
+        thread.join()
+    return lateness, work
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Control-loop jitter: detector thread vs process")
+    parser.add_argument("--modes", nargs="+", default=["none", "thread", "process"])
+    parser.add_argument("--model", type=str, default=MOUTH_MODEL_PATH)
+    parser.add_argument("--backend", type=str, default=MOUTH_BACKEND)
+    parser.add_argument("--imgsz", type=int, default=MOUTH_IMGSZ)
+    parser.add_argument("--threads", type=int, default=MOUTH_NUM_THREADS)
+    parser.add_argument("--width", type=int, default=320)
+    parser.add_argument("--height", type=int, default=240)
+    parser.add_argument("--camera-fps", type=float, default=30.0)
+    parser.add_argument("--fps", type=float, default=FPS, help="制御ループの周期")
+    parser.add_argument("--work-ms", type=float, default=10.0, help="1 周期あたりの Python 処理")
+    parser.add_argument("--duration", type=float, default=20.0)
+    args = parser.parse_args()
+
+    for mode in args.modes:
+        lateness, work = run(mode, args)
+        print(f"[{mode}] {len(lateness)} ticks")
+        print(f"  lateness  {summarize(lateness, 1000)} ms")
+        print(f"  work      {summarize(work, 1000)} ms (nominal {args.work_ms:.1f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+ホーム復帰時間を移動距離ごとに比較する (FakeFollower 使用、実機不要)
+
+legacy: 従来の 15 ステップ線形補間 + 0.1 秒スリープ
+trapezoidal / min_jerk: RobotController.move_to_home (観測位置で到達判定)
+
+使い方 (mission2/code から):
+    python -m benchmarks.bench_home --distances 5 20 50 100
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from robot_controller import RobotController
+from sim.fake_follower import FakeFollower
+
+
+def legacy_move_to_home(robot, steps=15):
+    current_obs = robot.get_observation()
+    current_pos = {k: v for k, v in current_obs.items() if k.endswith(".pos")}
+    for step in range(1, steps + 1):
+        interpolated_position = {}
+        for key, target_val in RobotController.HOME_POSITION.items():
+            current_val = current_pos.get(key, 0)
+            interpolated_position[key] = current_val + (target_val - current_val) * (
+                step / steps
+            )
+        robot.send_action(interpolated_position)
+        time.sleep(0.1)
+
+
+def wait_arrived(controller, tolerance, timeout=3.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if np.max(np.abs(controller.read_joints() - controller.home)) <= tolerance:
+            return True
+        time.sleep(0.005)
+    return False
+
+
+def start_position(distance, seed):
+    rng = np.random.default_rng(seed)
+    signs = rng.choice([-1.0, 1.0], size=len(RobotController.HOME_POSITION))
+    return {
+        k: v + s * distance
+        for (k, v), s in zip(RobotController.HOME_POSITION.items(), signs)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Home return benchmark")
+    parser.add_argument("--distances", type=float, nargs="+", default=[5, 20, 50, 100])
+    parser.add_argument("--tolerance", type=float, default=2.0)
+    parser.add_argument("--rate", type=float, default=50.0)
+    args = parser.parse_args()
+
+    print(f"{'distance':>8} {'legacy':>10} {'trapezoidal':>12} {'min_jerk':>10}  (s, until within tolerance)")
+    for distance in args.distances:
+        results = []
+
+        robot = FakeFollower(start_position(distance, 0))
+        controller = RobotController(robot, None, tolerance=args.tolerance)
+        start = time.monotonic()
+        legacy_move_to_home(robot)
+        arrived = wait_arrived(controller, args.tolerance)
+        results.append((time.monotonic() - start, arrived))
+
+        for profile in ("trapezoidal", "min_jerk"):
+            robot = FakeFollower(start_position(distance, 0))
+            controller = RobotController(
+                robot, None, rate_hz=args.rate, tolerance=args.tolerance, profile=profile
+            )
+            start = time.monotonic()
+            arrived = controller.move_to_home()
+            results.append((time.monotonic() - start, arrived))
+
+        cells = [f"{t:.3f}{'' if ok else '*'}" for t, ok in results]
+        print(f"{distance:>8.1f} {cells[0]:>10} {cells[1]:>12} {cells[2]:>10}")
+    print("* = not within tolerance")
+
+
+if __name__ == "__main__":
+    main()
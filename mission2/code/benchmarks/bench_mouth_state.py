@@ -0,0 +1,169 @@
+"""
+MouthStateEngine を合成確率列で評価する
+
+シナリオ: close (待機) -> open -> close (咀嚼待ち) -> chip -> close
+ノイズとして一定確率で任意クラスの高確信フレームを混ぜ、
+誤スタート数・トリガー遅延・1 更新あたりのコストを設定ごとに比較する。
+
+使い方 (mission2/code から):
+    python -m benchmarks.bench_mouth_state --sequences 10000 --noise 0.05
+"""
+
+import argparse
+import random
+import time
+
+from yolo.mouth_state import (
+    MouthStateEngine,
+    EVENT_OPEN,
+    EVENT_CHIP_CONFIRMED,
+    EVENT_STOP,
+)
+from yolo.scheduler import InferenceScheduler
+from benchmarks.stats import percentile
+
+CLASS_NAMES = ["chip", "close", "open"]
+
+# 平滑化なし + しきい値 0.5 (従来の top-1 判定に相当)
+RAW_CONFIG = {
+    "smoothing_tau": 0.0,
+    "open_on": 0.5,
+    "open_off": 0.5,
+    "chip_on": 0.5,
+    "chip_off": 0.5,
+}
+
+
+def make_probs(rng, label, noise):
+    if rng.random() < noise:
+        label = rng.randrange(len(CLASS_NAMES))
+    probs = [0.0] * len(CLASS_NAMES)
+    probs[label] = rng.uniform(0.55, 0.98)
+    rest = 1.0 - probs[label]
+    others = [i for i in range(len(CLASS_NAMES)) if i != label]
+    split = rng.random()
+    probs[others[0]] = rest * split
+    probs[others[1]] = rest * (1 - split)
+    return probs
+
+
+def make_sequence(rng, fps, noise):
+    """(時刻, 確率, 真のラベル) のリストと、open / chip の開始時刻を返す"""
+    close, chip, open_ = 1, 0, 2
+    segments = [
+        (close, rng.uniform(2.0, 6.0)),
+        (open_, rng.uniform(0.5, 1.5)),
+        (close, rng.uniform(1.0, 4.0)),
+        (chip, rng.uniform(3.5, 6.0)),
+        (close, 3.0),
+    ]
+    frames = []
+    t = 0.0
+    starts = {}
+    for label, duration in segments:
+        starts.setdefault(label, t)
+        end = t + duration
+        while t < end:
+            frames.append((t, make_probs(rng, label, noise)))
+            t += 1.0 / fps
+    return frames, starts[open_], starts[chip]
+
+
+def evaluate(config, sequences, fps, noise, seed, scheduler_config=None, inference_time=0.02):
+    """scheduler_config を渡すと InferenceScheduler が選んだフレームだけを処理する"""
+    rng = random.Random(seed)
+    processed = 0
+    false_starts = 0
+    missed = 0
+    open_latency = []
+    chip_latency = []
+    updates = 0
+    elapsed = 0.0
+
+    for _ in range(sequences):
+        frames, open_at, chip_at = make_sequence(rng, fps, noise)
+        engine = MouthStateEngine(CLASS_NAMES, clock=lambda: 0.0, **config)
+        scheduler = None
+        if scheduler_config is not None:
+            sim_time = [0.0]
+            scheduler = InferenceScheduler(clock=lambda: sim_time[0], **scheduler_config)
+        next_time = 0.0
+        opened = confirmed = False
+        start = time.perf_counter()
+        for t, probs in frames:
+            if scheduler:
+                if t < next_time:
+                    continue
+                sim_time[0] = t
+                scheduler.begin()
+            processed += 1
+            frame_events = engine.update(probs, t)
+            if scheduler:
+                sim_time[0] = t + inference_time
+                next_time = sim_time[0] + scheduler.end(engine)
+            for event in frame_events:
+                if event == EVENT_OPEN:
+                    if t < open_at or opened:
+                        false_starts += 1
+                    else:
+                        open_latency.append(t - open_at)
+                    opened = True
+                elif event == EVENT_CHIP_CONFIRMED and not confirmed and t >= chip_at:
+                    chip_latency.append(t - chip_at)
+                    confirmed = True
+                elif event == EVENT_STOP:
+                    pass
+        elapsed += time.perf_counter() - start
+        updates += len(frames)
+        if not confirmed:
+            missed += 1
+
+    return {
+        "false_starts": false_starts,
+        "missed": missed,
+        "open_p50": percentile(open_latency, 50),
+        "open_p99": percentile(open_latency, 99),
+        "chip_p50": percentile(chip_latency, 50),
+        "chip_p99": percentile(chip_latency, 99),
+        "us_per_update": elapsed / max(processed, 1) * 1e6,
+        "updates": updates,
+        "processed": processed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mouth state engine benchmark")
+    parser.add_argument("--sequences", type=int, default=2000)
+    parser.add_argument("--fps", type=float, default=15.0)
+    parser.add_argument("--noise", type=float, default=0.05)
+    parser.add_argument("--chip-dwell", type=float, default=1.5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--scheduler", action="store_true", help="InferenceScheduler で間引いた場合も比較する"
+    )
+    args = parser.parse_args()
+
+    configs = {
+        "raw (dwell 3.0)": dict(RAW_CONFIG, chip_dwell=3.0),
+        f"raw (dwell {args.chip_dwell})": dict(RAW_CONFIG, chip_dwell=args.chip_dwell),
+        "ema (dwell 3.0)": {"chip_dwell": 3.0},
+        f"ema (dwell {args.chip_dwell})": {"chip_dwell": args.chip_dwell},
+    }
+    runs = [(name, config, None) for name, config in configs.items()]
+    if args.scheduler:
+        runs.append(
+            (f"ema+sched ({args.chip_dwell})", {"chip_dwell": args.chip_dwell}, {"active_fps": args.fps})
+        )
+    for name, config, scheduler_config in runs:
+        r = evaluate(config, args.sequences, args.fps, args.noise, args.seed, scheduler_config)
+        print(
+            f"{name:<18} false_starts={r['false_starts']:<6} missed={r['missed']:<6} "
+            f"open p50/p99={r['open_p50'] * 1000:.0f}/{r['open_p99'] * 1000:.0f} ms "
+            f"chip p50/p99={r['chip_p50'] * 1000:.0f}/{r['chip_p99'] * 1000:.0f} ms "
+            f"{r['us_per_update']:.2f} us/update "
+            f"(inferences {r['processed']}/{r['updates']})"
+        )
+
+
+if __name__ == "__main__":
+    main()
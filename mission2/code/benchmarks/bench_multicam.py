@@ -0,0 +1,115 @@
+"""
+複数カメラのバッチ推論ベンチマーク (合成カメラ)
+
+1. マイクロベンチマーク: N 枚を predict() で 1 枚ずつ推論した場合と predict_batch() で
+   まとめて推論した場合の 1 tick あたりの時間
+2. MouthDetector に N 台の FakeCamera をつないで一定時間動かし、処理できたフレーム数/秒
+
+使い方 (mission2/code から):
+    python -m benchmarks.bench_multicam --cameras 1 2 4 --duration 10
+"""
+
+import argparse
+import threading
+import time
+
+import numpy as np
+
+from config import (
+    MOUTH_MODEL_PATH,
+    MOUTH_BACKEND,
+    MOUTH_IMGSZ,
+    MOUTH_CAMERA_WIDTH,
+    MOUTH_CAMERA_HEIGHT,
+)
+from sim.fake_camera import FakeCamera
+from yolo.backends import make_backend, resolve_model_path
+from yolo.frame_grabber import FrameGrabber
+from yolo.mouth_detector import MouthDetector
+from benchmarks.stats import percentile
+
+
+def time_ticks(fn, frames, runs):
+    durations = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn(frames)
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def run_detector(args, cameras):
+    sources = [
+        FrameGrabber(FakeCamera(args.width, args.height, args.fps, seed=i), name=f"fake-camera-{i}").start()
+        for i in range(cameras)
+    ]
+    detector = MouthDetector(
+        args.model,
+        backend=args.backend,
+        imgsz=args.imgsz,
+        num_threads=args.threads,
+        source=sources,
+    )
+    events = {"stop_monitor": False}
+    thread = threading.Thread(
+        target=detector.detect_mouth_state, args=(events, threading.Event()), daemon=True
+    )
+    start = time.monotonic()
+    thread.start()
+    time.sleep(args.duration)
+    events["stop_monitor"] = True
+    thread.join()
+    elapsed = time.monotonic() - start
+    return detector.stats(), elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Multi-camera batched inference benchmark")
+    parser.add_argument("--model", type=str, default=MOUTH_MODEL_PATH)
+    parser.add_argument("--backend", type=str, default=MOUTH_BACKEND)
+    parser.add_argument("--imgsz", type=int, default=MOUTH_IMGSZ)
+    parser.add_argument("--width", type=int, default=MOUTH_CAMERA_WIDTH)
+    parser.add_argument("--height", type=int, default=MOUTH_CAMERA_HEIGHT)
+    parser.add_argument("--fps", type=float, default=30.0, help="合成カメラのフレームレート")
+    parser.add_argument("--cameras", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--runs", type=int, default=100)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--threads", type=int, default=None)
+    parser.add_argument("--skip-detector", action="store_true", help="マイクロベンチマークだけ実行する")
+    args = parser.parse_args()
+
+    path = resolve_model_path(args.backend, args.model)
+    if not path.exists():
+        print(f"{path} not found")
+        return
+    backend = make_backend(args.backend, str(path), args.imgsz, args.threads)
+    backend.warmup()
+    rng = np.random.default_rng(0)
+
+    print(f"{'cameras':>8}{'sequential p50':>16}{'batched p50':>13}{'batched p99':>13}{'cost/cam':>10}")
+    base = None
+    for n in args.cameras:
+        frames = [rng.integers(0, 256, (args.height, args.width, 3), dtype=np.uint8) for _ in range(n)]
+        sequential = time_ticks(lambda fs: [backend.predict(f) for f in fs], frames, args.runs)
+        batched = time_ticks(backend.predict_batch, frames, args.runs)
+        p50 = percentile(batched, 50)
+        base = base or p50
+        print(
+            f"{n:>8}{percentile(sequential, 50) * 1000:>13.2f} ms{p50 * 1000:>10.2f} ms"
+            f"{percentile(batched, 99) * 1000:>10.2f} ms{p50 / base / n:>10.2f}"
+        )
+
+    if args.skip_detector:
+        return
+
+    print(f"\n{'cameras':>8}{'frames/s':>10}{'ticks/s':>9}{'mean batch':>12}  per camera")
+    for n in args.cameras:
+        stats, elapsed = run_detector(args, n)
+        print(
+            f"{n:>8}{stats['frames'] / elapsed:>10.1f}{stats['ticks'] / elapsed:>9.1f}"
+            f"{stats['mean_batch']:>12.2f}  {[round(f / elapsed, 1) for f in stats['per_stream']]}"
+        )
+
+
+if __name__ == "__main__":
+    main()
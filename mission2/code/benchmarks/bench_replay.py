@@ -0,0 +1,121 @@
+"""
+記録したセッション (.mouthrec) を再生して、モデル・判定ロジックの変更を回帰テストする
+
+記録時の分類結果と現在のバックエンドの結果を比べ、
+フレームごとの推論レイテンシ・スループット・状態イベントの時刻を出力する。
+
+使い方 (mission2/code から):
+    python -m benchmarks.bench_replay session.mouthrec --backend onnx
+    python -m benchmarks.bench_replay session.mouthrec --recorded-only
+    python -m benchmarks.bench_replay session.mouthrec --motion-gate
+"""
+
+import argparse
+import time
+
+from config import (
+    MOUTH_MODEL_PATH,
+    MOUTH_IMGSZ,
+    MOUTH_BACKEND,
+    MOUTH_STATE_CONFIG,
+    MOUTH_MOTION_GATE_CONFIG,
+)
+from yolo.motion_gate import MotionGate
+from yolo.mouth_state import MouthStateEngine
+from yolo.replay import ReplaySource
+from benchmarks.stats import summarize
+
+
+def run_engine(class_names, timeline, state_config):
+    engine = MouthStateEngine(class_names, clock=lambda: 0.0, **state_config)
+    events = []
+    for timestamp, probs in timeline:
+        for event in engine.update(probs, timestamp):
+            events.append((timestamp, event))
+    return events
+
+
+def print_events(label, events, origin):
+    print(f"{label}:")
+    for timestamp, event in events:
+        print(f"  {timestamp - origin:8.3f}s  {event}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a mouth camera session")
+    parser.add_argument("recording", type=str)
+    parser.add_argument("--model", type=str, default=MOUTH_MODEL_PATH)
+    parser.add_argument("--backend", type=str, default=MOUTH_BACKEND)
+    parser.add_argument("--imgsz", type=int, default=MOUTH_IMGSZ)
+    parser.add_argument("--realtime", action="store_true")
+    parser.add_argument(
+        "--recorded-only",
+        action="store_true",
+        help="推論せず、記録済みの分類結果だけで判定ロジックを評価する",
+    )
+    parser.add_argument(
+        "--motion-gate",
+        action="store_true",
+        help="MOUTH_MOTION_GATE_CONFIG のゲートで分類をスキップした場合の結果も出す",
+    )
+    args = parser.parse_args()
+
+    source = ReplaySource(args.recording, realtime=args.realtime)
+    class_names = source.class_names
+    origin = source.records[0][0] if source.records else 0.0
+    recorded = [(ts, probs) for ts, _, probs, _ in source.records if len(probs)]
+    print(f"{args.recording}: {len(source)} frames, classes={class_names}")
+
+    if recorded:
+        print_events("recorded", run_engine(class_names, recorded, MOUTH_STATE_CONFIG), origin)
+    if args.recorded_only:
+        return
+
+    from yolo.backends import make_backend
+
+    backend = make_backend(args.backend, args.model, args.imgsz)
+    backend.warmup()
+
+    timeline = []
+    gated_timeline = []
+    gate = MotionGate(**(MOUTH_MOTION_GATE_CONFIG or {})) if args.motion_gate else None
+    gated_probs = None
+    latencies = []
+    agree = compared = 0
+    seq = 0
+    start = time.perf_counter()
+    while True:
+        frame, timestamp, seq = source.read_latest(seq)
+        if frame is None:
+            break
+        t0 = time.perf_counter()
+        _, _, probs = backend.predict(frame)
+        latencies.append(time.perf_counter() - t0)
+        timeline.append((timestamp, probs))
+        if gate:
+            # ゲートが通したフレームだけ分類したことにして、それ以外は前回の結果を使う
+            if gate.check(frame, timestamp) or gated_probs is None:
+                gated_probs = probs
+            gated_timeline.append((timestamp, gated_probs))
+        if source.last_probs is not None and len(source.last_probs):
+            compared += 1
+            agree += int(source.last_probs.argmax() == probs.argmax())
+    elapsed = time.perf_counter() - start
+
+    print(f"[{args.backend}] inference (ms): {summarize(latencies)}")
+    print(
+        f"[{args.backend}] throughput: {len(timeline) / elapsed:.1f} FPS "
+        f"(replay stats {source.stats()})"
+    )
+    if compared:
+        print(f"[{args.backend}] top-1 agreement with recording: {agree / compared:.3%}")
+    print_events(args.backend, run_engine(backend.names, timeline, MOUTH_STATE_CONFIG), origin)
+    if gate:
+        same = sum(int(a.argmax() == b.argmax()) for (_, a), (_, b) in zip(timeline, gated_timeline))
+        print(f"[motion gate] {gate.stats()}")
+        print(f"[motion gate] top-1 agreement with every-frame inference: {same / max(len(timeline), 1):.3%}")
+        print_events("motion gate", run_engine(backend.names, gated_timeline, MOUTH_STATE_CONFIG), origin)
+
+
+if __name__ == "__main__":
+    main()
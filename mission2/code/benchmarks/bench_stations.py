@@ -0,0 +1,200 @@
+"""
+ステーション数 N を増やしたときの CPU と ACT のレイテンシの伸び方 (multi_station.py)
+
+N ごとに新しいプロセスで計測する (RSS が前の N の分を含まないように)。
+
+- 既定: SimRecordingSystem (sim/sim_system.py) を N 台 MultiStationOrchestrator で動かし、
+  1 時間あたりの提供回数・CPU 使用率・RSS・チャンク推論の待ち時間を出す
+- --policy-only: ロボット・カメラ・データセットを使わず、N 本の FPS 周期のループから
+  FakeActPolicy (sim/fake_policy.py) を共有して select_action を呼ぶ (lerobot 不要)
+- --separate: ステーションごとにポリシーを読む (別プロセスで動かすのと同じ構成) 比較用
+
+使い方 (mission2/code から):
+    python -m benchmarks.bench_stations --stations 1 2 4 --episodes 3 --episode-time 10
+    python -m benchmarks.bench_stations --stations 1 2 4 8 --policy-only --ticks 900
+    python -m benchmarks.bench_stations --stations 1 2 4 --policy-only --separate
+"""
+
+import argparse
+import multiprocessing
+import random
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from benchmarks.stats import percentile
+
+
+def _server_stats(servers) -> dict:
+    latencies = sorted(v for s in servers for v in s.latencies)
+    infer_times = sorted(v for s in servers for v in s.infer_times)
+    sizes = [v for s in servers for v in s.batch_sizes]
+    return {
+        "mean_batch": sum(sizes) / len(sizes) if sizes else 0.0,
+        "chunk_p50_ms": percentile(latencies, 50) * 1000,
+        "chunk_p99_ms": percentile(latencies, 99) * 1000,
+        "infer_p50_ms": percentile(infer_times, 50) * 1000,
+    }
+
+
+def run_stations(n: int, args: dict) -> dict:
+    from multi_station import MultiStationOrchestrator
+    from sim.fake_user import SimUser
+    from sim.sim_system import SimRecordingSystem
+
+    root = Path(args["dataset"] or tempfile.mkdtemp(prefix="sim_stations_")) / f"n{n}"
+    stations = [
+        SimRecordingSystem(
+            episodes=args["episodes"],
+            episode_time_sec=args["episode_time"],
+            user=SimUser(think_time=args["think"], serve_time=args["serve"], seed=args["seed"] + i),
+            dataset_root=str(root / f"station{i + 1}"),
+            chunk_size=args["chunk_size"],
+            station={"name": f"station{i + 1}"},
+        )
+        for i in range(n)
+    ]
+    orchestrator = MultiStationOrchestrator(
+        stations, batch_window=args["window"], share_policy=not args["separate"]
+    )
+    orchestrator.run()
+
+    started = [s for s in stations if s.started_at is not None and len(s.episode_log) > 1]
+    if not started:
+        return {"stations": n, "episodes": 0}
+    begin = min(s.started_at for s in started)
+    end = max(s.started_at + s.episode_log[-1]["time"] for s in started)
+    cpu = max(s.episode_log[-1]["cpu_sec"] for s in started) - min(s.episode_log[0]["cpu_sec"] for s in started)
+    episodes = sum(s.episode_count for s in stations)
+    return {
+        "stations": n,
+        "episodes": episodes,
+        "servings_per_hour": episodes / (end - begin) * 3600,
+        "cores": cpu / (end - begin),
+        "rss_mb": max(s.episode_log[-1]["rss_mb"] for s in started),
+        **_server_stats(orchestrator.servers),
+    }
+
+
+def run_policy_only(n: int, args: dict) -> dict:
+    import torch
+
+    from act_prefetch import ChunkPrefetchPolicy
+    from multi_station import BatchedPolicyServer
+    from sim.fake_policy import FakeActPolicy
+    from sim.usage import process_usage
+
+    def make_policy():
+        return FakeActPolicy(
+            args["chunk_size"], args["chunk_size"], latency=args["latency"], batch_cost=args["batch_cost"]
+        )
+
+    if args["separate"]:
+        servers = [BatchedPolicyServer(make_policy(), 0.0).start() for _ in range(n)]
+        clients = [server.client(f"station{i + 1}") for i, server in enumerate(servers)]
+    else:
+        servers = [BatchedPolicyServer(make_policy(), args["window"]).start()]
+        clients = [servers[0].client(f"station{i + 1}") for i in range(n)]
+    policies = [ChunkPrefetchPolicy(c, fps=args["fps"], mode=args["mode"], lead=args["lead"]) for c in clients]
+
+    period = 1.0 / args["fps"]
+    rng = random.Random(args["seed"])
+    # 各ステーションのエピソードが始まる時刻はばらばら
+    offsets = [0.0] + [rng.uniform(0.0, args["chunk_size"] * period) for _ in range(n - 1)]
+
+    def loop(policy, offset):
+        time.sleep(offset)
+        policy.reset()
+        next_tick = time.perf_counter()
+        for tick in range(args["ticks"]):
+            delay = next_tick - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            with torch.inference_mode():
+                policy.select_action({"observation.state": torch.full((1, 6), float(tick % 50))})
+            next_tick = max(next_tick + period, time.perf_counter())
+        policy.policy.finish_episode()
+
+    usage = process_usage()
+    start = time.monotonic()
+    threads = [threading.Thread(target=loop, args=(p, o)) for p, o in zip(policies, offsets)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.monotonic() - start
+    end_usage = process_usage()
+
+    stats = [p.stats() for p in policies]
+    for p in policies:
+        p.close()
+    for server in servers:
+        server.close()
+    return {
+        "stations": n,
+        "ticks": sum(s["ticks"] for s in stats),
+        "cores": (end_usage["cpu_sec"] - usage["cpu_sec"]) / wall,
+        "rss_mb": end_usage["rss_mb"],
+        "miss_rate": sum(s["deadline_misses"] for s in stats) / max(sum(s["ticks"] for s in stats), 1),
+        "select_p99_ms": max(s["select_p99_ms"] for s in stats),
+        **_server_stats(servers),
+    }
+
+
+def report(rows, policy_only: bool):
+    first = "ticks" if policy_only else "servings/h"
+    last = "miss rate" if policy_only else "episodes"
+    print("=" * 96)
+    print(
+        f"{'N':>3}{first:>12}{'cores':>8}{'RSS MB':>9}{'batch':>8}"
+        f"{'chunk p50':>11}{'chunk p99':>11}{'infer p50':>11}{last:>11}"
+    )
+    for r in rows:
+        if "cores" not in r:
+            print(f"{r['stations']:>3}  no episodes completed")
+            continue
+        head = f"{r['ticks']:>12}" if policy_only else f"{r['servings_per_hour']:>12.1f}"
+        tail = f"{r['miss_rate']:>11.3f}" if policy_only else f"{r['episodes']:>11}"
+        print(
+            f"{r['stations']:>3}{head}{r['cores']:>8.2f}{r['rss_mb']:>9.0f}{r['mean_batch']:>8.2f}"
+            f"{r['chunk_p50_ms']:>11.1f}{r['chunk_p99_ms']:>11.1f}{r['infer_p50_ms']:>11.1f}{tail}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Multi-station scaling benchmark")
+    parser.add_argument("--stations", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--separate", action="store_true", help="ステーションごとにポリシーを読む (共有しない)")
+    parser.add_argument("--window", type=float, default=0.015, help="チャンク要求をまとめる待ち時間 (秒)")
+    parser.add_argument("--chunk-size", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    # システム全体
+    parser.add_argument("--episodes", type=int, default=3, help="ステーションごとのエピソード数")
+    parser.add_argument("--episode-time", type=float, default=10.0)
+    parser.add_argument("--think", type=float, default=2.0)
+    parser.add_argument("--serve", type=float, default=4.0)
+    parser.add_argument("--dataset", default=None, help="dataset root (default: a temporary directory)")
+    # ポリシーだけ
+    parser.add_argument("--policy-only", action="store_true", help="FakeActPolicy の共有だけを計測する")
+    parser.add_argument("--ticks", type=int, default=900, help="ステーションごとの tick 数")
+    parser.add_argument("--fps", type=float, default=30.0)
+    parser.add_argument("--latency", type=float, default=0.08, help="FakeActPolicy のチャンク推論時間")
+    parser.add_argument("--batch-cost", type=float, default=0.3, help="バッチの 2 つ目以降の追加時間 (latency 比)")
+    parser.add_argument("--mode", choices=["sync", "async"], default="async")
+    parser.add_argument("--lead", type=int, default=10)
+    args = parser.parse_args()
+
+    target = run_policy_only if args.policy_only else run_stations
+    rows = []
+    for n in args.stations:
+        print(f"[Bench] {n} stations")
+        # N ごとに新しいプロセスで測る
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+            rows.append(pool.submit(target, n, vars(args)).result())
+    report(rows, args.policy_only)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+実機なしでシステム全体を回すスループット計測 (sim/sim_system.py)
+
+RecordingSystem のオーケストレーションをそのまま使い、ロボット・カメラ・口検出・BLE・利用者を
+シミュレーションに置き換えて --episodes 回の提供を行う。出すもの:
+
+- 1 時間あたりの提供回数 (最初の待機からの経過時間で割る)
+- CPU 使用率 (プロセス CPU 時間 / 経過時間。1.0 で 1 コア分)
+- エピソードごとの RSS の増え方 (リークの検出用)
+- Tracer のステージ別の所要時間
+
+使い方 (mission2/code から):
+    python -m benchmarks.bench_system --episodes 5 --episode-time 10
+    python -m benchmarks.bench_system --episodes 20 --think 1 --serve 4 --chip 2 --dataset /tmp/sim_dataset
+"""
+
+import argparse
+
+from benchmarks.stats import summarize
+from sim.fake_user import SimUser
+from sim.sim_system import SimRecordingSystem
+
+
+def report(system: SimRecordingSystem):
+    log = system.episode_log
+    if len(log) < 2:
+        print("No episodes completed")
+        return
+    first, last = log[0], log[-1]
+    episodes = last["episode"]
+    wall = last["time"] - first["time"]
+    cpu = last["cpu_sec"] - first["cpu_sec"]
+    growth = [b["rss_mb"] - a["rss_mb"] for a, b in zip(log, log[1:])]
+    # 最初のエピソードはエンコーダの確保などで増えるので、2 回目以降の増え方を見る
+    steady = growth[1:] or growth
+
+    print("=" * 60)
+    print(f"episodes:         {episodes}")
+    print(f"wall time:        {wall:.1f}s ({wall / episodes:.1f}s / episode)")
+    print(f"servings / hour:  {episodes / wall * 3600:.1f}")
+    print(f"user servings:    {system.user.servings}")
+    print(f"cpu:              {cpu:.1f}s ({cpu / wall:.2f} cores)")
+    print(f"rss:              {first['rss_mb']:.0f} MB -> {last['rss_mb']:.0f} MB")
+    print(f"rss / episode:    {summarize(steady, scale=1.0)} MB")
+    print(f"ble received:     {system.peripheral.received[-3:]}")
+    if system.tracer:
+        print(system.tracer.summary())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hardware-free full-system throughput benchmark")
+    parser.add_argument("--episodes", type=int, default=5)
+    parser.add_argument("--episode-time", type=float, default=10.0, help="record_loop length in seconds")
+    parser.add_argument("--think", type=float, default=2.0, help="user idle time before opening")
+    parser.add_argument("--serve", type=float, default=4.0, help="time from recording start to biting")
+    parser.add_argument("--chip", type=float, default=2.0, help="how long the chip is held")
+    parser.add_argument("--chunk-size", type=int, default=100)
+    parser.add_argument("--dataset", default=None, help="dataset root (default: a temporary directory)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    user = SimUser(think_time=args.think, serve_time=args.serve, chip_hold=args.chip, seed=args.seed)
+    system = SimRecordingSystem(
+        episodes=args.episodes,
+        episode_time_sec=args.episode_time,
+        user=user,
+        dataset_root=args.dataset,
+        chunk_size=args.chunk_size,
+    )
+    print(f"[Sim] dataset: {system.dataset_root}")
+    system.run()
+    report(system)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,20 @@
+def percentile(values, p: float) -> float:
+    """線形補間のパーセンタイル (p は 0-100)"""
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * p / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def summarize(values, scale: float = 1000.0) -> str:
+    """p50/p95/p99/max をミリ秒 (デフォルト) で整形する"""
+    return (
+        f"n={len(values)} "
+        f"p50={percentile(values, 50) * scale:.3f} "
+        f"p95={percentile(values, 95) * scale:.3f} "
+        f"p99={percentile(values, 99) * scale:.3f} "
+        f"max={(max(values) if values else float('nan')) * scale:.3f}"
+    )
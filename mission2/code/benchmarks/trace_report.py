@@ -0,0 +1,93 @@
+"""
+tracing.Tracer のダンプ (JSON Lines) をセッションごとの p50/p95/p99 表にする
+
+使い方 (mission2/code から):
+    python -m benchmarks.trace_report traces/*.jsonl
+    python -m benchmarks.trace_report traces/*.jsonl --stages open_to_first_action inference
+"""
+
+import argparse
+import json
+from collections import defaultdict
+
+from benchmarks.stats import percentile
+
+
+def load(paths):
+    """セッションごとの {stage: [秒]} と {gauge: [値]} を返す"""
+    sessions = defaultdict(lambda: defaultdict(list))
+    gauges = defaultdict(lambda: defaultdict(list))
+    for path in paths:
+        with open(path) as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                row = json.loads(line)
+                session = row.get("session") or path
+                if "gauge" in row:
+                    gauges[session][row["gauge"]].append(row["value"])
+                else:
+                    sessions[session][row["stage"]].append(row["duration"])
+    return sessions, gauges
+
+
+def format_table(stages, only=None):
+    lines = [f"  {'stage':<24}{'n':>7}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}  (ms)"]
+    for stage, values in sorted(stages.items()):
+        if only and stage not in only:
+            continue
+        lines.append(
+            f"  {stage:<24}{len(values):>7}"
+            f"{percentile(values, 50) * 1000:>10.1f}"
+            f"{percentile(values, 95) * 1000:>10.1f}"
+            f"{percentile(values, 99) * 1000:>10.1f}"
+            f"{max(values) * 1000:>10.1f}"
+        )
+    return "\n".join(lines)
+
+
+def format_gauges(gauges, only=None):
+    lines = [f"  {'gauge':<24}{'n':>7}{'mean':>10}{'p50':>10}{'p99':>10}{'max':>10}"]
+    for name, values in sorted(gauges.items()):
+        if only and name not in only:
+            continue
+        lines.append(
+            f"  {name:<24}{len(values):>7}"
+            f"{sum(values) / len(values):>10.2f}"
+            f"{percentile(values, 50):>10.2f}"
+            f"{percentile(values, 99):>10.2f}"
+            f"{max(values):>10.2f}"
+        )
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency trace report")
+    parser.add_argument("paths", nargs="+")
+    parser.add_argument("--stages", nargs="*", default=None)
+    parser.add_argument(
+        "--combined", action="store_true", help="全セッションをまとめた表も出す"
+    )
+    args = parser.parse_args()
+
+    sessions, gauges = load(args.paths)
+    combined = defaultdict(list)
+    combined_gauges = defaultdict(list)
+    for session in sorted(set(sessions) | set(gauges)):
+        print(f"[{session}]")
+        print(format_table(sessions[session], args.stages))
+        if gauges[session]:
+            print(format_gauges(gauges[session], args.stages))
+        for stage, values in sessions[session].items():
+            combined[stage].extend(values)
+        for name, values in gauges[session].items():
+            combined_gauges[name].extend(values)
+    if args.combined and len(sessions) > 1:
+        print("[all sessions]")
+        print(format_table(combined, args.stages))
+        if combined_gauges:
+            print(format_gauges(combined_gauges, args.stages))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,27 +1,212 @@
+import asyncio
+import threading
+import time
+from collections import deque
+
 from bleak import BleakClient
 
 
 class BLEController:
-    def __init__(self, device_address: str = "34:B7:DA:5E:81:15"):
+    def __init__(
+        self,
+        device_address: str = "34:B7:DA:5E:81:15",
+        client_factory=BleakClient,
+        queue_size: int = 8,
+        reconnect_delay: float = 0.5,
+        reconnect_max_delay: float = 10.0,
+        tracer=None,
+    ):
         self.device_address = device_address
+        self.client_factory = client_factory
+        self.reconnect_delay = reconnect_delay
+        self.reconnect_max_delay = reconnect_max_delay
+        self.tracer = tracer
+
+        self.char_uuid = None
+        self.connected = threading.Event()
+        self._counts = {
+            "submitted": 0,
+            "sent": 0,
+            "coalesced": 0,
+            "dropped": 0,
+            "connects": 0,
+            "reconnects": 0,
+            "errors": 0,
+        }
+        # submit() から送信までの待ち時間 (秒)
+        self.latencies = deque(maxlen=1024)
+
+        self._pending = deque(maxlen=queue_size)
+        self._lock = threading.Lock()
+        self._loop = None
+        self._wakeup = None
+        self._stop_requested = None
+        self._thread = None
+        self._stopping = False
+        self._closed = False
+        self._ready = threading.Event()
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stopping = False
+        self._closed = False
+        self._thread = threading.Thread(
+            target=self._thread_main, name="ble-session", daemon=True
+        )
+        self._thread.start()
+        self._ready.wait()
+
+    def stop(self, timeout: float = 2.0):
+        """未送信の値をできるだけ送ってからセッションを閉じる"""
+        if self._thread is None:
+            return
+        with self._lock:
+            # 以降の submit() は閉じたループに触らずに捨てる
+            self._closed = True
+        self._stopping = True
+        self._loop.call_soon_threadsafe(self._wakeup.set)
+        self._loop.call_soon_threadsafe(self._stop_requested.set)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def submit(self, value) -> None:
+        """値をキューに積んで即座に戻る (fire-and-forget)"""
+        value = str(value)
+        with self._lock:
+            if self._closed:
+                self._counts["dropped"] += 1
+                print(f"BLE stopped, dropping: {value}")
+                return
+            self._counts["submitted"] += 1
+            if self._pending and self._pending[-1][0] == value:
+                self._counts["coalesced"] += 1
+                return
+            if len(self._pending) == self._pending.maxlen:
+                # サーボ位置は絶対値なので古い値から捨てる
+                self._counts["coalesced"] += 1
+            self._pending.append((value, time.perf_counter()))
+            if self._loop is not None:
+                self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._counts)
+
+    def _count(self, key: str):
+        # イベントループのスレッドから更新し、stats() は別スレッドから読む
+        with self._lock:
+            self._counts[key] += 1
 
     async def send(self, value: str) -> bool:
+        """1回だけ接続して送信する (セッションを使わない場合)"""
         try:
-            async with BleakClient(self.device_address) as client:
-                services = client.services
-                for service in services:
-                    for char in service.characteristics:
-                        if (
-                            "write" in char.properties
-                            or "write-without-response" in char.properties
-                        ):
-                            message_bytes = value.encode()
-                            await client.write_gatt_char(char.uuid, message_bytes)
-                            print(f"BLE sent: {value}")
-                            return True
-
-                print("No write characteristic found")
-                return False
+            async with self.client_factory(self.device_address) as client:
+                char_uuid = self.char_uuid or self._find_write_char(client)
+                if char_uuid is None:
+                    print("No write characteristic found")
+                    return False
+                self.char_uuid = char_uuid
+                await client.write_gatt_char(char_uuid, value.encode())
+                print(f"BLE sent: {value}")
+                return True
         except Exception as e:
             print(f"BLE error: {e}")
             return False
+
+    def _find_write_char(self, client):
+        for service in client.services:
+            for char in service.characteristics:
+                if (
+                    "write" in char.properties
+                    or "write-without-response" in char.properties
+                ):
+                    return char.uuid
+        return None
+
+    def _thread_main(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._wakeup = asyncio.Event()
+        self._stop_requested = asyncio.Event()
+        self._ready.set()
+        try:
+            self._loop.run_until_complete(self._session())
+        finally:
+            self._loop.close()
+
+    async def _session(self):
+        delay = self.reconnect_delay
+        while True:
+            client = self.client_factory(
+                self.device_address,
+                disconnected_callback=lambda _: self._loop.call_soon_threadsafe(
+                    self._wakeup.set
+                ),
+            )
+            try:
+                await client.connect()
+                self._count("connects")
+                if self.char_uuid is None:
+                    self.char_uuid = self._find_write_char(client)
+                    if self.char_uuid is None:
+                        raise RuntimeError("No write characteristic found")
+                self.connected.set()
+                print(f"BLE connected: {self.device_address}")
+                delay = self.reconnect_delay
+                await self._drain(client)
+                return
+            except Exception as e:
+                self._count("errors")
+                print(f"BLE error: {e}")
+            finally:
+                self.connected.clear()
+                try:
+                    await client.disconnect()
+                except Exception:
+                    pass
+
+            if self._stopping:
+                return
+            self._count("reconnects")
+            # バックオフ中に stop() されたら、もう一度つなぎに行かずに終わる
+            try:
+                await asyncio.wait_for(self._stop_requested.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+            if self._closed:
+                return
+            delay = min(delay * 2, self.reconnect_max_delay)
+
+    async def _drain(self, client):
+        while True:
+            with self._lock:
+                item = self._pending.popleft() if self._pending else None
+            if item is None:
+                if self._stopping:
+                    return
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                if not client.is_connected:
+                    raise ConnectionError("BLE disconnected")
+                continue
+
+            value, submitted_at = item
+            try:
+                await client.write_gatt_char(self.char_uuid, value.encode())
+            except Exception:
+                with self._lock:
+                    if len(self._pending) < self._pending.maxlen:
+                        self._pending.appendleft(item)
+                raise
+            latency = time.perf_counter() - submitted_at
+            self.latencies.append(latency)
+            if self.tracer:
+                self.tracer.record("ble_submit_to_write", latency)
+                self.tracer.since("chip_confirmed", "chip_to_ble_write")
+            self._count("sent")
+            print(f"BLE sent: {value}")
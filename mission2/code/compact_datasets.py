@@ -0,0 +1,475 @@
+"""
+セッションごとの評価データセットを 1 つの LeRobot データセット (v3.0) にまとめる
+
+config.py は起動のたびに時刻入りの HF_DATASET_ID を作るので、運用するとセッションごとに小さな
+データセットが溜まる。このツールはローカルのデータセットディレクトリだけを読み (ネットワーク不要)、
+
+- data/*.parquet は行のバッチ単位でストリーミングし、episode_index / index / task_index を振り直して書く
+- videos/*.mp4 はデコード・再エンコードせずにストリームコピーで連結し、各エピソードの時刻範囲をずらす
+- stats.json はエピソードごとの統計量 (meta/episodes の stats/...) を 1 つずつ合成して作り直す
+- フレームの無い・保存が途中で止まった (parquet の行数が足りない、動画が無い・短い) エピソードは落とす
+
+出力はまず <out>.tmp に書き、最後に <out> へ名前を変える。
+
+使い方 (mission2/code から):
+    python compact_datasets.py --out ~/datasets/potato-merged
+    python compact_datasets.py <dataset_root>... --out merged --min-frames 30
+    python compact_datasets.py --out merged --dry-run
+"""
+
+import argparse
+import shutil
+import time
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from lerobot.datasets.compute_stats import aggregate_stats
+from lerobot.datasets.utils import (
+    DEFAULT_CHUNK_SIZE,
+    DEFAULT_DATA_FILE_SIZE_IN_MB,
+    DEFAULT_DATA_PATH,
+    DEFAULT_EPISODES_PATH,
+    DEFAULT_VIDEO_FILE_SIZE_IN_MB,
+    DEFAULT_VIDEO_PATH,
+    EPISODES_DIR,
+    INFO_PATH,
+    load_info,
+    load_tasks,
+    unflatten_dict,
+    update_chunk_file_indices,
+    write_info,
+    write_stats,
+    write_tasks,
+)
+from lerobot.datasets.video_utils import concatenate_video_files, get_video_duration_in_s
+from lerobot.utils.constants import HF_LEROBOT_HOME
+
+from config import HF_DATASET_ID
+
+# 動画の長さとエピソードの時刻範囲のずれの許容値 (秒)
+VIDEO_TOLERANCE_SEC = 0.1
+
+
+class SessionDataset:
+    """まとめる元の 1 セッション分のデータセット"""
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self.info = load_info(self.root)
+        self.fps = self.info["fps"]
+        self.video_keys = [k for k, ft in self.info["features"].items() if ft["dtype"] == "video"]
+        episode_files = sorted((self.root / EPISODES_DIR).glob("*/*.parquet"))
+        self.episodes = (
+            pd.concat([pd.read_parquet(p) for p in episode_files], ignore_index=True)
+            .sort_values("episode_index")
+            .reset_index(drop=True)
+            if episode_files
+            else pd.DataFrame()
+        )
+        self.tasks = load_tasks(self.root) if len(self.episodes) else pd.DataFrame()
+        self._durations = {}
+
+    @property
+    def name(self) -> str:
+        return self.root.name
+
+    def data_path(self, chunk_index: int, file_index: int) -> Path:
+        return self.root / self.info["data_path"].format(chunk_index=chunk_index, file_index=file_index)
+
+    def video_path(self, key: str, chunk_index: int, file_index: int) -> Path:
+        return self.root / self.info["video_path"].format(
+            video_key=key, chunk_index=chunk_index, file_index=file_index
+        )
+
+    def video_duration(self, path: Path) -> float:
+        if path not in self._durations:
+            self._durations[path] = get_video_duration_in_s(path)
+        return self._durations[path]
+
+    def frame_counts(self) -> Counter:
+        """parquet に実際に書かれているエピソードごとの行数 (episode_index 列だけ読む)"""
+        counts = Counter()
+        files = {
+            (int(c), int(f))
+            for c, f in zip(self.episodes["data/chunk_index"], self.episodes["data/file_index"])
+        }
+        for chunk_index, file_index in sorted(files):
+            path = self.data_path(chunk_index, file_index)
+            if not path.exists():
+                continue
+            column = pq.read_table(path, columns=["episode_index"])["episode_index"]
+            for entry in pc.value_counts(column).to_pylist():
+                counts[int(entry["values"])] += entry["counts"]
+        return counts
+
+    def check(self, min_frames: int) -> dict:
+        """エピソード番号 -> 落とす理由 (残すものは None)"""
+        counts = self.frame_counts()
+        return {
+            int(row["episode_index"]): self._check_episode(row, counts, min_frames)
+            for _, row in self.episodes.iterrows()
+        }
+
+    def _check_episode(self, row: pd.Series, counts: Counter, min_frames: int):
+        length = int(row["length"])
+        if length < max(min_frames, 1):
+            return "empty" if length == 0 else "short"
+        if counts.get(int(row["episode_index"]), 0) != length:
+            return "incomplete data"
+        for key in self.video_keys:
+            path = self.video_path(
+                key, int(row[f"videos/{key}/chunk_index"]), int(row[f"videos/{key}/file_index"])
+            )
+            if not path.exists():
+                return "missing video"
+            if row[f"videos/{key}/to_timestamp"] > self.video_duration(path) + VIDEO_TOLERANCE_SEC:
+                return "truncated video"
+        return None
+
+
+def _to_array(value) -> np.ndarray:
+    # 画像の統計量は (3, 1, 1) のような入れ子のリストで、pandas からは object 配列の配列として出てくる
+    if isinstance(value, np.ndarray) and value.dtype == object:
+        return np.stack([_to_array(v) for v in value])
+    return np.asarray(value, dtype=np.float64)
+
+
+def episode_stats(row: pd.Series) -> dict:
+    """meta/episodes の stats/<feature>/<stat> 列をネストした numpy の辞書に戻す"""
+    flat = {key[len("stats/") :]: _to_array(value) for key, value in row.items() if key.startswith("stats/")}
+    return unflatten_dict(flat)
+
+
+class DatasetCompactor:
+    def __init__(
+        self,
+        out_root: Path,
+        reference: SessionDataset,
+        data_files_size_in_mb: float = None,
+        video_files_size_in_mb: float = None,
+        chunks_size: int = None,
+    ):
+        self.root = Path(out_root)
+        self.info = dict(reference.info)
+        self.info["data_path"] = DEFAULT_DATA_PATH
+        self.info["video_path"] = DEFAULT_VIDEO_PATH if reference.video_keys else None
+        self.chunks_size = chunks_size or reference.info.get("chunks_size", DEFAULT_CHUNK_SIZE)
+        self.data_mb = data_files_size_in_mb or reference.info.get(
+            "data_files_size_in_mb", DEFAULT_DATA_FILE_SIZE_IN_MB
+        )
+        self.video_mb = video_files_size_in_mb or reference.info.get(
+            "video_files_size_in_mb", DEFAULT_VIDEO_FILE_SIZE_IN_MB
+        )
+        self.info.update(
+            chunks_size=self.chunks_size, data_files_size_in_mb=self.data_mb, video_files_size_in_mb=self.video_mb
+        )
+        self.features = reference.info["features"]
+        self.video_keys = reference.video_keys
+
+        self.tasks = {}
+        self.episodes = []
+        self.stats = None
+        self.total_frames = 0
+
+        self._schema = None
+        self._writer = None
+        self._data_index = (0, 0)
+        self._data_bytes = 0
+        # 動画のキーごとに、出力中のファイルに入れる元ファイルと現在の長さ
+        self._video = {
+            key: {"index": (0, 0), "members": [], "mb": 0.0, "duration": 0.0} for key in self.video_keys
+        }
+
+    def compatible(self, source: SessionDataset):
+        """fps・特徴量 (動画のコーデック等を含む) が同じでなければ連結できない"""
+        if source.fps != self.info["fps"]:
+            return f"fps {source.fps} != {self.info['fps']}"
+        if source.info.get("robot_type") != self.info.get("robot_type"):
+            return f"robot_type {source.info.get('robot_type')} != {self.info.get('robot_type')}"
+        if source.info["features"] != self.features:
+            return "features differ"
+        return None
+
+    # --- data -------------------------------------------------------------
+
+    def _data_path(self) -> Path:
+        chunk_index, file_index = self._data_index
+        return self.root / DEFAULT_DATA_PATH.format(chunk_index=chunk_index, file_index=file_index)
+
+    def _begin_episode_data(self):
+        """エピソードは 1 つのファイルに収める。サイズを超えていたらエピソードの境目で次のファイルに移る"""
+        if self._writer is not None and self._data_bytes >= self.data_mb * 2**20:
+            self._writer.close()
+            self._writer = None
+            self._data_index = update_chunk_file_indices(*self._data_index, self.chunks_size)
+            self._data_bytes = 0
+        if self._writer is None:
+            path = self._data_path()
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self._writer = pq.ParquetWriter(path, self._schema)
+        return self._data_index
+
+    def _write_rows(self, table: pa.Table, episode_index: int, task_map: np.ndarray):
+        n = table.num_rows
+        columns = {
+            "episode_index": np.full(n, episode_index, dtype=np.int64),
+            "index": np.arange(self.total_frames, self.total_frames + n, dtype=np.int64),
+            "task_index": task_map[table["task_index"].to_numpy()],
+        }
+        for name, values in columns.items():
+            i = table.schema.get_field_index(name)
+            table = table.set_column(i, name, pa.array(values, type=table.schema.field(name).type))
+        self._writer.write_table(table.cast(self._schema))
+        self._data_bytes += table.nbytes
+        self.total_frames += n
+
+    def _stream_data(self, source: SessionDataset, kept: pd.DataFrame, episode_map: dict, task_map: np.ndarray):
+        """元の parquet をバッチで読み、残すエピソードの行だけ振り直して書く。戻り値は新番号 -> (data 位置, from, to)"""
+        placement = {}
+        current = None
+        files = sorted({(int(c), int(f)) for c, f in zip(kept["data/chunk_index"], kept["data/file_index"])})
+        keep_values = pa.array(sorted(episode_map), type=pa.int64())
+        for chunk_index, file_index in files:
+            parquet = pq.ParquetFile(source.data_path(chunk_index, file_index))
+            if self._schema is None:
+                self._schema = parquet.schema_arrow
+            for batch in parquet.iter_batches(batch_size=4096):
+                table = pa.Table.from_batches([batch])
+                table = table.filter(pc.is_in(table["episode_index"].cast(pa.int64()), value_set=keep_values))
+                if table.num_rows == 0:
+                    continue
+                episodes = table["episode_index"].to_numpy()
+                # バッチの中のエピソードの切れ目ごとに分けて書く
+                bounds = np.concatenate(([0], np.flatnonzero(np.diff(episodes)) + 1, [len(episodes)]))
+                for start, end in zip(bounds[:-1], bounds[1:]):
+                    new_index = episode_map[int(episodes[start])]
+                    if new_index != current:
+                        if current is not None:
+                            placement[current][2] = self.total_frames
+                        current = new_index
+                        placement[current] = [self._begin_episode_data(), self.total_frames, None]
+                    self._write_rows(table.slice(start, end - start), new_index, task_map)
+        if current is not None:
+            placement[current][2] = self.total_frames
+        return placement
+
+    # --- videos -----------------------------------------------------------
+
+    def _flush_video(self, key: str):
+        state = self._video[key]
+        if not state["members"]:
+            return
+        chunk_index, file_index = state["index"]
+        dst = self.root / DEFAULT_VIDEO_PATH.format(video_key=key, chunk_index=chunk_index, file_index=file_index)
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        if len(state["members"]) == 1:
+            shutil.copy2(state["members"][0], dst)
+        else:
+            # concat demuxer でパケットをそのままコピーする (再エンコードしない)
+            concatenate_video_files(state["members"], dst)
+        state["members"] = []
+
+    def _place_video(self, key: str, path: Path, duration: float):
+        """元の動画ファイルを出力のどのファイルの何秒目に置くかを決める (書き出しは _flush_video で行う)"""
+        state = self._video[key]
+        size_mb = path.stat().st_size / 2**20
+        if state["members"] and state["mb"] + size_mb >= self.video_mb:
+            self._flush_video(key)
+            state["index"] = update_chunk_file_indices(*state["index"], self.chunks_size)
+            state["mb"] = 0.0
+            state["duration"] = 0.0
+        offset = state["duration"]
+        state["members"].append(path)
+        state["mb"] += size_mb
+        state["duration"] += duration
+        return state["index"], offset
+
+    # --- sessions ---------------------------------------------------------
+
+    def add(self, source: SessionDataset, kept: pd.DataFrame):
+        if kept.empty:
+            return 0
+        # タスク名で突き合わせて番号を振り直す (落としたエピソードだけのタスクは持ち込まない)
+        used = {task for tasks in kept["tasks"] for task in tasks}
+        task_map = np.zeros(int(source.tasks["task_index"].max()) + 1, dtype=np.int64)
+        for task, row in source.tasks.iterrows():
+            if task in used:
+                task_map[int(row["task_index"])] = self.tasks.setdefault(task, len(self.tasks))
+
+        first = len(self.episodes)
+        episode_map = {int(e): first + i for i, e in enumerate(kept["episode_index"])}
+        placement = self._stream_data(source, kept, episode_map, task_map)
+
+        # 残すエピソードが 1 つも参照しない動画ファイルはコピーしない
+        videos = {}
+        for key in self.video_keys:
+            files = sorted(
+                {(int(c), int(f)) for c, f in zip(kept[f"videos/{key}/chunk_index"], kept[f"videos/{key}/file_index"])}
+            )
+            for chunk_index, file_index in files:
+                path = source.video_path(key, chunk_index, file_index)
+                videos[(key, chunk_index, file_index)] = self._place_video(key, path, source.video_duration(path))
+
+        for _, row in kept.iterrows():
+            new_index = episode_map[int(row["episode_index"])]
+            (data_chunk, data_file), start, end = placement[new_index]
+            episode = row.to_dict()
+            episode.update(
+                {
+                    "episode_index": new_index,
+                    "data/chunk_index": data_chunk,
+                    "data/file_index": data_file,
+                    "dataset_from_index": start,
+                    "dataset_to_index": end,
+                    "meta/episodes/chunk_index": 0,
+                    "meta/episodes/file_index": 0,
+                }
+            )
+            for key in self.video_keys:
+                (chunk_index, file_index), offset = videos[
+                    (key, int(row[f"videos/{key}/chunk_index"]), int(row[f"videos/{key}/file_index"]))
+                ]
+                episode[f"videos/{key}/chunk_index"] = chunk_index
+                episode[f"videos/{key}/file_index"] = file_index
+                episode[f"videos/{key}/from_timestamp"] = row[f"videos/{key}/from_timestamp"] + offset
+                episode[f"videos/{key}/to_timestamp"] = row[f"videos/{key}/to_timestamp"] + offset
+            self.episodes.append(episode)
+
+            # 統計量はエピソードごとに合成していく (全フレームを持たない)
+            stats = episode_stats(row)
+            self.stats = stats if self.stats is None else aggregate_stats([self.stats, stats])
+        return len(kept)
+
+    def finish(self):
+        if self._writer is not None:
+            self._writer.close()
+        for key in self.video_keys:
+            self._flush_video(key)
+
+        path = self.root / DEFAULT_EPISODES_PATH.format(chunk_index=0, file_index=0)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        pd.DataFrame(self.episodes).to_parquet(path)
+        write_tasks(
+            pd.DataFrame({"task_index": list(self.tasks.values())}, index=pd.Index(list(self.tasks), name="task")),
+            self.root,
+        )
+        if self.stats is not None:
+            write_stats(self.stats, self.root)
+        self.info.update(
+            total_episodes=len(self.episodes),
+            total_frames=self.total_frames,
+            total_tasks=len(self.tasks),
+            splits={"train": f"0:{len(self.episodes)}"},
+        )
+        write_info(self.info, self.root)
+
+
+def find_sessions(home: Path, prefix: str):
+    """HF_LEROBOT_HOME の下の <prefix>-<timestamp> を古い順に返す"""
+    parent = home / Path(prefix).parent
+    return sorted(p for p in parent.glob(f"{Path(prefix).name}-*") if (p / INFO_PATH).exists())
+
+
+def compact(
+    roots,
+    out: Path,
+    min_frames: int = 1,
+    dry_run: bool = False,
+    overwrite: bool = False,
+    data_files_size_in_mb: float = None,
+    video_files_size_in_mb: float = None,
+):
+    start = time.monotonic()
+    out = Path(out).expanduser()
+    if out.exists() and not overwrite and not dry_run:
+        raise FileExistsError(f"{out} already exists (use --overwrite)")
+    tmp = out.with_name(out.name + ".tmp")
+
+    compactor = None
+    dropped = Counter()
+    kept_total = sessions = 0
+    for root in roots:
+        source = SessionDataset(root)
+        if source.episodes.empty:
+            print(f"[Compact] {source.name}: no episodes, skipped")
+            dropped["empty session"] += 1
+            continue
+        if compactor is None:
+            if not dry_run:
+                shutil.rmtree(tmp, ignore_errors=True)
+            compactor = DatasetCompactor(tmp, source, data_files_size_in_mb, video_files_size_in_mb)
+        reason = compactor.compatible(source)
+        if reason:
+            print(f"[Compact] {source.name}: incompatible ({reason}), skipped")
+            dropped["incompatible session"] += 1
+            continue
+
+        verdicts = source.check(min_frames)
+        kept = source.episodes[[verdicts[int(e)] is None for e in source.episodes["episode_index"]]]
+        reasons = Counter(v for v in verdicts.values() if v)
+        dropped.update(reasons)
+        if not dry_run:
+            compactor.add(source, kept)
+        kept_total += len(kept)
+        sessions += 1
+        detail = f", dropped {dict(reasons)}" if reasons else ""
+        print(f"[Compact] {source.name}: kept {len(kept)}/{len(source.episodes)}{detail}")
+
+    if compactor is None:
+        print("[Compact] nothing to merge")
+        return None
+    if dry_run:
+        print(f"[Compact] dry run: {sessions} sessions, {kept_total} episodes would be kept, dropped {dict(dropped)}")
+        return None
+
+    compactor.finish()
+    if out.exists():
+        shutil.rmtree(out)
+    tmp.rename(out)
+    size = sum(p.stat().st_size for p in out.rglob("*") if p.is_file())
+    print(
+        f"[Compact] {out}: {sessions} sessions -> {len(compactor.episodes)} episodes, "
+        f"{compactor.total_frames} frames, {len(compactor.tasks)} tasks, {size / 2**20:.1f} MB "
+        f"({time.monotonic() - start:.1f}s), dropped {dict(dropped)}"
+    )
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="セッションごとの LeRobot データセットを 1 つにまとめる")
+    parser.add_argument(
+        "roots",
+        nargs="*",
+        help="まとめるデータセットのディレクトリ (省略時は HF_LEROBOT_HOME の HF_DATASET_ID と同じ名前のもの)",
+    )
+    parser.add_argument("--out", required=True, help="出力先のディレクトリ")
+    parser.add_argument("--home", default=str(HF_LEROBOT_HOME), help="roots を省略したときに探す場所")
+    parser.add_argument("--min-frames", type=int, default=1, help="これより短いエピソードは落とす")
+    parser.add_argument("--data-mb", type=float, default=None, help="parquet 1 ファイルの目安サイズ")
+    parser.add_argument("--video-mb", type=float, default=None, help="動画 1 ファイルの目安サイズ")
+    parser.add_argument("--overwrite", action="store_true")
+    parser.add_argument("--dry-run", action="store_true", help="書き出さずに残す・落とすエピソードだけ表示する")
+    args = parser.parse_args()
+
+    roots = [Path(r).expanduser() for r in args.roots] or find_sessions(
+        Path(args.home).expanduser(), HF_DATASET_ID.rsplit("-", 1)[0]
+    )
+    print(f"[Compact] {len(roots)} datasets")
+    compact(
+        roots,
+        args.out,
+        min_frames=args.min_frames,
+        dry_run=args.dry_run,
+        overwrite=args.overwrite,
+        data_files_size_in_mb=args.data_mb,
+        video_files_size_in_mb=args.video_mb,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -4,9 +4,43 @@ FPS = 30
 EPISODE_TIME_SEC = 60
 TASK_DESCRIPTION = "potato system release"
 HF_MODEL_ID = "charokoukuu/record-potato-release-6"
+# CPU 向けの ACT 最適化 (act_optimize.py)。compile は None / "torch_compile" / "torchscript"
+ACT_OPTIMIZE_CONFIG = {
+    "quantize": False,
+    "compile": None,
+    "num_threads": None,
+    "interop_threads": None,
+    "parity_tolerance": 0.05,  # 正規化された行動の最大絶対誤差。超えたら fp32 に戻す
+}
+# 記録済み観測 (benchmarks/bench_act_optimize.py --save-observations で作る)。無ければパリティ検査を省く
+ACT_PARITY_OBSERVATIONS = "act_observations.pt"
+# "async" にすると次の行動チャンクを裏で推論しておき、継ぎ目を合成する (act_prefetch.py)
+ACT_INFERENCE_MODE = "sync"
+ACT_PREFETCH_CONFIG = {
+    "lead": 10,
+    "blend": "linear",  # "replace" / "linear" / "ensemble"
+    "blend_steps": 10,
+    "ensemble_coeff": 0.01,
+}
 
 timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
 HF_DATASET_ID = f"charokoukuu/eval_record-potato-release-{timestamp}"
+DATASET_IMAGE_WRITER_THREADS = 4
+# ロボットの状態でエピソードを終える (episode_monitor.py)。None にすると EPISODE_TIME_SEC まで記録する
+EPISODE_MONITOR_CONFIG = {
+    "velocity_threshold": 3.0,  # 関節速度 (単位/秒) の最大値がこれ未満なら止まっているとみなす
+    "settle_time": 1.0,
+    "min_travel": 15.0,  # 開始姿勢からこれだけ動いたら提供の動作があったとみなす
+    "pose_region": None,  # {関節: (下限, 上限)}。None なら開始姿勢 ± pose_tolerance
+    "pose_tolerance": 10.0,
+    "min_time": 3.0,
+    "keep_tail": 0.5,  # 止まり始めてから残す秒数。それより後のフレームは保存前に削る
+}
+# 保存待ちエピソードの上限 (episode_finalizer.py)。超えると次のエピソード開始を待たせる
+FINALIZE_MAX_PENDING = 2
+
+# 起動時に並列で準備するステージの数 (startup.py)
+STARTUP_WORKERS = 4
 
 ROBOT_PORT = "/dev/ttyACM1"
 ROBOT_ID = "pullup_follower_arm"
@@ -21,6 +55,82 @@ BLE_INITIAL_VALUE = 100
 BLE_INCREMENT = 40
 
 MOUTH_MODEL_PATH = "yolo/mouth_classification/mouth_cls_model/weights/best.pt"
+# "ultralytics" | "onnx" | "torchscript" (onnx / torchscript は best.onnx / best.torchscript を読む)
+# "auto" は train_mouth_detector.py --export が書いた manifest.json の成果物を読み、無ければ best.pt を使う
+# (manifest を書いた後に best.pt が変わっていたら manifest は使わない)
+MOUTH_BACKEND = "auto"
+MOUTH_IMGSZ = 224
+MOUTH_NUM_THREADS = None
+# 状態に応じた推論頻度 (yolo/scheduler.py)。None にすると毎フレーム推論する
+MOUTH_SCHEDULER_CONFIG = {
+    "idle_fps": 5.0,
+    "episode_fps": 3.0,
+    "active_fps": 30.0,
+    "suspect_threshold": 0.2,
+    "cpu_budget": None,
+}
+# フレームがほとんど変わっていなければ分類せず前回の結果を使う (yolo/motion_gate.py)。None で無効
+MOUTH_MOTION_GATE_CONFIG = {
+    "size": (32, 24),  # 比較に使うサムネイルの (幅, 高さ)
+    "mean_threshold": 3.0,  # サムネイルの差の平均 (0-255)
+    "block_threshold": 20.0,  # 1 ブロックの差 (0-255)
+    "block_fraction": 0.02,  # 変化したブロックの割合
+    "refresh_interval": 0.5,  # 変化が無くてもこの秒数ごとに分類する
+}
+# 口まわりだけを切り出して分類する (ROI で学習したモデルが必要)。yolo/mouth_roi.py
+MOUTH_ROI_ENABLED = False
+MOUTH_ROI_CONFIG = {
+    "min_score": 0.6,
+    "redetect_interval": 30,
+    "margin": 0.2,
+    "detect_width": 320,
+}
+# "none" (ヘッドレス) | "window" | "mjpeg" (http://127.0.0.1:MOUTH_PREVIEW_PORT/)
+MOUTH_PREVIEW = "window"
+MOUTH_PREVIEW_FPS = 10
+MOUTH_PREVIEW_PORT = 8090
+# yolo/mouth_state.py の MouthStateEngine に渡すパラメータ (秒 / 確率)
+MOUTH_STATE_CONFIG = {
+    "smoothing_tau": 0.15,
+    "open_on": 0.7,
+    "open_off": 0.4,
+    "open_dwell": 0.0,
+    "chip_on": 0.6,
+    "chip_off": 0.3,
+    "chip_dwell": 3.0,
+    "stop_delay": 2.0,
+}
+# "process" にすると口の検出を別プロセスで動かし、フレームは共有メモリで渡す (yolo/detector_process.py)
+MOUTH_DETECTOR_MODE = "thread"
+MOUTH_SHM_SLOTS = 4
+MOUTH_PROCESS_MAX_RESTARTS = 5
+# リスト (例: [5, 6]) にすると複数カメラの最新フレームをまとめて推論する
 MOUTH_CAMERA_INDEX = 5
 MOUTH_CAMERA_WIDTH = 320
 MOUTH_CAMERA_HEIGHT = 240
+
+# レイテンシ計測 (tracing.py)。ダンプは benchmarks/trace_report.py で集計する
+TRACE_ENABLED = True
+TRACE_SUMMARY_INTERVAL_SEC = 60
+TRACE_DUMP_PATH = f"traces/session_{timestamp}.jsonl"
+
+# 複数ステーション (multi_station.py)。ステーションごとにロボット・カメラ・口検出カメラ・BLE ケースを持つ
+# 書かなかった項目は上の単体構成の値を使い、データセットは HF_DATASET_ID-<name> に記録する
+STATIONS = [
+    {
+        "name": "station1",
+        "robot_port": ROBOT_PORT,
+        "robot_id": ROBOT_ID,
+        "camera_front_index": CAMERA_FRONT_INDEX,
+        "camera_front2_index": CAMERA_FRONT2_INDEX,
+        "mouth_camera_index": MOUTH_CAMERA_INDEX,
+        "ble_address": BLE_DEVICE_ADDRESS,
+        # "preview" / "preview_port" で口検出のプレビューを変えられる
+        # (省略時は MOUTH_PREVIEW と、MOUTH_PREVIEW_PORT + STATIONS 内の順番)
+    },
+]
+MULTI_STATION_CONFIG = {
+    "batch_window": 0.015,  # 最初のチャンク要求からこの秒数までに来た要求を 1 回の推論にまとめる (1 tick = 1 / FPS)
+    "max_batch": None,  # None ならステーション数
+    "share_mouth_model": True,  # 口の分類モデルも 1 つを共有する
+}
@@ -0,0 +1,160 @@
+"""
+エピソードの保存 (画像の書き出し待ち・動画エンコード・parquet/メタデータ更新) を
+制御ループの外で行う。
+
+record_loop が終わったらエピソードバッファを切り離してキューに積み、次のエピソードは
+新しいバッファで始める。保存は 1 本のワーカースレッドが順番に行う
+(LeRobotDataset のメタデータ更新はエピソード順に直列でなければならないため)。
+
+バッファのエピソード番号は submit() の時点で決まるので、1 本の保存に失敗すると
+それ以降のバッファはすべて番号がずれて保存できない。失敗したら残りは保存せずに捨て、
+次の submit() か close() で例外にして呼び出し側 (main.py の run) に知らせる。
+"""
+
+import queue
+import threading
+import time
+
+from episode_monitor import trim_episode_buffer
+
+
+class EpisodeFinalizer:
+    def __init__(self, dataset, max_pending: int = 2, tracer=None):
+        """
+        Args:
+            dataset: LeRobotDataset
+            max_pending: 保存待ちエピソードの上限。超えると submit() が待つ (バックプレッシャー)
+        """
+        self.dataset = dataset
+        self.tracer = tracer
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._thread = threading.Thread(
+            target=self._run, name="episode-finalizer", daemon=True
+        )
+        self._lock = threading.Lock()
+
+        self.submitted = 0
+        self.saved = 0
+        self.failed = 0
+        self.frames_saved = 0
+        self.frames_trimmed = 0
+        self.busy_time = 0.0
+        self.backpressure_time = 0.0
+        self.error = None
+        self._error_raised = False
+
+        self._thread.start()
+
+    def submit(self, keep_frames: int = None) -> bool:
+        """
+        現在のエピソードバッファを保存キューに回し、データセットに新しいバッファを用意する。
+        フレームが無ければ何もしない。keep_frames を渡すと、保存前に先頭のそのフレーム数だけに切り詰める。
+        前のエピソードの保存に失敗していたら RuntimeError を投げる。
+        """
+        self._raise_error()
+        buffer = self.dataset.episode_buffer
+        if buffer is None or buffer["size"] == 0:
+            return False
+
+        episode_index = buffer["episode_index"]
+        self.dataset.episode_buffer = self.dataset.create_episode_buffer(
+            episode_index=episode_index + 1
+        )
+
+        start = time.monotonic()
+        self._queue.put((buffer, keep_frames))
+        waited = time.monotonic() - start
+        with self._lock:
+            self.submitted += 1
+            self.backpressure_time += waited
+        if self.tracer:
+            self.tracer.record("finalize_backpressure", waited, start)
+            self.tracer.gauge("finalize_queue_depth", self._queue.qsize())
+        if waited > 0.01:
+            print(f"[Finalizer] waited {waited:.2f}s for a free slot")
+        return True
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                break
+            buffer, keep_frames = item
+            with self._lock:
+                failed_before = self.error is not None
+                if failed_before:
+                    self.failed += 1
+            if failed_before:
+                # エピソード番号がずれているので保存できない
+                print(f"[Finalizer] episode {buffer['episode_index']} dropped (an earlier save failed)")
+                self._queue.task_done()
+                continue
+            start = time.monotonic()
+            try:
+                if keep_frames is not None:
+                    trimmed = trim_episode_buffer(self.dataset, buffer, keep_frames)
+                    if trimmed:
+                        with self._lock:
+                            self.frames_trimmed += trimmed
+                        print(f"[Finalizer] trimmed {trimmed} idle frames from episode {buffer['episode_index']}")
+                self.dataset.save_episode(episode_data=buffer)
+                elapsed = time.monotonic() - start
+                with self._lock:
+                    self.saved += 1
+                    self.frames_saved += buffer["size"]
+                    self.busy_time += elapsed
+                if self.tracer:
+                    self.tracer.record("finalize_episode", elapsed, start)
+                print(
+                    f"[Finalizer] episode {buffer['episode_index']} saved "
+                    f"({buffer['size']} frames, {elapsed:.2f}s, "
+                    f"{buffer['size'] / max(elapsed, 1e-6):.0f} frames/s, "
+                    f"queue {self._queue.qsize()})"
+                )
+            except Exception as e:
+                with self._lock:
+                    self.failed += 1
+                    self.error = e
+                print(f"[Finalizer] episode {buffer['episode_index']} failed: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _raise_error(self):
+        with self._lock:
+            error = self.error if not self._error_raised else None
+            self._error_raised = self._error_raised or error is not None
+        if error is not None:
+            raise RuntimeError(f"Episode save failed, stopping the session: {error}") from error
+
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "queue_depth": self._queue.qsize(),
+                "submitted": self.submitted,
+                "saved": self.saved,
+                "failed": self.failed,
+                "frames_per_sec": self.frames_saved / self.busy_time if self.busy_time else 0.0,
+                "frames_trimmed": self.frames_trimmed,
+                "backpressure_sec": round(self.backpressure_time, 3),
+            }
+
+    def close(self, timeout: float = None):
+        """
+        キューに残ったエピソードをすべて保存し、データセットを閉じる。
+        保存に失敗していて、まだ submit() で知らせていなければ RuntimeError を投げる。
+        """
+        if self._thread is None:
+            return
+        pending = self._queue.qsize()
+        if pending:
+            print(f"[Finalizer] flushing {pending} episode(s)...")
+        self._queue.put(None)
+        self._thread.join(timeout)
+        self._thread = None
+        self.dataset.finalize()
+        print(f"[Finalizer] {self.stats()}")
+        self._raise_error()
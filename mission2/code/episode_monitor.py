@@ -0,0 +1,208 @@
+"""
+ロボットの状態からエピソードの終わりを判定する
+
+record_loop を早く抜ける経路は、口検出がチップを確認したとき (events["exit_early"]) しかない。
+検出を取りこぼすと、提供を終えて止まっているアームを EPISODE_TIME_SEC いっぱいまで記録・エンコードしてしまう。
+
+EpisodeMonitor はフォロワーの観測 (関節位置) を毎 tick 受け取り、
+
+1. エピソード開始時の姿勢から min_travel 以上動いた (提供の動作が行われた) あと、
+2. 関節位置が pose_region の中に入り、
+3. 関節速度の最大値が velocity_threshold 未満の状態が settle_time 続いた
+
+ところで events["exit_early"] を立てる。止まり始めたフレームから keep_tail 秒より後は
+記録しても情報が無いので、保存前に trim_episode_buffer() でエピソードバッファから落とす。
+"""
+
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+
+class EpisodeMonitor:
+    def __init__(
+        self,
+        joints,
+        fps: float = 30,
+        velocity_threshold: float = 3.0,
+        settle_time: float = 1.0,
+        min_travel: float = 15.0,
+        pose_region: dict = None,
+        pose_tolerance: float = 10.0,
+        min_time: float = 3.0,
+        keep_tail: float = 0.5,
+        tracer=None,
+    ):
+        """
+        Args:
+            joints: 監視する関節のキー ("shoulder_pan.pos" など)
+            velocity_threshold: 止まっているとみなす関節速度の上限 (単位/秒、全関節の最大値)
+            settle_time: 止まった状態がこの秒数続いたら終了する
+            min_travel: 開始姿勢からこれだけ離れるまでは提供前とみなし、終了させない
+            pose_region: {関節: (下限, 上限)}。None なら開始姿勢 ± pose_tolerance
+            min_time: エピソード開始からこの秒数は終了させない
+            keep_tail: 止まり始めてから残すフレームの秒数
+        """
+        self.joints = list(joints)
+        self.fps = fps
+        self.velocity_threshold = velocity_threshold
+        self.settle_time = settle_time
+        self.min_travel = min_travel
+        self.pose_region = pose_region
+        self.pose_tolerance = pose_tolerance
+        self.min_time = min_time
+        self.keep_tail = keep_tail
+        self.tracer = tracer
+
+        self._lock = threading.Lock()
+        self._active = False
+        self._events = None
+        self._dataset = None
+        self._reset_episode()
+
+        self.episodes = 0
+        self.settled = 0
+
+    def _reset_episode(self):
+        self._start_time = None
+        self._start_pose = None
+        self._lower = None
+        self._upper = None
+        self._previous = None
+        self._delivered = False
+        self._idle_since = None
+        self._idle_frame = None
+        self._fired = False
+
+    def start(self, events: dict, dataset=None):
+        """record_loop の直前に呼ぶ"""
+        with self._lock:
+            self._events = events
+            self._dataset = dataset
+            self._reset_episode()
+            self._active = True
+
+    def stop(self):
+        """
+        record_loop の直後に呼ぶ。
+
+        Returns:
+            エピソードに残すフレーム数。削る必要が無ければ None
+        """
+        with self._lock:
+            self._active = False
+            self.episodes += 1
+            if not self._fired or self._idle_frame is None:
+                return None
+            self.settled += 1
+            return self._idle_frame + int(round(self.keep_tail * self.fps))
+
+    def _set_region(self, pose: np.ndarray):
+        if self.pose_region:
+            self._lower = np.array([self.pose_region.get(k, (-np.inf, np.inf))[0] for k in self.joints])
+            self._upper = np.array([self.pose_region.get(k, (-np.inf, np.inf))[1] for k in self.joints])
+        else:
+            self._lower = pose - self.pose_tolerance
+            self._upper = pose + self.pose_tolerance
+
+    def _frame_index(self) -> int:
+        buffer = getattr(self._dataset, "episode_buffer", None) if self._dataset is not None else None
+        return buffer["size"] if buffer is not None else 0
+
+    def observe(self, observation: dict, now: float = None):
+        """フォロワーの観測を 1 つ受け取る (record_loop の外の観測は無視する)"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            if not self._active or self._fired:
+                return
+            pose = np.array([observation.get(k, 0.0) for k in self.joints], dtype=float)
+            if self._start_pose is None:
+                self._start_time = now
+                self._start_pose = pose
+                self._set_region(pose)
+                self._previous = (now, pose)
+                return
+
+            t_prev, p_prev = self._previous
+            self._previous = (now, pose)
+            dt = now - t_prev
+            if dt <= 0:
+                return
+            speed = float(np.max(np.abs(pose - p_prev))) / dt
+
+            if not self._delivered:
+                if float(np.max(np.abs(pose - self._start_pose))) >= self.min_travel:
+                    self._delivered = True
+                return
+
+            in_region = bool(np.all(pose >= self._lower) and np.all(pose <= self._upper))
+            if speed >= self.velocity_threshold or not in_region:
+                self._idle_since = None
+                self._idle_frame = None
+                return
+
+            if self._idle_since is None:
+                self._idle_since = now
+                self._idle_frame = self._frame_index()
+                return
+
+            if now - self._idle_since >= self.settle_time and now - self._start_time >= self.min_time:
+                self._fired = True
+                self._events["exit_early"] = True
+                print(
+                    f"[EpisodeMonitor] arm settled for {now - self._idle_since:.1f}s, "
+                    f"ending episode at {now - self._start_time:.1f}s"
+                )
+                if self.tracer:
+                    self.tracer.record("settle_to_exit", now - self._idle_since, self._idle_since)
+
+    def watch(self, robot):
+        """robot.get_observation を包んで、観測を observe() に流す"""
+        get_observation = robot.get_observation
+
+        def watched_get_observation():
+            observation = get_observation()
+            self.observe(observation)
+            return observation
+
+        robot.get_observation = watched_get_observation
+        return robot
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "episodes": self.episodes,
+                "settled": self.settled,
+            }
+
+
+def trim_episode_buffer(dataset, buffer: dict, size: int) -> int:
+    """
+    エピソードバッファを先頭 size フレームに切り詰める。保存 (save_episode) の直前に呼ぶ。
+
+    画像・動画の特徴量はバッファに書き出し先のパスが入っていて、動画はディレクトリ内の画像から
+    エンコードされるので、削ったフレームの画像ファイルも消す。
+
+    Returns:
+        削ったフレーム数
+    """
+    removed = buffer["size"] - size
+    if size <= 0 or removed <= 0:
+        return 0
+
+    camera_keys = set(getattr(dataset.meta, "camera_keys", []))
+    if camera_keys and hasattr(dataset, "_wait_image_writer"):
+        # 非同期で書き出し中の画像を消してしまわないよう、書き出しが終わるのを待つ
+        dataset._wait_image_writer()
+
+    for key, value in buffer.items():
+        if not isinstance(value, list) or len(value) <= size:
+            continue
+        if key in camera_keys:
+            for path in value[size:]:
+                Path(path).unlink(missing_ok=True)
+        del value[size:]
+    buffer["size"] = size
+    return removed
@@ -1,5 +1,8 @@
 import threading
-import asyncio
+import time
+from pathlib import Path
+
+import numpy as np
 
 from lerobot.cameras.opencv.configuration_opencv import OpenCVCameraConfig
 from lerobot.datasets.lerobot_dataset import LeRobotDataset
@@ -10,7 +13,8 @@ from lerobot.processor import make_default_processors
 from lerobot.robots.so101_follower.config_so101_follower import SO101FollowerConfig
 from lerobot.robots.so101_follower.so101_follower import SO101Follower
 from lerobot.scripts.lerobot_record import record_loop
-from lerobot.utils.control_utils import init_keyboard_listener
+from lerobot.utils.control_utils import init_keyboard_listener, predict_action
+from lerobot.utils.utils import get_safe_torch_device
 from lerobot.utils.visualization_utils import init_rerun
 
 from config import (
@@ -18,6 +22,10 @@ from config import (
     EPISODE_TIME_SEC,
     TASK_DESCRIPTION,
     HF_MODEL_ID,
+    ACT_INFERENCE_MODE,
+    ACT_PREFETCH_CONFIG,
+    ACT_OPTIMIZE_CONFIG,
+    ACT_PARITY_OBSERVATIONS,
     HF_DATASET_ID,
     ROBOT_PORT,
     ROBOT_ID,
@@ -32,82 +40,260 @@ from config import (
     MOUTH_CAMERA_INDEX,
     MOUTH_CAMERA_WIDTH,
     MOUTH_CAMERA_HEIGHT,
+    MOUTH_BACKEND,
+    MOUTH_IMGSZ,
+    MOUTH_NUM_THREADS,
+    MOUTH_STATE_CONFIG,
+    MOUTH_SCHEDULER_CONFIG,
+    MOUTH_ROI_ENABLED,
+    MOUTH_ROI_CONFIG,
+    MOUTH_MOTION_GATE_CONFIG,
+    MOUTH_PREVIEW,
+    MOUTH_PREVIEW_FPS,
+    MOUTH_PREVIEW_PORT,
+    MOUTH_DETECTOR_MODE,
+    MOUTH_SHM_SLOTS,
+    MOUTH_PROCESS_MAX_RESTARTS,
+    TRACE_ENABLED,
+    TRACE_SUMMARY_INTERVAL_SEC,
+    TRACE_DUMP_PATH,
+    STARTUP_WORKERS,
+    DATASET_IMAGE_WRITER_THREADS,
+    FINALIZE_MAX_PENDING,
+    EPISODE_MONITOR_CONFIG,
 )
+from yolo.detector_process import DetectorProcess
 from yolo.mouth_detector import MouthDetector
+from yolo.motion_gate import MotionGate
+from yolo.mouth_roi import MouthRoiTracker
+from yolo.preview import make_preview
+from yolo.scheduler import InferenceScheduler
+from act_optimize import optimize_with_parity
+from act_prefetch import ChunkPrefetchPolicy
 from ble_controller import BLEController
+from episode_finalizer import EpisodeFinalizer
+from episode_monitor import EpisodeMonitor
 from robot_controller import RobotController
+from startup import StartupPipeline
+from tracing import Tracer
 
 
 class RecordingSystem:
-    def __init__(self):
+    # シミュレーション (sim/sim_system.py) などで差し替える
+    dataset_root = None
+    max_episodes = None
+    episode_time_sec = EPISODE_TIME_SEC
+    # 複数ステーション (multi_station.py) で共有するポリシー・口の分類モデル
+    shared_policy = None
+    shared_mouth_backend = None
+
+    def __init__(self, ble_client_factory=None, station: dict = None):
+        """
+        station: 複数ステーションで動かすときの機器とデータセット名 (config.py の STATIONS の 1 つ)。
+            None なら config.py の単体構成
+        """
+        station = station or {}
+        self.station_name = station.get("name")
+        self.robot_port = station.get("robot_port", ROBOT_PORT)
+        self.robot_id = station.get("robot_id", ROBOT_ID)
+        self.camera_indices = {
+            "front": station.get("camera_front_index", CAMERA_FRONT_INDEX),
+            "front2": station.get("camera_front2_index", CAMERA_FRONT2_INDEX),
+        }
+        self.mouth_camera_index = station.get("mouth_camera_index", MOUTH_CAMERA_INDEX)
+        self.dataset_id = f"{HF_DATASET_ID}-{self.station_name}" if self.station_name else HF_DATASET_ID
+        self.log_prefix = f"[{self.station_name}] " if self.station_name else ""
+        # ステーションごとに別のウィンドウ・ポートで表示する
+        self.preview = (
+            station.get("preview", MOUTH_PREVIEW),
+            MOUTH_PREVIEW_FPS,
+            station.get("preview_port", MOUTH_PREVIEW_PORT),
+            f"Mouth Detection ({self.station_name})" if self.station_name else "Mouth Detection",
+        )
+        trace_path = Path(TRACE_DUMP_PATH)
+        if self.station_name:
+            trace_path = trace_path.with_name(f"{trace_path.stem}_{self.station_name}{trace_path.suffix}")
+
         self.ble_value = BLE_INITIAL_VALUE
         self.episode_count = 0
-        self.ble = BLEController(BLE_DEVICE_ADDRESS)
+        self.stop_event = threading.Event()
+        self.tracer = (
+            Tracer(
+                session=trace_path.stem,
+                dump_path=str(trace_path),
+                summary_interval=TRACE_SUMMARY_INTERVAL_SEC,
+            )
+            if TRACE_ENABLED
+            else None
+        )
+        ble_kwargs = {"client_factory": ble_client_factory} if ble_client_factory else {}
+        self.ble = BLEController(
+            station.get("ble_address", BLE_DEVICE_ADDRESS), tracer=self.tracer, **ble_kwargs
+        )
         self.events = None
         self.robot = None
         self.mouth_detector = None
         self.robot_controller = None
+        self.finalizer = None
+        self.episode_monitor = None
+        self._awaiting_first_action = False
 
     def setup_robot(self):
         camera_config = {
             "front": OpenCVCameraConfig(
-                index_or_path=CAMERA_FRONT_INDEX,
+                index_or_path=self.camera_indices["front"],
                 width=CAMERA_WIDTH,
                 height=CAMERA_HEIGHT,
                 fps=FPS,
             ),
             "front2": OpenCVCameraConfig(
-                index_or_path=CAMERA_FRONT2_INDEX,
+                index_or_path=self.camera_indices["front2"],
                 width=CAMERA_WIDTH,
                 height=CAMERA_HEIGHT,
                 fps=FPS,
             ),
         }
         robot_config = SO101FollowerConfig(
-            port=ROBOT_PORT, id=ROBOT_ID, cameras=camera_config
+            port=self.robot_port, id=self.robot_id, cameras=camera_config
         )
         self.robot = SO101Follower(robot_config)
         self.robot.connect()
         self.robot_controller = RobotController(self.robot, self.ble)
+        if self.tracer:
+            self._trace_first_action()
 
-    def setup_dataset(self):
+    def _trace_first_action(self):
+        # record_loop の中は触れないので、エピソード最初の send_action を計測点にする
+        send_action = self.robot.send_action
+
+        def traced_send_action(action):
+            if self._awaiting_first_action:
+                self._awaiting_first_action = False
+                self.tracer.since("wake", "wake_to_first_action")
+                self.tracer.since("open_frame", "open_to_first_action")
+            return send_action(action)
+
+        self.robot.send_action = traced_send_action
+
+    def load_policy(self):
         policy = ACTPolicy.from_pretrained(HF_MODEL_ID)
+        observations = (
+            ACT_PARITY_OBSERVATIONS
+            if ACT_PARITY_OBSERVATIONS and Path(ACT_PARITY_OBSERVATIONS).exists()
+            else None
+        )
+        policy, _ = optimize_with_parity(policy, ACT_OPTIMIZE_CONFIG, observations)
+        return policy
 
+    def setup_dataset(self):
         action_features = hw_to_dataset_features(self.robot.action_features, "action")
         obs_features = hw_to_dataset_features(
             self.robot.observation_features, "observation"
         )
         dataset_features = {**action_features, **obs_features}
 
-        dataset = LeRobotDataset.create(
-            repo_id=HF_DATASET_ID,
+        return LeRobotDataset.create(
+            repo_id=self.dataset_id,
             fps=FPS,
             features=dataset_features,
             robot_type=self.robot.name,
+            root=self.dataset_root,
             use_videos=True,
-            image_writer_threads=4,
+            image_writer_threads=DATASET_IMAGE_WRITER_THREADS,
         )
 
-        preprocessor, postprocessor = make_pre_post_processors(
+    def setup_processors(self, policy, dataset):
+        return make_pre_post_processors(
             policy_cfg=policy,
             pretrained_path=HF_MODEL_ID,
             dataset_stats=dataset.meta.stats,
         )
 
-        return dataset, policy, preprocessor, postprocessor
+    def warmup_policy(self, policy, dataset, processors, runs: int = 2):
+        """ダミー観測で推論しておき、最初のエピソードで遅延初期化のコストを払わないようにする"""
+        preprocessor, postprocessor = processors
+        observation = {
+            key: np.zeros(
+                ft["shape"],
+                dtype=np.uint8 if ft["dtype"] in ("image", "video") else np.float32,
+            )
+            for key, ft in dataset.features.items()
+            if key.startswith("observation.")
+        }
+        for _ in range(runs):
+            predict_action(
+                observation,
+                policy,
+                get_safe_torch_device(policy.config.device),
+                preprocessor,
+                postprocessor,
+                policy.config.use_amp,
+                task=TASK_DESCRIPTION,
+                robot_type=self.robot.name,
+            )
+        # ウォームアップで溜まった行動チャンクを捨てる
+        policy.reset()
+        preprocessor.reset()
+        postprocessor.reset()
 
     def on_chip_confirmed(self):
         self.ble_value += BLE_INCREMENT
-        print(f"BLE: {self.ble_value}")
-        asyncio.run(self.ble.send(str(self.ble_value)))
+        print(f"{self.log_prefix}BLE: {self.ble_value}")
+        self.ble.submit(self.ble_value)
+
+    def setup_mouth_detector(self):
+        # 共有するモデルは子プロセスに渡せないので、共有するときはスレッドで動かす
+        if MOUTH_DETECTOR_MODE == "process" and self.shared_mouth_backend is None:
+            # モデルの読み込みとウォームアップは子プロセスで行われ、start() はその完了を待つ
+            self.mouth_detector = DetectorProcess(
+                {
+                    "model_path": MOUTH_MODEL_PATH,
+                    "backend": MOUTH_BACKEND,
+                    "imgsz": MOUTH_IMGSZ,
+                    "num_threads": MOUTH_NUM_THREADS,
+                    "state_config": MOUTH_STATE_CONFIG,
+                    "scheduler_config": MOUTH_SCHEDULER_CONFIG,
+                    "roi_config": MOUTH_ROI_CONFIG if MOUTH_ROI_ENABLED else None,
+                    "motion_gate_config": MOUTH_MOTION_GATE_CONFIG,
+                    "preview": self.preview,
+                },
+                self.mouth_camera_index,
+                MOUTH_CAMERA_WIDTH,
+                MOUTH_CAMERA_HEIGHT,
+                slots=MOUTH_SHM_SLOTS,
+                tracer=self.tracer,
+                max_restarts=MOUTH_PROCESS_MAX_RESTARTS,
+            )
+            return self.mouth_detector.start()
 
-    def setup_monitoring(self, events, recording_started):
         self.mouth_detector = MouthDetector(
             MOUTH_MODEL_PATH,
-            MOUTH_CAMERA_INDEX,
+            self.mouth_camera_index,
             MOUTH_CAMERA_WIDTH,
             MOUTH_CAMERA_HEIGHT,
+            backend=self.shared_mouth_backend or MOUTH_BACKEND,
+            imgsz=MOUTH_IMGSZ,
+            num_threads=MOUTH_NUM_THREADS,
+            state_config=MOUTH_STATE_CONFIG,
+            preview=make_preview(*self.preview),
+            tracer=self.tracer,
+            roi=MouthRoiTracker(**MOUTH_ROI_CONFIG) if MOUTH_ROI_ENABLED else None,
+            motion_gate=(
+                MotionGate(**MOUTH_MOTION_GATE_CONFIG)
+                if MOUTH_MOTION_GATE_CONFIG
+                else None
+            ),
+            scheduler=(
+                InferenceScheduler(**MOUTH_SCHEDULER_CONFIG)
+                if MOUTH_SCHEDULER_CONFIG
+                else None
+            ),
         )
+        if self.mouth_detector.model is not None:
+            self.mouth_detector.model.warmup()
+        return self.mouth_detector
+
+    def start_monitoring(self, events, recording_started):
         self.events = events
 
         mouth_thread = threading.Thread(
@@ -117,35 +303,106 @@ class RecordingSystem:
         )
         mouth_thread.start()
 
-    def run(self):
-        self.setup_robot()
-        dataset, policy, preprocessor, postprocessor = self.setup_dataset()
+    def startup(self):
+        # 互いに独立な準備は並行して進める (BLE の接続も裏で進む)
+        pipeline = StartupPipeline(max_workers=STARTUP_WORKERS, tracer=self.tracer)
+        pipeline.add("ble", self.ble.start)
+        pipeline.add("robot", self.setup_robot)
+        if self.shared_policy is not None:
+            # 共有ポリシー (multi_station.py) は MultiStationOrchestrator が読み込み済み
+            pipeline.add("policy", lambda: self.shared_policy)
+        else:
+            pipeline.add("policy", self.load_policy)
+        pipeline.add("mouth_detector", self.setup_mouth_detector)
+        pipeline.add("dataset", lambda _: self.setup_dataset(), deps=("robot",))
+        pipeline.add("processors", self.setup_processors, deps=("policy", "dataset"))
+        pipeline.add(
+            "warmup_policy",
+            self.warmup_policy,
+            deps=("policy", "dataset", "processors"),
+        )
+        results = pipeline.run()
+        preprocessor, postprocessor = results["processors"]
+        # 締め切り超過の回数は sync でも数える
+        policy = ChunkPrefetchPolicy(
+            results["policy"],
+            fps=FPS,
+            mode=ACT_INFERENCE_MODE,
+            tracer=self.tracer,
+            **ACT_PREFETCH_CONFIG,
+        )
+        return results["dataset"], policy, preprocessor, postprocessor
 
+    def setup_session(self) -> dict:
+        if self.station_name:
+            # 複数ステーションではキーボード・rerun は使わず、停止は MultiStationOrchestrator が行う
+            return {"exit_early": False, "rerecord_episode": False, "stop_recording": False}
         _, events = init_keyboard_listener()
         init_rerun(session_name="recording")
+        return events
+
+    def episode_done(self):
+        print(f"{self.log_prefix}Episode {self.episode_count} done")
+
+    def stop(self):
+        """別のスレッドから run() を終わらせる。記録中のエピソードは保存しない"""
+        self.stop_event.set()
+        if self.events is not None:
+            self.events["exit_early"] = True
+
+    def run(self):
+        dataset, policy, preprocessor, postprocessor = self.startup()
+
+        events = self.setup_session()
 
         teleop_action_processor, robot_action_processor, robot_observation_processor = (
             make_default_processors()
         )
 
         recording_started = threading.Event()
-        self.setup_monitoring(events, recording_started)
+        self.start_monitoring(events, recording_started)
+        self.finalizer = EpisodeFinalizer(
+            dataset, max_pending=FINALIZE_MAX_PENDING, tracer=self.tracer
+        )
+        if EPISODE_MONITOR_CONFIG:
+            self.episode_monitor = EpisodeMonitor(
+                RobotController.HOME_POSITION,
+                fps=FPS,
+                tracer=self.tracer,
+                **EPISODE_MONITOR_CONFIG,
+            )
+            self.episode_monitor.watch(self.robot)
 
-        asyncio.run(self.ble.send(str(self.ble_value)))
-        print(f"BLE initialized: {self.ble_value}")
+        self.ble.submit(self.ble_value)
+        print(f"{self.log_prefix}BLE initialized: {self.ble_value}")
 
         try:
             while True:
                 self.robot_controller.move_to_home()
 
-                print("Waiting for OPEN...")
-                recording_started.wait()
+                print(f"{self.log_prefix}Waiting for OPEN...")
+                while not recording_started.wait(0.5):
+                    if self.stop_event.is_set():
+                        break
+                if self.stop_event.is_set():
+                    break
 
+                # このエピソードを始めた OPEN の番号 (終わったときに end_episode に渡す)
+                mouth_episode = self.mouth_detector.episode
                 self.episode_count += 1
-                print(f"Episode {self.episode_count}")
+                print(f"{self.log_prefix}Episode {self.episode_count}")
+                if self.tracer:
+                    # open_frame はこのエピソードを始めた OPEN のもの
+                    self.tracer.new_episode(self.episode_count, keep=("open_frame",))
+                    self.tracer.since("open_frame", "open_to_wake")
+                    self.tracer.mark("wake")
+                    self._awaiting_first_action = True
 
                 events["exit_early"] = False
 
+                episode_start = time.monotonic()
+                if self.episode_monitor:
+                    self.episode_monitor.start(events, dataset)
                 record_loop(
                     robot=self.robot,
                     events=events,
@@ -157,20 +414,52 @@ class RecordingSystem:
                     preprocessor=preprocessor,
                     postprocessor=postprocessor,
                     dataset=dataset,
-                    control_time_s=EPISODE_TIME_SEC,
+                    control_time_s=self.episode_time_sec,
                     single_task=TASK_DESCRIPTION,
                     display_data=False,
                 )
 
-                print(f"Episode {self.episode_count} done")
+                if self.tracer:
+                    self.tracer.record(
+                        "record_loop", time.monotonic() - episode_start, episode_start
+                    )
+                if self.shared_policy is not None:
+                    self.shared_policy.finish_episode()
+                # 口の STOP 以外 (アームの停止・時間切れ) で終わったときは、口検出を次の OPEN 待ちに戻す
+                # (次の OPEN がもう来ていたら、番号が進んでいるので何もしない)
+                self.mouth_detector.end_episode(mouth_episode)
+                if self.stop_event.is_set():
+                    break
+                print(f"{self.log_prefix}[Policy] {policy.stats()}")
+                # アームが止まってからのフレームは保存しない
+                keep_frames = self.episode_monitor.stop() if self.episode_monitor else None
+                # 保存・エンコードは裏で行い、すぐ次のエピソードに戻る
+                self.finalizer.submit(keep_frames)
+                self.episode_done()
+                if self.max_episodes and self.episode_count >= self.max_episodes:
+                    break
 
         except KeyboardInterrupt:
             print("\nInterrupted")
 
         finally:
             events["stop_monitor"] = True
+            # 途中で中断したエピソードは保存しない
+            if dataset.episode_buffer is not None and dataset.episode_buffer["size"] > 0:
+                dataset.clear_episode_buffer()
+            if self.episode_monitor:
+                print(f"[EpisodeMonitor] {self.episode_monitor.stats()}")
+            policy.close()
             self.robot.disconnect()
-            print(f"Total: {self.episode_count} episodes")
+            self.ble.stop()
+            print(f"[BLE] {self.ble.stats()}")
+            try:
+                # 保存の失敗をまだ知らされていなければここで例外になるので、後片付けの最後に閉じる
+                self.finalizer.close()
+            finally:
+                if self.tracer:
+                    self.tracer.close()
+                print(f"{self.log_prefix}Total: {self.episode_count} episodes")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,390 @@
+"""
+複数のチップ提供ステーションを 1 プロセスで動かす
+
+ステーションは 1 台ずつロボット・カメラ・口検出カメラ・BLE ケースを持ち、RecordingSystem (main.py) の
+待機 -> 記録 -> 保存のループをそれぞれのスレッドで回す。口の状態判定・BLE の送信キュー・データセットは
+ステーションごとに持ち、重いモデルは 1 つを共有する。
+
+- ACT: BatchedPolicyServer が 1 つのポリシーを持ち、各ステーションには StationPolicy を渡す。
+  同じ tick (batch_window 秒以内) に行動チャンクを要求したステーションの観測をバッチ次元で連結して
+  1 回の forward で推論し、ステーションごとに分け直す
+- 口の分類: SharedBackend で 1 つのモデルを共有する (前処理はステーションごと、forward は排他)
+
+使い方 (mission2/code から):
+    python multi_station.py                  # config.py の STATIONS をすべて動かす
+    python multi_station.py --stations station1 station2
+"""
+
+import argparse
+import threading
+import time
+from collections import deque
+
+import torch
+
+from config import (
+    MOUTH_BACKEND,
+    MOUTH_IMGSZ,
+    MOUTH_MODEL_PATH,
+    MOUTH_NUM_THREADS,
+    MOUTH_PREVIEW_PORT,
+    MULTI_STATION_CONFIG,
+    STATIONS,
+)
+from yolo.backends import SharedBackend, make_backend
+
+
+def _percentile(ordered, p):
+    if not ordered:
+        return 0.0
+    return ordered[min(int(len(ordered) * p / 100), len(ordered) - 1)]
+
+
+class _ChunkRequest:
+    def __init__(self, client, batch: dict):
+        self.client = client
+        self.batch = batch
+        self.submitted = time.monotonic()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+def _batch_size(batch: dict) -> int:
+    for value in batch.values():
+        if torch.is_tensor(value):
+            return value.shape[0]
+    return 1
+
+
+def stack_observations(batches) -> dict:
+    """前処理済みの観測をバッチ次元で連結する (テンソル以外はリストなら連結、それ以外は先頭のもの)"""
+    merged = {}
+    for key, value in batches[0].items():
+        if torch.is_tensor(value):
+            merged[key] = torch.cat([b[key] for b in batches])
+        elif isinstance(value, list):
+            merged[key] = [v for b in batches for v in b[key]]
+        else:
+            merged[key] = value
+    return merged
+
+
+class StationPolicy:
+    """
+    ステーションごとの ACTPolicy の代わり。行動キューはステーションごとに持ち、
+    チャンクの推論は BatchedPolicyServer に頼む。ChunkPrefetchPolicy で包んでもよい。
+    """
+
+    def __init__(self, server: "BatchedPolicyServer", name: str):
+        self.server = server
+        self.name = name
+        self._queue = deque()
+        self.in_episode = False
+        self.chunks = 0
+        # 直前の要求の時刻と要求の間隔 (次の要求がいつ来るかの予測に使う)
+        self._last_request = None
+        self._interval = None
+
+    def __getattr__(self, name):
+        # config など、ラップしていない属性は共有しているポリシーのものを返す
+        if name == "server":
+            raise AttributeError(name)
+        return getattr(self.server.policy, name)
+
+    def due(self, now: float, window: float) -> bool:
+        """now の前後 window 秒以内に行動チャンクを要求しそうか (サーバがバッチを締め切るかの判定に使う)"""
+        if not self.in_episode or self._interval is None:
+            return False
+        return abs(self._last_request + self._interval - now) <= window
+
+    def reset(self):
+        self._queue.clear()
+        self.in_episode = False
+        self._last_request = None
+        self._interval = None
+
+    def finish_episode(self):
+        """record_loop の直後に呼ぶ (以降はこのステーションの要求を待たない)"""
+        self.in_episode = False
+
+    def predict_action_chunk(self, batch) -> torch.Tensor:
+        now = time.monotonic()
+        if self._last_request is not None:
+            self._interval = now - self._last_request
+        self._last_request = now
+        self.in_episode = True
+        self.chunks += 1
+        return self.server.predict(self, batch)
+
+    def select_action(self, batch) -> torch.Tensor:
+        # ACTPolicy.select_action と同じく、キューが空になった tick で同期的にチャンクを推論する
+        self.in_episode = True
+        if not self._queue:
+            chunk = self.predict_action_chunk(batch)[:, : self.config.n_action_steps]
+            self._queue.extend(chunk.transpose(0, 1))
+        return self._queue.popleft()
+
+
+class BatchedPolicyServer:
+    def __init__(self, policy, batch_window: float = 0.015, max_batch: int = None):
+        """
+        Args:
+            policy: ACTPolicy (predict_action_chunk がバッチ次元を扱えるもの)
+            batch_window: 最初の要求からこの秒数までに来た要求をまとめる。前回からの間隔で見て
+                この時間内に要求しそうなステーション (StationPolicy.due) がすべて揃えば待たずに推論する
+            max_batch: 1 回の forward にまとめる最大数 (None ならステーション数)
+        """
+        if getattr(getattr(policy, "config", None), "temporal_ensemble_coeff", None) is not None:
+            # ACT の temporal ensembling は毎 tick 推論するので共有できない (ChunkPrefetchPolicy の ensemble を使う)
+            raise ValueError("temporal_ensemble_coeff is not supported with a shared policy")
+        self.policy = policy
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.clients = []
+        self.batching = True
+
+        self._cond = threading.Condition()
+        self._pending = []
+        self._closing = False
+        self._thread = None
+
+        self._stats_lock = threading.Lock()
+        self.requests = 0
+        self.batches = 0
+        self.errors = 0
+        # submit から結果が返るまで / forward 1 回 / 1 回にまとめた数
+        self.latencies = deque(maxlen=4096)
+        self.infer_times = deque(maxlen=4096)
+        self.batch_sizes = deque(maxlen=4096)
+
+    def client(self, name: str) -> StationPolicy:
+        client = StationPolicy(self, name)
+        with self._cond:
+            self.clients.append(client)
+        return client
+
+    def start(self):
+        if self._thread is None:
+            self._closing = False
+            self._thread = threading.Thread(target=self._run, name="act-server", daemon=True)
+            self._thread.start()
+        return self
+
+    def close(self, timeout: float = 5.0):
+        with self._cond:
+            self._closing = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def predict(self, client: StationPolicy, batch: dict) -> torch.Tensor:
+        """行動チャンクを要求して、推論が終わるまで待つ"""
+        request = _ChunkRequest(client, batch)
+        with self._cond:
+            if self._closing:
+                raise RuntimeError("BatchedPolicyServer is closed")
+            self._pending.append(request)
+            self._cond.notify()
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        with self._stats_lock:
+            self.latencies.append(time.monotonic() - request.submitted)
+        return request.result
+
+    def _limit(self) -> int:
+        return max(self.max_batch or len(self.clients), 1)
+
+    def _all_due_waiting(self) -> bool:
+        now = time.monotonic()
+        waiting = {id(r.client) for r in self._pending}
+        return all(id(c) in waiting for c in self.clients if c.due(now, self.batch_window))
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closing:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+                deadline = self._pending[0].submitted + self.batch_window
+                while len(self._pending) < self._limit() and not self._all_due_waiting():
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                requests = self._pending[: self._limit() if self.batching else 1]
+                del self._pending[: len(requests)]
+            self._serve(requests)
+
+    def _forward(self, batch: dict) -> torch.Tensor:
+        with torch.inference_mode():
+            return self.policy.predict_action_chunk(batch)
+
+    def _serve(self, requests):
+        start = time.monotonic()
+        sizes = [_batch_size(r.batch) for r in requests]
+        try:
+            if len(requests) == 1:
+                chunks = self._forward(requests[0].batch)
+            else:
+                try:
+                    chunks = self._forward(stack_observations([r.batch for r in requests]))
+                except Exception as e:
+                    # trace 済みのモデルなどでバッチ次元を変えられなければ、以降は 1 つずつ推論する
+                    print(f"[PolicyServer] batched inference failed, serving one by one: {e}")
+                    self.batching = False
+                    chunks = torch.cat([self._forward(r.batch) for r in requests])
+        except Exception as e:
+            with self._stats_lock:
+                self.errors += 1
+            for request in requests:
+                request.error = e
+                request.done.set()
+            return
+
+        elapsed = time.monotonic() - start
+        with self._stats_lock:
+            self.requests += len(requests)
+            self.batches += 1
+            self.infer_times.append(elapsed)
+            self.batch_sizes.append(len(requests))
+        offset = 0
+        for request, size in zip(requests, sizes):
+            request.result = chunks[offset : offset + size]
+            offset += size
+            request.done.set()
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            latencies = sorted(self.latencies)
+            infer_times = sorted(self.infer_times)
+            sizes = list(self.batch_sizes)
+            return {
+                "clients": len(self.clients),
+                "requests": self.requests,
+                "batches": self.batches,
+                "errors": self.errors,
+                "mean_batch": round(sum(sizes) / len(sizes), 2) if sizes else 0.0,
+                "infer_p50_ms": round(_percentile(infer_times, 50) * 1000, 1),
+                "latency_p50_ms": round(_percentile(latencies, 50) * 1000, 1),
+                "latency_p99_ms": round(_percentile(latencies, 99) * 1000, 1),
+            }
+
+
+class MultiStationOrchestrator:
+    def __init__(
+        self,
+        stations,
+        load_policy=None,
+        batch_window: float = 0.015,
+        max_batch: int = None,
+        share_policy: bool = True,
+        mouth_backend=None,
+    ):
+        """
+        Args:
+            stations: RecordingSystem (station= を渡して作ったもの) のリスト
+            load_policy: 共有するポリシーを読む関数。None なら最初のステーションの load_policy
+            share_policy: False にするとステーションごとにポリシーを読む (別プロセスで動かすのと同じ構成の比較用)
+            mouth_backend: 読み込み済みの口の分類バックエンド。渡すと全ステーションで共有する
+        """
+        self.stations = list(stations)
+        self.load_policy = load_policy
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.share_policy = share_policy
+        self.mouth_backend = mouth_backend
+        self.servers = []
+
+    def setup(self):
+        start = time.monotonic()
+        if self.share_policy:
+            policy = (self.load_policy or self.stations[0].load_policy)()
+            server = BatchedPolicyServer(policy, self.batch_window, self.max_batch).start()
+            self.servers = [server]
+            for station in self.stations:
+                station.shared_policy = server.client(station.station_name)
+        else:
+            for station in self.stations:
+                server = BatchedPolicyServer((self.load_policy or station.load_policy)(), 0.0).start()
+                self.servers.append(server)
+                station.shared_policy = server.client(station.station_name)
+
+        if self.mouth_backend is not None:
+            lock = threading.Lock()
+            for station in self.stations:
+                station.shared_mouth_backend = SharedBackend(self.mouth_backend, lock)
+        print(
+            f"[MultiStation] {len(self.stations)} stations, {len(self.servers)} policy instance(s) "
+            f"({time.monotonic() - start:.1f}s)"
+        )
+
+    def stop(self):
+        for station in self.stations:
+            station.stop()
+
+    def run(self):
+        self.setup()
+        threads = [
+            threading.Thread(target=self._run_station, args=(station,), name=f"station-{station.station_name}")
+            for station in self.stations
+        ]
+        for thread in threads:
+            thread.start()
+        try:
+            while any(thread.is_alive() for thread in threads):
+                for thread in threads:
+                    thread.join(timeout=0.5)
+        except KeyboardInterrupt:
+            print("\nInterrupted")
+            self.stop()
+            for thread in threads:
+                thread.join()
+        finally:
+            for server in self.servers:
+                server.close()
+                print(f"[PolicyServer] {server.stats()}")
+            print(f"Total: {sum(s.episode_count for s in self.stations)} episodes")
+
+    def _run_station(self, station):
+        try:
+            station.run()
+        except Exception as e:
+            # 1 台が落ちても他のステーションは続ける
+            print(f"[MultiStation] {station.station_name} stopped: {e}")
+
+
+def load_mouth_backend():
+    backend = make_backend(MOUTH_BACKEND, MOUTH_MODEL_PATH, MOUTH_IMGSZ, MOUTH_NUM_THREADS)
+    print(f"Model loaded from: {backend.model_path} ({backend.name}, imgsz {backend.imgsz})")
+    backend.warmup()
+    return backend
+
+
+def main():
+    from main import RecordingSystem
+
+    parser = argparse.ArgumentParser(description="Run several chip stations with a shared ACT policy")
+    parser.add_argument("--stations", nargs="*", default=None, help="動かすステーションの name (省略時は全部)")
+    args = parser.parse_args()
+
+    configs = [s for s in STATIONS if not args.stations or s["name"] in args.stations]
+    if not configs:
+        raise SystemExit(f"No stations selected from {[s['name'] for s in STATIONS]}")
+    config = dict(MULTI_STATION_CONFIG)
+    mouth_backend = load_mouth_backend() if config.pop("share_mouth_model", True) else None
+    # mjpeg のポートが重ならないように、指定がなければ STATIONS 内の順番でずらす
+    configs = [{"preview_port": MOUTH_PREVIEW_PORT + STATIONS.index(s), **s} for s in configs]
+    orchestrator = MultiStationOrchestrator(
+        [RecordingSystem(station=station) for station in configs],
+        mouth_backend=mouth_backend,
+        **config,
+    )
+    orchestrator.run()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,9 @@
 import time
+
+import numpy as np
 from lerobot.robots.so101_follower.so101_follower import SO101Follower
 from ble_controller import BLEController
+from trajectory import plan
 
 
 class RobotController:
@@ -12,23 +15,78 @@ class RobotController:
         "wrist_roll.pos": -2.72,
         "gripper.pos": 68.19,
     }
+    # 関節ごとの速度 (単位/秒) と加速度 (単位/秒^2) の上限
+    MAX_VELOCITY = {
+        "shoulder_pan.pos": 120.0,
+        "shoulder_lift.pos": 120.0,
+        "elbow_flex.pos": 120.0,
+        "wrist_flex.pos": 150.0,
+        "wrist_roll.pos": 150.0,
+        "gripper.pos": 150.0,
+    }
+    MAX_ACCELERATION = {
+        "shoulder_pan.pos": 400.0,
+        "shoulder_lift.pos": 400.0,
+        "elbow_flex.pos": 400.0,
+        "wrist_flex.pos": 600.0,
+        "wrist_roll.pos": 600.0,
+        "gripper.pos": 600.0,
+    }
 
-    def __init__(self, robot: SO101Follower, ble_controller: BLEController):
+    def __init__(
+        self,
+        robot: SO101Follower,
+        ble_controller: BLEController,
+        rate_hz: float = 50.0,
+        tolerance: float = 2.0,
+        settle_timeout: float = 1.0,
+        profile: str = "trapezoidal",
+    ):
         self.robot = robot
         self.ble = ble_controller
+        self.rate_hz = rate_hz
+        self.tolerance = tolerance
+        self.settle_timeout = settle_timeout
+        self.profile = profile
+
+        self.joints = list(self.HOME_POSITION)
+        self.home = np.array([self.HOME_POSITION[k] for k in self.joints])
+        self.max_velocity = np.array([self.MAX_VELOCITY[k] for k in self.joints])
+        self.max_acceleration = np.array([self.MAX_ACCELERATION[k] for k in self.joints])
+
+    def read_joints(self) -> np.ndarray:
+        # get_observation() はカメラも読むので、関節位置だけをバスから読む
+        positions = self.robot.bus.sync_read("Present_Position")
+        return np.array([positions.get(k.removesuffix(".pos"), 0.0) for k in self.joints], dtype=float)
+
+    def move_to(self, target: np.ndarray) -> bool:
+        """
+        速度・加速度上限内の最短軌道で target へ動かし、実際の関節位置が
+        tolerance 以内に入るまで待つ。到達できたら True
+        """
+        dt = 1.0 / self.rate_hz
+        start = self.read_joints()
+        times, positions = plan(
+            start, target, self.max_velocity, self.max_acceleration, dt, self.profile
+        )
+
+        t0 = time.monotonic()
+        for t, position in zip(times, positions):
+            self.robot.send_action(dict(zip(self.joints, position.tolist())))
+            delay = t0 + t - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+
+        # 最終指令を送ったあとは観測位置で到達を判定する
+        deadline = time.monotonic() + self.settle_timeout
+        while True:
+            error = np.max(np.abs(self.read_joints() - target))
+            if error <= self.tolerance:
+                return True
+            if time.monotonic() >= deadline:
+                print(f"Home not reached (max error {error:.2f})")
+                return False
+            time.sleep(dt)
 
-    def move_to_home(self, steps: int = 15):
-        current_obs = self.robot.get_observation()
-        current_pos = {k: v for k, v in current_obs.items() if k.endswith(".pos")}
-
-        for step in range(1, steps + 1):
-            interpolated_position = {}
-            for key, target_val in self.HOME_POSITION.items():
-                current_val = current_pos.get(key, 0)
-                interpolated_val = current_val + (target_val - current_val) * (
-                    step / steps
-                )
-                interpolated_position[key] = interpolated_val
-
-            self.robot.send_action(interpolated_position)
-            time.sleep(0.1)
+    def move_to_home(self) -> bool:
+        return self.move_to(self.home)
@@ -0,0 +1,81 @@
+import asyncio
+from types import SimpleNamespace
+
+
+class FakeBlePeripheral:
+    """ケース内マイコンの代わり。受信した値と接続回数を記録する"""
+
+    CHAR_UUID = "0000ffe1-0000-1000-8000-00805f9b34fb"
+
+    def __init__(
+        self,
+        connect_delay: float = 1.5,
+        write_delay: float = 0.01,
+        drop_every: int = 0,
+    ):
+        self.connect_delay = connect_delay
+        self.write_delay = write_delay
+        self.drop_every = drop_every
+        self.received = []
+        self.connect_count = 0
+        self.write_count = 0
+        self.services = [
+            SimpleNamespace(
+                characteristics=[
+                    SimpleNamespace(uuid="00002a00-0000-1000-8000-00805f9b34fb", properties=["read"]),
+                    SimpleNamespace(uuid=self.CHAR_UUID, properties=["write", "write-without-response"]),
+                ]
+            )
+        ]
+
+    def client_factory(self, address, disconnected_callback=None, **kwargs):
+        return FakeBleakClient(address, self, disconnected_callback)
+
+
+class FakeBleakClient:
+    """bleak.BleakClient と同じインターフェースを持つオフライン用クライアント"""
+
+    def __init__(self, address, peripheral: FakeBlePeripheral, disconnected_callback=None):
+        self.address = address
+        self.peripheral = peripheral
+        self.disconnected_callback = disconnected_callback
+        self.is_connected = False
+
+    @property
+    def services(self):
+        return self.peripheral.services
+
+    async def connect(self, **kwargs):
+        # 接続 + サービス探索のコスト
+        await asyncio.sleep(self.peripheral.connect_delay)
+        self.peripheral.connect_count += 1
+        self.is_connected = True
+        return True
+
+    async def disconnect(self):
+        self.is_connected = False
+        return True
+
+    async def write_gatt_char(self, char_uuid, data, response=None):
+        if not self.is_connected:
+            raise ConnectionError("Not connected")
+        if char_uuid != FakeBlePeripheral.CHAR_UUID:
+            raise ValueError(f"Characteristic {char_uuid} not writable")
+        await asyncio.sleep(self.peripheral.write_delay)
+        self.peripheral.write_count += 1
+        if self.peripheral.drop_every and self.peripheral.write_count % self.peripheral.drop_every == 0:
+            self.drop_connection()
+            raise ConnectionError("Link lost")
+        self.peripheral.received.append(bytes(data).decode())
+
+    def drop_connection(self):
+        self.is_connected = False
+        if self.disconnected_callback:
+            self.disconnected_callback(self)
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.disconnect()
@@ -0,0 +1,101 @@
+import time
+
+import cv2
+import numpy as np
+
+
+class FakeCamera:
+    """
+    cv2.VideoCapture の代わりに合成フレームを fps の間隔で返すカメラ。
+
+    FrameGrabber(FakeCamera(...)) として使う。フレームはノイズの上を矩形が横切る画像で、
+    フレームごとに内容が変わる (推論のキャッシュや重複判定が効きすぎないように)。
+    """
+
+    def __init__(self, width: int = 320, height: int = 240, fps: float = 30.0, seed: int = 0):
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self._rng = np.random.default_rng(seed)
+        self._background = self._rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+        self._next_time = None
+        self._opened = True
+        self.frames = 0
+
+    def isOpened(self) -> bool:
+        return self._opened
+
+    def set(self, prop, value):
+        return True
+
+    def release(self):
+        self._opened = False
+
+    def read(self, image=None):
+        if not self._opened:
+            return False, None
+        now = time.monotonic()
+        if self._next_time is None:
+            self._next_time = now
+        # カメラのフレーム周期に合わせて待つ
+        delay = self._next_time - now
+        if delay > 0:
+            time.sleep(delay)
+        self._next_time = max(self._next_time + 1.0 / self.fps, now)
+
+        if image is None or image.shape != self._background.shape:
+            image = np.empty_like(self._background)
+        np.copyto(image, self._background)
+        size = self.height // 3
+        x = (self.frames * 4) % max(self.width - size, 1)
+        image[size : 2 * size, x : x + size] = (self.frames * 7) % 256
+        self.frames += 1
+        return True, image
+
+
+class VideoFileCamera:
+    """
+    録画済みの動画ファイルをカメラとして再生する (fps の間隔で読み、終わったら先頭に戻る)。
+    .mouthrec の再生は yolo/replay.py の ReplaySource を使う。
+    """
+
+    def __init__(self, path: str, fps: float = None, loop: bool = True):
+        self.path = str(path)
+        self.cap = cv2.VideoCapture(self.path)
+        if not self.cap.isOpened():
+            raise FileNotFoundError(f"Cannot open video {self.path}")
+        self.fps = fps or self.cap.get(cv2.CAP_PROP_FPS) or 30.0
+        self.width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self.loop = loop
+        self._next_time = None
+        self.frames = 0
+
+    def isOpened(self) -> bool:
+        return self.cap.isOpened()
+
+    def set(self, prop, value):
+        return True
+
+    def get(self, prop):
+        return self.cap.get(prop)
+
+    def release(self):
+        self.cap.release()
+
+    def read(self, image=None):
+        now = time.monotonic()
+        if self._next_time is None:
+            self._next_time = now
+        delay = self._next_time - now
+        if delay > 0:
+            time.sleep(delay)
+        self._next_time = max(self._next_time + 1.0 / self.fps, now)
+
+        ret, frame = self.cap.read(image)
+        if not ret and self.loop:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ret, frame = self.cap.read(image)
+        if ret:
+            self.frames += 1
+        return ret, frame
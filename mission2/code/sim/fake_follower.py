@@ -0,0 +1,150 @@
+import time
+
+import cv2
+import numpy as np
+
+try:
+    from yolo.frame_grabber import FrameGrabber
+except ImportError:
+    from frame_grabber import FrameGrabber
+
+JOINTS = [
+    "shoulder_pan.pos",
+    "shoulder_lift.pos",
+    "elbow_flex.pos",
+    "wrist_flex.pos",
+    "wrist_roll.pos",
+    "gripper.pos",
+]
+
+
+class _FakeBus:
+    """SO101Follower.bus の sync_read("Present_Position") だけを真似る (キーは ".pos" なしのモーター名)"""
+
+    def __init__(self, follower):
+        self._follower = follower
+
+    def sync_read(self, data_name: str) -> dict:
+        if data_name != "Present_Position":
+            raise NotImplementedError(data_name)
+        positions = self._follower.read_positions()
+        return {key.removesuffix(".pos"): value for key, value in positions.items()}
+
+
+class FakeFollower:
+    """
+    SO101Follower の代わりに使う簡易モデル。
+
+    各関節は指令値に向かって一次遅れ (time_constant) で動き、
+    サーボの最大速度 (max_speed) で頭打ちになる。時刻は clock で差し替えられる。
+    cameras ({名前: cv2.VideoCapture 互換}) を渡すと、観測に各カメラの最新フレーム (RGB) も入る。
+    """
+
+    name = "so101_follower"
+    robot_type = "so101_follower"
+
+    def __init__(
+        self,
+        initial_position=None,
+        time_constant: float = 0.05,
+        max_speed: float = 300.0,
+        noise: float = 0.0,
+        clock=time.monotonic,
+        seed: int = 0,
+        cameras: dict = None,
+    ):
+        self.cameras = {
+            key: cam if hasattr(cam, "read_latest") else FrameGrabber(cam, name=f"sim-camera-{key}")
+            for key, cam in (cameras or {}).items()
+        }
+        self._camera_seqs = {key: 0 for key in self.cameras}
+        self._camera_frames = {}
+        self.joints = list(JOINTS)
+        self.position = (
+            np.zeros(len(self.joints))
+            if initial_position is None
+            else np.array([initial_position.get(k, 0.0) for k in self.joints], dtype=float)
+        )
+        self.target = self.position.copy()
+        self.time_constant = time_constant
+        self.max_speed = max_speed
+        self.noise = noise
+        self.clock = clock
+        self._rng = np.random.default_rng(seed)
+        self._last_time = clock()
+        self.is_connected = False
+        self.actions_sent = 0
+        self.bus = _FakeBus(self)
+
+    @staticmethod
+    def camera_shape(cam):
+        if hasattr(cam, "height"):
+            return (cam.height, cam.width, 3)
+        h = int(cam.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        w = int(cam.get(cv2.CAP_PROP_FRAME_WIDTH))
+        return (h, w, 3)
+
+    @property
+    def action_features(self) -> dict:
+        return {key: float for key in self.joints}
+
+    @property
+    def observation_features(self) -> dict:
+        features = {key: float for key in self.joints}
+        for key, grabber in self.cameras.items():
+            features[key] = self.camera_shape(grabber.cap)
+        return features
+
+    def connect(self, calibrate: bool = True):
+        for grabber in self.cameras.values():
+            grabber.start()
+        self.is_connected = True
+
+    def disconnect(self):
+        for grabber in self.cameras.values():
+            grabber.release()
+        self.is_connected = False
+
+    def _step(self):
+        now = self.clock()
+        dt = now - self._last_time
+        self._last_time = now
+        if dt <= 0:
+            return
+        error = self.target - self.position
+        velocity = error * (1.0 - np.exp(-dt / self.time_constant)) / dt
+        velocity = np.clip(velocity, -self.max_speed, self.max_speed)
+        self.position += velocity * dt
+
+    def read_positions(self) -> dict:
+        """関節位置だけを読む (カメラは読まない)"""
+        self._step()
+        position = self.position
+        if self.noise:
+            position = position + self._rng.normal(0.0, self.noise, position.shape)
+        return dict(zip(self.joints, position.tolist()))
+
+    def get_observation(self) -> dict:
+        obs = self.read_positions()
+        for key, grabber in self.cameras.items():
+            # 新しいフレームが無ければ前のフレームを使う (実機の async_read と同じ)
+            frame, _, seq = grabber.read_latest(self._camera_seqs[key], timeout=0.0)
+            if frame is not None:
+                self._camera_seqs[key] = seq
+                self._camera_frames[key] = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            elif key not in self._camera_frames:
+                frame, _, seq = grabber.read_latest(0, timeout=1.0)
+                if frame is None:
+                    raise RuntimeError(f"Simulated camera {key} delivered no frame")
+                self._camera_seqs[key] = seq
+                self._camera_frames[key] = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            obs[key] = self._camera_frames[key]
+        return obs
+
+    def send_action(self, action: dict) -> dict:
+        self._step()
+        for i, key in enumerate(self.joints):
+            if key in action:
+                self.target[i] = action[key]
+        self.actions_sent += 1
+        return action
@@ -0,0 +1,61 @@
+import time
+from collections import deque
+from types import SimpleNamespace
+
+import torch
+
+
+class FakeActPolicy:
+    """
+    ACTPolicy の代わりに使う、チャンク推論に一定の CPU 時間がかかるポリシー。
+
+    predict_action_chunk は latency 秒のあいだ行列積を回してから、観測の状態を起点に
+    滑らかに動く (B, chunk_size, action_dim) の行動チャンクを返す。バッチの 2 つ目以降は
+    1 つあたり latency * batch_cost 秒かかる (CPU でのバッチ推論の伸び方の近似)。
+    select_action は ACT と同じく、キューが空になった呼び出しで同期的に推論する。
+    """
+
+    def __init__(
+        self,
+        chunk_size: int = 100,
+        n_action_steps: int = 100,
+        action_dim: int = 6,
+        latency: float = 0.08,
+        batch_cost: float = 0.0,
+        state_key: str = "observation.state",
+    ):
+        self.config = SimpleNamespace(
+            chunk_size=chunk_size, n_action_steps=n_action_steps, device="cpu", use_amp=False
+        )
+        self.action_dim = action_dim
+        self.latency = latency
+        self.batch_cost = batch_cost
+        self.state_key = state_key
+        self._work = torch.randn(256, 256)
+        self._queue = deque()
+        self.calls = 0
+
+    def reset(self):
+        self._queue.clear()
+
+    def _burn(self, batch_size: int = 1):
+        deadline = time.monotonic() + self.latency * (1.0 + self.batch_cost * (batch_size - 1))
+        x = self._work
+        while time.monotonic() < deadline:
+            x = torch.tanh(x @ self._work)
+
+    def predict_action_chunk(self, batch) -> torch.Tensor:
+        state = batch.get(self.state_key)
+        batch_size = state.shape[0] if state is not None else 1
+        self._burn(batch_size)
+        self.calls += 1
+        base = state[:, : self.action_dim] if state is not None else torch.zeros(batch_size, self.action_dim)
+        steps = torch.arange(self.config.chunk_size, dtype=torch.float32)[None, :, None]
+        phase = torch.arange(self.action_dim, dtype=torch.float32)[None, None, :]
+        return base[:, None, :] + 5.0 * torch.sin(0.05 * steps + phase)
+
+    def select_action(self, batch) -> torch.Tensor:
+        if not self._queue:
+            chunk = self.predict_action_chunk(batch)[:, : self.config.n_action_steps]
+            self._queue.extend(chunk.transpose(0, 1))
+        return self._queue.popleft()
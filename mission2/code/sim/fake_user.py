@@ -0,0 +1,110 @@
+import random
+import time
+
+import numpy as np
+
+try:
+    from yolo.backends import InferenceBackend
+except ImportError:
+    from backends import InferenceBackend
+
+CLASS_NAMES = ["chip", "close", "open"]
+
+WAITING = "waiting"
+OPEN = "open"
+SERVED = "served"
+BITING = "biting"
+DONE = "done"
+
+
+class SimUser:
+    """
+    口検出カメラの前に座る利用者のシナリオ。
+
+    待機 (think_time) -> 口を開ける -> 録画が始まったら閉じて待つ (serve_time)
+    -> チップをくわえる (chip_hold) -> 録画が止まったら待機に戻る、を繰り返す。
+    recording_started を attach() すると、録画中かどうかを見て次の動作に移る。
+    """
+
+    def __init__(
+        self,
+        think_time: float = 2.0,
+        serve_time: float = 8.0,
+        chip_hold: float = 4.0,
+        jitter: float = 0.2,
+        clock=time.monotonic,
+        seed: int = 0,
+    ):
+        self.think_time = think_time
+        self.serve_time = serve_time
+        self.chip_hold = chip_hold
+        self.jitter = jitter
+        self.clock = clock
+        self._rng = random.Random(seed)
+        self.recording_started = None
+        self.phase = WAITING
+        self._since = clock()
+        self._wait = self._jittered(think_time)
+        self.servings = 0
+
+    def attach(self, recording_started):
+        self.recording_started = recording_started
+
+    def _jittered(self, value: float) -> float:
+        return value * (1.0 + self._rng.uniform(-self.jitter, self.jitter))
+
+    def _enter(self, phase: str, wait: float, now: float):
+        self.phase = phase
+        self._since = now
+        self._wait = self._jittered(wait)
+
+    def _recording(self) -> bool:
+        return self.recording_started is not None and self.recording_started.is_set()
+
+    def update(self, now: float = None) -> str:
+        now = self.clock() if now is None else now
+        elapsed = now - self._since
+        if self.phase == WAITING and elapsed >= self._wait and not self._recording():
+            self._enter(OPEN, 0.0, now)
+        elif self.phase == OPEN and self._recording():
+            self._enter(SERVED, self.serve_time, now)
+        elif self.phase == SERVED and elapsed >= self._wait:
+            self._enter(BITING, self.chip_hold, now)
+        elif self.phase == BITING and elapsed >= self._wait:
+            self.servings += 1
+            self._enter(DONE, 0.0, now)
+        elif self.phase == DONE and not self._recording():
+            self._enter(WAITING, self.think_time, now)
+        return self.phase
+
+    def probs(self, now: float = None) -> np.ndarray:
+        """分類器が出すであろう確率 (chip, close, open)"""
+        phase = self.update(now)
+        if phase == OPEN:
+            return np.array([0.02, 0.08, 0.90], dtype=np.float32)
+        if phase == BITING:
+            return np.array([0.90, 0.08, 0.02], dtype=np.float32)
+        return np.array([0.03, 0.94, 0.03], dtype=np.float32)
+
+
+class ScriptedBackend(InferenceBackend):
+    """
+    モデルを読まずに SimUser の状態を分類結果として返すバックエンド。
+    前処理は実物と同じものを通すので、検出ループの CPU 負荷はおおむね再現される。
+    """
+
+    name = "scripted"
+
+    def __init__(self, user: SimUser, imgsz: int = 224, noise: float = 0.02, seed: int = 0):
+        super().__init__("scripted", imgsz)
+        self.user = user
+        self.noise = noise
+        self.names = list(CLASS_NAMES)
+        self._rng = np.random.default_rng(seed)
+
+    def infer(self, batch: np.ndarray) -> np.ndarray:
+        probs = np.repeat(self.user.probs()[None], len(batch), axis=0)
+        if self.noise:
+            probs = np.clip(probs + self._rng.normal(0.0, self.noise, probs.shape), 1e-3, None)
+            probs /= probs.sum(axis=1, keepdims=True)
+        return probs.astype(np.float32)
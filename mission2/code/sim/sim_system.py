@@ -0,0 +1,150 @@
+"""
+実機なしで RecordingSystem を動かすためのシミュレーション構成
+
+- ロボット: FakeFollower (関節の一次遅れモデル) + 合成カメラ 2 台 (front / front2)
+- 口検出: 合成カメラ + ScriptedBackend (SimUser のシナリオを分類結果として返す)
+- BLE: FakeBlePeripheral (プロセス内)
+- ポリシー: 実機と同じ入出力のランダム初期化 ACT (正規化なし)
+- データセット: 一時ディレクトリに実物の LeRobotDataset を作る (動画エンコードも実際に行う)
+
+オーケストレーション (起動・待機・record_loop・保存・ホーム復帰・BLE) は main.py のものをそのまま使う。
+"""
+
+import os
+import tempfile
+import time
+
+from lerobot.configs.types import FeatureType, NormalizationMode
+from lerobot.datasets.utils import dataset_to_policy_features, hw_to_dataset_features
+from lerobot.policies.act.configuration_act import ACTConfig
+from lerobot.policies.act.modeling_act import ACTPolicy
+from lerobot.policies.factory import make_pre_post_processors
+
+from config import (
+    FPS,
+    CAMERA_WIDTH,
+    CAMERA_HEIGHT,
+    MOUTH_CAMERA_WIDTH,
+    MOUTH_CAMERA_HEIGHT,
+    MOUTH_STATE_CONFIG,
+    MOUTH_SCHEDULER_CONFIG,
+    ACT_OPTIMIZE_CONFIG,
+)
+from act_optimize import optimize_with_parity
+from main import RecordingSystem
+from robot_controller import RobotController
+from sim.fake_ble import FakeBlePeripheral
+from sim.fake_camera import FakeCamera
+from sim.fake_follower import JOINTS, FakeFollower
+from sim.fake_user import ScriptedBackend, SimUser
+from sim.usage import process_usage
+from yolo.frame_grabber import FrameGrabber
+from yolo.mouth_detector import MouthDetector
+from yolo.scheduler import InferenceScheduler
+
+CAMERAS = ("front", "front2")
+
+
+class SimRecordingSystem(RecordingSystem):
+    def __init__(
+        self,
+        episodes: int = 10,
+        episode_time_sec: float = 30.0,
+        user: SimUser = None,
+        dataset_root: str = None,
+        camera_fps: float = FPS,
+        ble_connect_delay: float = 0.2,
+        ble_write_delay: float = 0.01,
+        chunk_size: int = 100,
+        station: dict = None,
+    ):
+        self.peripheral = FakeBlePeripheral(ble_connect_delay, ble_write_delay)
+        super().__init__(ble_client_factory=self.peripheral.client_factory, station=station)
+        self.max_episodes = episodes
+        self.episode_time_sec = episode_time_sec
+        self.user = user or SimUser()
+        # LeRobotDataset.create は既存のディレクトリを嫌うので、まだ無いパスを渡す
+        self.dataset_root = dataset_root or os.path.join(tempfile.mkdtemp(prefix="sim_"), "dataset")
+        self.camera_fps = camera_fps
+        self.chunk_size = chunk_size
+        self.episode_log = []
+        self.started_at = None
+
+    def robot_features(self):
+        observation = {key: float for key in JOINTS}
+        for name in CAMERAS:
+            observation[name] = (CAMERA_HEIGHT, CAMERA_WIDTH, 3)
+        action = {key: float for key in JOINTS}
+        return observation, action
+
+    def setup_robot(self):
+        cameras = {
+            name: FakeCamera(CAMERA_WIDTH, CAMERA_HEIGHT, self.camera_fps, seed=i + 1)
+            for i, name in enumerate(CAMERAS)
+        }
+        self.robot = FakeFollower(initial_position=RobotController.HOME_POSITION, cameras=cameras)
+        self.robot.connect()
+        self.robot_controller = RobotController(self.robot, self.ble)
+        if self.tracer:
+            self._trace_first_action()
+
+    def load_policy(self):
+        observation, action = self.robot_features()
+        features = dataset_to_policy_features(
+            {
+                **hw_to_dataset_features(action, "action"),
+                **hw_to_dataset_features(observation, "observation"),
+            }
+        )
+        config = ACTConfig(
+            input_features={k: f for k, f in features.items() if f.type is not FeatureType.ACTION},
+            output_features={k: f for k, f in features.items() if f.type is FeatureType.ACTION},
+            device="cpu",
+            chunk_size=self.chunk_size,
+            n_action_steps=self.chunk_size,
+            pretrained_backbone_weights=None,
+            normalization_mapping={
+                "VISUAL": NormalizationMode.IDENTITY,
+                "STATE": NormalizationMode.IDENTITY,
+                "ACTION": NormalizationMode.IDENTITY,
+            },
+        )
+        policy = ACTPolicy(config)
+        policy.eval()
+        policy, _ = optimize_with_parity(policy, ACT_OPTIMIZE_CONFIG)
+        return policy
+
+    def setup_processors(self, policy, dataset):
+        return make_pre_post_processors(policy_cfg=policy.config, dataset_stats=dataset.meta.stats)
+
+    def setup_mouth_detector(self):
+        source = FrameGrabber(
+            FakeCamera(MOUTH_CAMERA_WIDTH, MOUTH_CAMERA_HEIGHT, self.camera_fps), name="sim-mouth-camera"
+        ).start()
+        self.mouth_detector = MouthDetector(
+            backend=ScriptedBackend(self.user),
+            state_config=MOUTH_STATE_CONFIG,
+            source=source,
+            tracer=self.tracer,
+            scheduler=InferenceScheduler(**MOUTH_SCHEDULER_CONFIG) if MOUTH_SCHEDULER_CONFIG else None,
+        )
+        return self.mouth_detector
+
+    def setup_session(self) -> dict:
+        return {"exit_early": False, "rerecord_episode": False, "stop_recording": False}
+
+    def start_monitoring(self, events, recording_started):
+        self.user.attach(recording_started)
+        self.started_at = time.monotonic()
+        self.episode_log.append({"episode": 0, "time": 0.0, **process_usage()})
+        super().start_monitoring(events, recording_started)
+
+    def episode_done(self):
+        super().episode_done()
+        self.episode_log.append(
+            {
+                "episode": self.episode_count,
+                "time": time.monotonic() - self.started_at,
+                **process_usage(),
+            }
+        )
@@ -0,0 +1,17 @@
+import os
+import resource
+
+
+def process_usage() -> dict:
+    """このプロセス (と終了した子プロセス) の CPU 時間と現在の RSS"""
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    try:
+        with open("/proc/self/statm") as f:
+            rss = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        rss = usage.ru_maxrss * 1024
+    return {
+        "cpu_sec": usage.ru_utime + usage.ru_stime + children.ru_utime + children.ru_stime,
+        "rss_mb": rss / 2**20,
+    }
@@ -0,0 +1,155 @@
+"""
+口が開いてからアームが動くまでのレイテンシ計測
+
+時刻はすべて time.monotonic() (カメラの FrameGrabber と同じ時計)。
+ステージごとに直近の値を保持して定期的にサマリを表示し、
+全イベントを JSON Lines にダンプする (benchmarks/trace_report.py で集計)。
+キューの長さ・バッチサイズのように時間でない値は gauge() で別に記録する。
+"""
+
+import json
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from pathlib import Path
+
+# trace_report.py やベンチマークと同じ計算にする
+from benchmarks.stats import percentile
+
+
+class Tracer:
+    def __init__(
+        self,
+        session: str = "",
+        dump_path: str = None,
+        summary_interval: float = 0.0,
+        window: int = 2048,
+    ):
+        self.session = session
+        self.dump_path = Path(dump_path) if dump_path else None
+        self.summary_interval = summary_interval
+        self.episode = 0
+
+        self._lock = threading.Lock()
+        self._recent = defaultdict(lambda: deque(maxlen=window))
+        self._counts = defaultdict(int)
+        self._gauges = defaultdict(lambda: deque(maxlen=window))
+        self._marks = {}
+        self._buffer = []
+        self._stop = threading.Event()
+        self._thread = None
+
+        if self.dump_path:
+            self.dump_path.parent.mkdir(parents=True, exist_ok=True)
+        if summary_interval > 0 or self.dump_path:
+            self._thread = threading.Thread(
+                target=self._run, name="tracer", daemon=True
+            )
+            self._thread.start()
+
+    def record(self, stage: str, duration: float, start: float = None):
+        with self._lock:
+            self._recent[stage].append(duration)
+            self._counts[stage] += 1
+            if self.dump_path:
+                self._buffer.append(
+                    {
+                        "session": self.session,
+                        "episode": self.episode,
+                        "stage": stage,
+                        "start": start,
+                        "duration": duration,
+                    }
+                )
+
+    def gauge(self, name: str, value: float):
+        """時間でない値 (件数など) を記録する。サマリでは ms にせずそのまま表示する"""
+        with self._lock:
+            self._gauges[name].append(value)
+            if self.dump_path:
+                self._buffer.append(
+                    {
+                        "session": self.session,
+                        "episode": self.episode,
+                        "gauge": name,
+                        "time": time.monotonic(),
+                        "value": value,
+                    }
+                )
+
+    def mark(self, name: str, t: float = None):
+        """あとで since() で参照する時刻を記録する"""
+        self._marks[name] = time.monotonic() if t is None else t
+
+    def since(self, mark: str, stage: str, t: float = None):
+        """mark からの経過時間を stage として記録する (mark が無ければ何もしない)"""
+        start = self._marks.get(mark)
+        if start is None:
+            return None
+        duration = (time.monotonic() if t is None else t) - start
+        self.record(stage, duration, start)
+        return duration
+
+    @contextmanager
+    def span(self, stage: str):
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.record(stage, time.monotonic() - start, start)
+
+    def new_episode(self, episode: int, keep=()):
+        """前のエピソードの mark を消す (keep の mark は新しいエピソードのものとして残す)"""
+        self.episode = episode
+        self._marks = {name: t for name, t in self._marks.items() if name in keep}
+
+    def summary(self) -> str:
+        with self._lock:
+            stages = {k: list(v) for k, v in self._recent.items()}
+            counts = dict(self._counts)
+            gauges = {k: list(v) for k, v in self._gauges.items()}
+        lines = [f"{'stage':<24}{'n':>7}{'p50':>10}{'p95':>10}{'p99':>10}  (ms)"]
+        for stage, values in sorted(stages.items()):
+            lines.append(
+                f"{stage:<24}{counts[stage]:>7}"
+                f"{percentile(values, 50) * 1000:>10.1f}"
+                f"{percentile(values, 95) * 1000:>10.1f}"
+                f"{percentile(values, 99) * 1000:>10.1f}"
+            )
+        if gauges:
+            lines.append(f"{'gauge':<24}{'n':>7}{'mean':>10}{'p50':>10}{'max':>10}")
+            for name, values in sorted(gauges.items()):
+                lines.append(
+                    f"{name:<24}{len(values):>7}"
+                    f"{sum(values) / len(values):>10.2f}"
+                    f"{percentile(values, 50):>10.2f}"
+                    f"{max(values):>10.2f}"
+                )
+        return "\n".join(lines)
+
+    def flush(self):
+        if not self.dump_path:
+            return
+        with self._lock:
+            buffer, self._buffer = self._buffer, []
+        if buffer:
+            with open(self.dump_path, "a") as f:
+                for row in buffer:
+                    f.write(json.dumps(row) + "\n")
+
+    def _run(self):
+        interval = self.summary_interval if self.summary_interval > 0 else 5.0
+        while not self._stop.wait(interval):
+            self.flush()
+            if self.summary_interval > 0:
+                print(f"[Trace]\n{self.summary()}")
+
+    def close(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=1.0)
+        self.flush()
+        print(f"[Trace]\n{self.summary()}")
+        if self.dump_path:
+            print(f"[Trace] dumped to {self.dump_path}")
@@ -0,0 +1,85 @@
+"""
+関節空間の時間最適な軌道生成
+
+全関節を同じ時間で動かす直線軌道 q(t) = start + (goal - start) * s(t) を作る。
+s(t) (0 -> 1) は各関節の速度・加速度の上限を超えない範囲で最短になるよう決める。
+"""
+
+import numpy as np
+
+MIN_JERK_PEAK_VELOCITY = 1.875  # max ds/dτ
+MIN_JERK_PEAK_ACCELERATION = 5.7735  # max d²s/dτ²
+
+
+def _normalized_limits(start, goal, max_velocity, max_acceleration):
+    """s(t) に許される速度・加速度の上限 (最も厳しい関節で決まる)"""
+    distance = np.abs(np.asarray(goal, dtype=float) - np.asarray(start, dtype=float))
+    moving = distance > 1e-9
+    if not moving.any():
+        return None, None
+    v = np.min(np.asarray(max_velocity, dtype=float)[moving] / distance[moving])
+    a = np.min(np.asarray(max_acceleration, dtype=float)[moving] / distance[moving])
+    return v, a
+
+
+def trapezoidal_duration(v: float, a: float) -> float:
+    if v * v / a <= 1.0:
+        return 1.0 / v + v / a
+    # 最高速度に達しない (三角形プロファイル)
+    return 2.0 * np.sqrt(1.0 / a)
+
+
+def trapezoidal_s(t, v: float, a: float):
+    duration = trapezoidal_duration(v, a)
+    t_acc = min(v / a, duration / 2.0)
+    v_peak = a * t_acc
+    t = np.clip(t, 0.0, duration)
+    accel = 0.5 * a * t**2
+    cruise = 0.5 * a * t_acc**2 + v_peak * (t - t_acc)
+    remaining = duration - t
+    decel = 1.0 - 0.5 * a * remaining**2
+    return np.where(t < t_acc, accel, np.where(t <= duration - t_acc, cruise, decel))
+
+
+def min_jerk_duration(v: float, a: float) -> float:
+    return max(MIN_JERK_PEAK_VELOCITY / v, np.sqrt(MIN_JERK_PEAK_ACCELERATION / a))
+
+
+def min_jerk_s(t, duration: float):
+    tau = np.clip(np.asarray(t, dtype=float) / duration, 0.0, 1.0)
+    return tau**3 * (10.0 - 15.0 * tau + 6.0 * tau**2)
+
+
+def plan(start, goal, max_velocity, max_acceleration, dt: float, profile: str = "trapezoidal"):
+    """
+    Args:
+        start, goal: 関節位置 (J,)
+        max_velocity, max_acceleration: 関節ごとの上限 (J,) またはスカラー
+        dt: 指令の周期 (秒)
+        profile: "trapezoidal" | "min_jerk"
+
+    Returns:
+        (times (N,), positions (N, J))。最後の行は必ず goal
+    """
+    start = np.asarray(start, dtype=float)
+    goal = np.asarray(goal, dtype=float)
+    v, a = _normalized_limits(start, goal, max_velocity, max_acceleration)
+    if v is None:
+        return np.zeros(1), goal[None, :]
+
+    if profile == "trapezoidal":
+        duration = trapezoidal_duration(v, a)
+        s_fn = lambda t: trapezoidal_s(t, v, a)
+    elif profile == "min_jerk":
+        duration = min_jerk_duration(v, a)
+        s_fn = lambda t: min_jerk_s(t, duration)
+    else:
+        raise ValueError(f"Unknown profile: {profile}")
+
+    steps = max(int(np.ceil(duration / dt)), 1)
+    times = np.arange(1, steps + 1) * dt
+    times[-1] = duration
+    s = s_fn(times)
+    s[-1] = 1.0
+    positions = start + np.outer(s, goal - start)
+    return times, positions
@@ -0,0 +1,305 @@
+"""
+口の状態分類モデルの推論バックエンド
+
+どのバックエンドも同じ前処理 (中央切り出し -> 224x224 にリサイズ -> RGB -> 0-1 正規化) を
+事前確保したバッファ上で行い、Prediction(class_name, confidence, probs) を返す。
+"""
+
+import ast
+import hashlib
+import json
+import threading
+from collections import namedtuple
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+Prediction = namedtuple("Prediction", ["class_name", "confidence", "probs"])
+
+
+def center_square(frame: np.ndarray) -> np.ndarray:
+    """中央の正方形を切り出す (コピーしない)"""
+    h, w = frame.shape[:2]
+    side = min(h, w)
+    top, left = (h - side) // 2, (w - side) // 2
+    return frame[top : top + side, left : left + side]
+
+
+def resize_rgb(frame: np.ndarray, imgsz: int, resized: np.ndarray, rgb: np.ndarray) -> np.ndarray:
+    """
+    BGR フレームを中央切り出し -> imgsz x imgsz にリサイズ -> RGB にして rgb に書き込む
+
+    推論 (InferenceBackend) と学習キャッシュ (train_cache.py) の両方がこれを使うので、
+    リサイズの補間方法などがずれない。
+    """
+    cv2.resize(center_square(frame), (imgsz, imgsz), dst=resized, interpolation=cv2.INTER_LINEAR)
+    cv2.cvtColor(resized, cv2.COLOR_BGR2RGB, dst=rgb)
+    return rgb
+
+
+class InferenceBackend:
+    name = "base"
+    suffix = ".pt"
+
+    def __init__(self, model_path: str, imgsz: int = 224, num_threads: int = None):
+        self.model_path = str(model_path)
+        self.imgsz = imgsz
+        self.num_threads = num_threads
+        self.names = []
+
+        self._resized = np.empty((imgsz, imgsz, 3), dtype=np.uint8)
+        self._rgb = np.empty((imgsz, imgsz, 3), dtype=np.uint8)
+        self._input = np.empty((1, 3, imgsz, imgsz), dtype=np.float32)
+        self._batch = None
+
+    def _preprocess_into(self, frame: np.ndarray, out: np.ndarray):
+        resize_rgb(frame, self.imgsz, self._resized, self._rgb)
+        np.multiply(self._rgb.transpose(2, 0, 1), 1.0 / 255.0, out=out)
+
+    def preprocess(self, frame: np.ndarray) -> np.ndarray:
+        """BGR フレームを (1, 3, imgsz, imgsz) の float32 に変換する (Ultralytics の分類前処理と同じ)"""
+        self._preprocess_into(frame, self._input[0])
+        return self._input
+
+    def infer(self, batch: np.ndarray) -> np.ndarray:
+        """(N, 3, imgsz, imgsz) -> (N, num_classes) の確率"""
+        raise NotImplementedError
+
+    def predict(self, frame: np.ndarray) -> Prediction:
+        probs = self.infer(self.preprocess(frame))[0]
+        top = int(probs.argmax())
+        return Prediction(self.names[top], float(probs[top]), probs)
+
+    def predict_batch(self, frames) -> list:
+        """複数のフレームを 1 回の forward でまとめて分類する"""
+        n = len(frames)
+        if n == 1:
+            return [self.predict(frames[0])]
+        if self._batch is None or len(self._batch) < n:
+            self._batch = np.empty((n, 3, self.imgsz, self.imgsz), dtype=np.float32)
+        batch = self._batch[:n]
+        for frame, out in zip(frames, batch):
+            self._preprocess_into(frame, out)
+        predictions = []
+        for probs in self.infer(batch):
+            top = int(probs.argmax())
+            predictions.append(Prediction(self.names[top], float(probs[top]), probs))
+        return predictions
+
+    def warmup(self, runs: int = 3):
+        dummy = np.zeros((self.imgsz, self.imgsz, 3), dtype=np.uint8)
+        for _ in range(runs):
+            self.predict(dummy)
+
+
+class UltralyticsBackend(InferenceBackend):
+    name = "ultralytics"
+    suffix = ".pt"
+
+    def __init__(self, model_path: str, imgsz: int = 224, num_threads: int = None):
+        super().__init__(model_path, imgsz, num_threads)
+        import torch
+        from ultralytics import YOLO
+
+        if num_threads:
+            torch.set_num_threads(num_threads)
+        self._torch = torch
+        self.model = YOLO(self.model_path)
+        self.names = [self.model.names[i].lower() for i in sorted(self.model.names)]
+
+    def infer(self, batch: np.ndarray) -> np.ndarray:
+        # Tensor を渡すと Ultralytics 側の画像変換はスキップされる
+        results = self.model(
+            self._torch.from_numpy(batch), imgsz=self.imgsz, verbose=False
+        )
+        return np.stack([r.probs.data.cpu().numpy() for r in results])
+
+
+class OnnxBackend(InferenceBackend):
+    name = "onnx"
+    suffix = ".onnx"
+
+    def __init__(self, model_path: str, imgsz: int = 224, num_threads: int = None):
+        super().__init__(model_path, imgsz, num_threads)
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(
+            self.model_path, options, providers=["CPUExecutionProvider"]
+        )
+        model_input = self.session.get_inputs()[0]
+        self._input_name = model_input.name
+        # dynamic=True でエクスポートしていなければバッチ次元は 1 に固定されている
+        self._fixed_batch = model_input.shape[0] if isinstance(model_input.shape[0], int) else None
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        if "names" in metadata:
+            names = ast.literal_eval(metadata["names"])
+            self.names = [names[i].lower() for i in sorted(names)]
+
+    def infer(self, batch: np.ndarray) -> np.ndarray:
+        if self._fixed_batch == 1 and len(batch) > 1:
+            return np.concatenate(
+                [self.session.run(None, {self._input_name: batch[i : i + 1]})[0] for i in range(len(batch))]
+            )
+        return self.session.run(None, {self._input_name: batch})[0]
+
+
+class TorchScriptBackend(InferenceBackend):
+    name = "torchscript"
+    suffix = ".torchscript"
+
+    def __init__(self, model_path: str, imgsz: int = 224, num_threads: int = None):
+        super().__init__(model_path, imgsz, num_threads)
+        import torch
+
+        if num_threads:
+            torch.set_num_threads(num_threads)
+        self._torch = torch
+        extra_files = {"config.txt": ""}
+        self.model = torch.jit.load(self.model_path, map_location="cpu", _extra_files=extra_files)
+        self.model.eval()
+        if extra_files["config.txt"]:
+            names = json.loads(extra_files["config.txt"]).get("names", {})
+            self.names = [names[k].lower() for k in sorted(names, key=int)]
+
+    def infer(self, batch: np.ndarray) -> np.ndarray:
+        with self._torch.inference_mode():
+            output = self.model(self._torch.from_numpy(batch))
+        if isinstance(output, (list, tuple)):
+            output = output[0]
+        return output.numpy()
+
+
+class SharedBackend(InferenceBackend):
+    """
+    読み込み済みのバックエンドを複数の MouthDetector で共有する (multi_station.py)。
+    前処理のバッファは共有する側ごとに持ち、forward だけを lock で排他する。
+    """
+
+    def __init__(self, backend: InferenceBackend, lock=None):
+        super().__init__(backend.model_path, backend.imgsz, backend.num_threads)
+        self.backend = backend
+        self.name = backend.name
+        self.names = backend.names
+        self.lock = lock or threading.Lock()
+
+    def infer(self, batch: np.ndarray) -> np.ndarray:
+        with self.lock:
+            return self.backend.infer(batch)
+
+
+BACKENDS = {
+    UltralyticsBackend.name: UltralyticsBackend,
+    OnnxBackend.name: OnnxBackend,
+    TorchScriptBackend.name: TorchScriptBackend,
+}
+
+
+# export_model.py が書き出す成果物の一覧 (クラス名・入力サイズ・選ばれた成果物)
+MANIFEST_NAME = "manifest.json"
+# model_sweep.emit が best.pt の隣に書く、選ばれた候補の情報 (入力サイズなど)
+SELECTION_NAME = "selected.json"
+
+
+def weights_digest(path) -> str:
+    """重みファイルの sha256 (manifest が今の best.pt から作られたかの確認に使う)"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def manifest_is_current(path) -> bool:
+    """
+    manifest に成果物が選ばれていて、書き出し元の重みが manifest を作ったときのままなら True
+
+    書き出し元の重みが無い (成果物だけを配置した) ときは manifest を信じる。
+    """
+    path = Path(path)
+    manifest = load_manifest(path)
+    if not manifest.get("selected"):
+        return False
+    source = path.parent / manifest.get("source", "")
+    if not source.is_file():
+        return True
+    if manifest.get("source_sha256") != weights_digest(source):
+        print(f"[Backend] {source} changed since {path} was written; ignoring it (re-run --export)")
+        return False
+    return True
+
+
+def selected_imgsz(weights) -> int:
+    """weights が model_sweep.emit で書き出したままなら、その候補の入力サイズ (でなければ None)"""
+    weights = Path(weights)
+    path = weights.parent / SELECTION_NAME
+    if not path.exists() or not weights.is_file():
+        return None
+    selection = load_manifest(path)
+    if selection.get("sha256") != weights_digest(weights):
+        return None
+    return selection.get("imgsz")
+
+
+def resolve_model_path(backend: str, model_path: str) -> Path:
+    """best.pt を指定したまま ONNX などを選んだ場合は、Ultralytics の export 名 (best.onnx など) を使う"""
+    path = Path(model_path)
+    if backend == "auto":
+        # 今の best.pt から作った manifest があればそれを、無ければ best.pt を Ultralytics で読む
+        manifest = path if path.name == MANIFEST_NAME else path.parent / MANIFEST_NAME
+        if manifest.exists() and manifest_is_current(manifest):
+            return manifest
+        if path.name == MANIFEST_NAME and path.exists():
+            # manifest を直接指定していたら、書き出し元の重みに戻る
+            return path.parent / load_manifest(path).get("source", "best.pt")
+        return path
+    suffix = BACKENDS[backend].suffix
+    if path.suffix == ".pt" and suffix != ".pt":
+        path = path.with_suffix(suffix)
+    return path
+
+
+def load_manifest(path: str) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+def backend_from_manifest(path: str, num_threads: int = None) -> InferenceBackend:
+    """manifest で選ばれた成果物を読む (Ultralytics は import しない)。入力サイズも manifest に従う"""
+    path = Path(path)
+    manifest = load_manifest(path)
+    selected = manifest.get("selected")
+    if not selected:
+        raise ValueError(f"No artifact selected in {path}")
+    instance = BACKENDS[selected["backend"]](path.parent / selected["path"], manifest["imgsz"], num_threads)
+    instance.names = [n.lower() for n in manifest["class_names"]]
+    return instance
+
+
+def make_backend(
+    backend: str, model_path: str, imgsz: int = 224, num_threads: int = None, names=None
+) -> InferenceBackend:
+    if backend == "auto":
+        path = resolve_model_path(backend, model_path)
+        if path.name == MANIFEST_NAME:
+            return backend_from_manifest(path, num_threads)
+        backend, model_path = "ultralytics", path
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend: {backend} (choose from {list(BACKENDS)})")
+    path = resolve_model_path(backend, model_path)
+    if backend == "ultralytics":
+        # スイープで選んだ重みは、その入力サイズで動かす
+        selected = selected_imgsz(path)
+        if selected and selected != imgsz:
+            print(f"[Backend] imgsz {selected} from {path.parent / SELECTION_NAME} (configured {imgsz})")
+            imgsz = selected
+    instance = BACKENDS[backend](path, imgsz, num_threads)
+    if names:
+        instance.names = [n.lower() for n in names]
+    if not instance.names:
+        raise ValueError(f"Class names not found in {instance.model_path}")
+    return instance
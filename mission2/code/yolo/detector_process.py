@@ -0,0 +1,347 @@
+"""
+口の状態検出を別プロセスで動かす
+
+record_loop や ACT の推論と同じインタプリタで YOLO の前処理・後処理を回すと GIL を取り合うので、
+検出 (MouthDetector) だけを spawn した子プロセスで実行する。
+
+- フレーム: 親プロセスがカメラから共有メモリのリング (shm_ring.py) に直接書き込み、子が参照する
+- シグナル: 子プロセスの recording_started / events["exit_early"] / on_chip_confirmed / tracer の呼び出しを
+  Pipe で親に送り、親の中継ループが本物の Event・dict・コールバック・Tracer に反映する。
+  OPEN の通知にはエピソード番号を付け、親からの end_episode(episode) は番号が今のエピソードのときだけ
+  recording_started を下ろして、共有 Event と番号で子に伝える (遅れて届いた次の OPEN を消さない)
+- 監視: 子プロセスが異常終了したら、バックオフを挟んで max_restarts 回まで起動し直す
+
+親側の DetectorProcess は MouthDetector と同じ detect_mouth_state(events, recording_started, on_chip_confirmed)
+を持つので、main.py からは同じように使える。
+"""
+
+import multiprocessing
+import threading
+import time
+from multiprocessing.connection import wait
+
+try:
+    from yolo.frame_grabber import FrameGrabber
+    from yolo.shm_ring import ShmFrameReader, ShmFrameRing, ShmFrameWriter
+except ImportError:
+    from frame_grabber import FrameGrabber
+    from shm_ring import ShmFrameReader, ShmFrameRing, ShmFrameWriter
+
+
+class _ChildEvents(dict):
+    """子プロセス側の events。stop_monitor は共有 Event を読み、書き込みは親に送る"""
+
+    def __init__(self, conn, stop):
+        super().__init__()
+        self._conn = conn
+        self._stop = stop
+
+    def get(self, key, default=None):
+        if key == "stop_monitor":
+            return self._stop.is_set()
+        return super().get(key, default)
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self._conn.send(("event", key, value))
+
+
+class _ChildFlag:
+    """子プロセス側の recording_started。立てるときは MouthDetector.episode を一緒に送る"""
+
+    def __init__(self, conn, detector):
+        self._conn = conn
+        self._detector = detector
+        self._set = False
+
+    def set(self):
+        self._set = True
+        self._conn.send(("flag", True, self._detector.episode))
+
+    def clear(self):
+        self._set = False
+        self._conn.send(("flag", False))
+
+    def is_set(self) -> bool:
+        return self._set
+
+
+class _TracerProxy:
+    """子プロセスの計測を親の Tracer に転送する (時刻は time.monotonic なのでプロセス間で比較できる)"""
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def record(self, stage: str, duration: float, start: float = None):
+        self._conn.send(("trace", "record", (stage, duration, start)))
+
+    def gauge(self, name: str, value: float):
+        self._conn.send(("trace", "gauge", (name, value)))
+
+    def mark(self, name: str, t: float = None):
+        self._conn.send(("trace", "mark", (name, time.monotonic() if t is None else t)))
+
+    def since(self, mark: str, stage: str, t: float = None):
+        self._conn.send(("trace", "since", (mark, stage, time.monotonic() if t is None else t)))
+
+
+def _build_detector(config: dict, sources, tracer):
+    try:
+        from yolo.motion_gate import MotionGate
+        from yolo.mouth_detector import MouthDetector
+        from yolo.mouth_roi import MouthRoiTracker
+        from yolo.preview import make_preview
+        from yolo.scheduler import InferenceScheduler
+    except ImportError:
+        from motion_gate import MotionGate
+        from mouth_detector import MouthDetector
+        from mouth_roi import MouthRoiTracker
+        from preview import make_preview
+        from scheduler import InferenceScheduler
+
+    roi_config = config.get("roi_config")
+    scheduler_config = config.get("scheduler_config")
+    gate_config = config.get("motion_gate_config")
+    preview = config.get("preview")
+    return MouthDetector(
+        config["model_path"],
+        backend=config.get("backend", "ultralytics"),
+        imgsz=config.get("imgsz", 224),
+        num_threads=config.get("num_threads"),
+        state_config=config.get("state_config"),
+        source=sources,
+        preview=make_preview(*preview) if preview else None,
+        tracer=tracer if config.get("trace", True) else None,
+        roi=[MouthRoiTracker(**roi_config) for _ in sources] if roi_config is not None else None,
+        scheduler=InferenceScheduler(**scheduler_config) if scheduler_config else None,
+        motion_gate=MotionGate(**gate_config) if gate_config else None,
+    )
+
+
+def _forward_end_episode(detector, end_episode, episode, stop):
+    while not stop.is_set():
+        if end_episode.wait(0.1):
+            end_episode.clear()
+            detector.end_episode(episode.value)
+
+
+def _child_main(ring_specs, conn, go, stop, end_episode, end_episode_id, config):
+    readers = [ShmFrameReader(ShmFrameRing.attach(spec)) for spec in ring_specs]
+    detector = _build_detector(config, readers, _TracerProxy(conn))
+    threading.Thread(
+        target=_forward_end_episode,
+        args=(detector, end_episode, end_episode_id, stop),
+        name="end-episode",
+        daemon=True,
+    ).start()
+    if detector.model is not None:
+        detector.model.warmup()
+    conn.send(("ready", detector.model.names if detector.model is not None else []))
+
+    while not go.wait(0.1):
+        if stop.is_set():
+            return
+    detector.detect_mouth_state(
+        _ChildEvents(conn, stop),
+        _ChildFlag(conn, detector),
+        lambda: conn.send(("chip_confirmed",)),
+    )
+
+
+class DetectorProcess:
+    def __init__(
+        self,
+        config: dict,
+        camera_index=5,
+        camera_width: int = 320,
+        camera_height: int = 240,
+        sources=None,
+        slots: int = 4,
+        tracer=None,
+        max_restarts: int = 5,
+        ready_timeout: float = 120.0,
+    ):
+        """
+        Args:
+            config: 子プロセスで MouthDetector を作る設定 (model_path, backend, imgsz, num_threads,
+                state_config, scheduler_config, roi_config, motion_gate_config, preview=(mode, fps, port, window_name))
+            sources: cv2.VideoCapture 互換のオブジェクト (のリスト)。None なら camera_index を開く
+            slots: カメラごとのリングのスロット数 (3 以上)
+        """
+        self.config = config
+        self.camera_indices = list(camera_index) if isinstance(camera_index, (list, tuple)) else [camera_index]
+        self.camera_width = camera_width
+        self.camera_height = camera_height
+        self.sources = sources if isinstance(sources, (list, tuple)) or sources is None else [sources]
+        self.slots = slots
+        self.tracer = tracer
+        self.max_restarts = max_restarts
+        self.ready_timeout = ready_timeout
+
+        self._ctx = multiprocessing.get_context("spawn")
+        self._go = self._ctx.Event()
+        self._stop = self._ctx.Event()
+        self._end_episode = self._ctx.Event()
+        self._end_episode_id = self._ctx.Value("i", 0)
+        self.rings = []
+        self.writers = []
+        self.process = None
+        self._conn = None
+
+        self.names = []
+        self.restarts = 0
+        self.messages = 0
+        # 子プロセスが最後に送ってきた OPEN のエピソード番号
+        self.episode = 0
+        self._episode_lock = threading.Lock()
+        self._recording_started = None
+
+    def _open_sources(self):
+        if self.sources is not None:
+            return list(self.sources)
+        caps = []
+        for camera_index in self.camera_indices:
+            grabber = FrameGrabber.open(camera_index, self.camera_width, self.camera_height)
+            if not grabber.isOpened():
+                print(f"Failed to open camera {camera_index}")
+            caps.append(grabber.cap)
+        return caps
+
+    def start(self):
+        """カメラとリングを用意して子プロセスを起動し、モデルの読み込みが終わるまで待つ"""
+        for i, cap in enumerate(self._open_sources()):
+            ret, frame = cap.read()
+            if not ret:
+                raise RuntimeError(f"Cannot read from camera source {i}")
+            ring = ShmFrameRing.create(frame.shape, self.slots)
+            self.rings.append(ring)
+            self.writers.append(ShmFrameWriter(cap, ring, name=f"shm-frame-writer-{i}").start())
+            print(f"[DetectorProcess] camera {i}: {frame.shape} -> shared memory {ring.name}")
+
+        self._spawn()
+        self._wait_ready()
+        return self
+
+    def _spawn(self):
+        recv_conn, send_conn = self._ctx.Pipe(duplex=False)
+        self.process = self._ctx.Process(
+            target=_child_main,
+            args=(
+                [ring.spec() for ring in self.rings],
+                send_conn,
+                self._go,
+                self._stop,
+                self._end_episode,
+                self._end_episode_id,
+                self.config,
+            ),
+            name="mouth-detector",
+            daemon=True,
+        )
+        self.process.start()
+        send_conn.close()
+        self._conn = recv_conn
+
+    def _wait_ready(self):
+        deadline = time.monotonic() + self.ready_timeout
+        while time.monotonic() < deadline:
+            if self._conn.poll(0.1):
+                message = self._conn.recv()
+                if message[0] == "ready":
+                    self.names = list(message[1])
+                    print(f"[DetectorProcess] ready (pid {self.process.pid}, classes {self.names})")
+                    return
+            elif not self.process.is_alive():
+                raise RuntimeError(f"Detector process exited during startup ({self.process.exitcode})")
+        raise TimeoutError("Detector process did not become ready")
+
+    def _restart(self) -> bool:
+        if self.restarts >= self.max_restarts:
+            print(f"[DetectorProcess] giving up after {self.restarts} restarts")
+            return False
+        delay = min(0.5 * 2 ** self.restarts, 10.0)
+        self.restarts += 1
+        print(
+            f"[DetectorProcess] detector exited with {self.process.exitcode}, "
+            f"restarting in {delay:.1f}s ({self.restarts}/{self.max_restarts})"
+        )
+        time.sleep(delay)
+        for ring in self.rings:
+            ring.reset_sync()
+        self._spawn()
+        return True
+
+    def _handle(self, message, events, recording_started, on_chip_confirmed):
+        kind = message[0]
+        if kind == "flag":
+            if message[1]:
+                with self._episode_lock:
+                    self.episode = message[2]
+                    recording_started.set()
+            else:
+                recording_started.clear()
+        elif kind == "event":
+            events[message[1]] = message[2]
+        elif kind == "chip_confirmed":
+            if on_chip_confirmed:
+                on_chip_confirmed()
+        elif kind == "trace":
+            if self.tracer:
+                getattr(self.tracer, message[1])(*message[2])
+        elif kind == "ready":
+            self.names = list(message[1])
+            print(f"[DetectorProcess] ready (pid {self.process.pid})")
+
+    def end_episode(self, episode: int):
+        """
+        MouthDetector.end_episode と同じ。episode がまだ今のエピソードなら recording_started を
+        ここで下ろし、子プロセスにも状態判定を待機に戻させる
+        """
+        with self._episode_lock:
+            if episode != self.episode or self._recording_started is None:
+                return
+            self._recording_started.clear()
+            self._end_episode_id.value = episode
+            self._end_episode.set()
+
+    def detect_mouth_state(self, events: dict, recording_started, on_chip_confirmed=None):
+        """子プロセスからの通知を中継し、子プロセスを監視する (stop_monitor まで戻らない)"""
+        self._recording_started = recording_started
+        self._go.set()
+        try:
+            while not events.get("stop_monitor", False):
+                ready = wait([self._conn, self.process.sentinel], timeout=0.1)
+                if self._conn in ready:
+                    try:
+                        while self._conn.poll():
+                            self._handle(self._conn.recv(), events, recording_started, on_chip_confirmed)
+                            self.messages += 1
+                        continue
+                    except (EOFError, OSError):
+                        pass
+                if self.process.sentinel in ready or not self.process.is_alive():
+                    self.process.join()
+                    if self.process.exitcode == 0:
+                        # プレビューで q を押したなど、子プロセスが自分で終了した
+                        break
+                    if not self._restart():
+                        break
+        finally:
+            self.stop()
+
+    def stop(self):
+        if self.process is None:
+            return
+        self._stop.set()
+        self.process.join(timeout=3.0)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join()
+        self.process = None
+        for writer in self.writers:
+            writer.release()
+            print(f"[Camera stats] {writer.stats()}")
+        for ring in self.rings:
+            ring.close()
+            ring.unlink()
+        print(f"[DetectorProcess] restarts {self.restarts}, messages {self.messages}")
@@ -0,0 +1,211 @@
+"""
+学習済みの口の状態分類モデルを CPU 推論用に書き出す
+
+best.pt から次の成果物を作り、同じディレクトリに manifest.json を書く。
+
+- best.onnx          ONNX (fp32, バッチ次元は可変)
+- best.int8.onnx     ONNX の静的 int8 量子化 (QDQ)。学習キャッシュの train から選んだ画像で較正する
+- best.torchscript   TorchScript (fp32)
+
+それぞれを学習キャッシュの val で評価し、fp32 (best.pt) との正解率の差が max_drop を超えたものは
+選ばない。残ったものの中から、カメラ解像度のフレームでの推論時間 (p99) が最も小さいものを
+manifest の "selected" にする。実行時は MOUTH_BACKEND = "auto" で manifest を読み、
+Ultralytics を import せずに選ばれた成果物を onnxruntime / torch.jit で読む。
+manifest には best.pt の sha256 を書き、best.pt が変わっていたら実行時は manifest を無視する。
+"""
+
+import json
+import shutil
+import time
+from pathlib import Path
+
+import numpy as np
+
+try:
+    from yolo import train_cache
+    from yolo.backends import MANIFEST_NAME, make_backend, weights_digest
+    from yolo.model_sweep import measure_latency
+except ImportError:
+    import train_cache
+    from backends import MANIFEST_NAME, make_backend, weights_digest
+    from model_sweep import measure_latency
+
+DEFAULT_FORMATS = ["onnx", "onnx-int8", "torchscript"]
+
+
+class _CalibrationReader:
+    """onnxruntime.quantization の CalibrationDataReader と同じインターフェース"""
+
+    def __init__(self, cache, input_name: str, count: int = 300, seed: int = 0):
+        indices = cache.indices(train_cache.TRAIN)
+        if len(indices) == 0:
+            indices = cache.indices()
+        rng = np.random.default_rng(seed)
+        if len(indices) > count:
+            indices = np.sort(rng.choice(indices, count, replace=False))
+        self.cache = cache
+        self.input_name = input_name
+        self.indices = indices
+        self._pos = 0
+
+    def get_next(self):
+        if self._pos >= len(self.indices):
+            return None
+        image = self.cache.images[self.indices[self._pos]]
+        self._pos += 1
+        return {self.input_name: (image[None].astype(np.float32) / 255.0)}
+
+    def rewind(self):
+        self._pos = 0
+
+
+def export_ultralytics(weights: str, fmt: str, imgsz: int) -> Path:
+    from ultralytics import YOLO
+
+    start = time.monotonic()
+    kwargs = {"dynamic": True, "simplify": True} if fmt == "onnx" else {}
+    path = Path(YOLO(weights).export(format=fmt, imgsz=imgsz, **kwargs))
+    print(f"[Export] {fmt}: {path} ({time.monotonic() - start:.1f}s)")
+    return path
+
+
+def quantize_onnx(fp32_path: Path, out_path: Path, cache, calib_count: int = 300) -> Path:
+    """学習キャッシュの画像で較正して静的 int8 量子化する (重みはチャネルごと)"""
+    import onnx
+    import onnxruntime as ort
+    from onnxruntime.quantization import QuantFormat, QuantType, quantize_static
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+
+    start = time.monotonic()
+    source = fp32_path
+    prepared = out_path.with_suffix(".prep.onnx")
+    try:
+        quant_pre_process(str(fp32_path), str(prepared))
+        source = prepared
+    except Exception as e:
+        print(f"[Export] quant_pre_process skipped: {e}")
+
+    input_name = ort.InferenceSession(str(fp32_path), providers=["CPUExecutionProvider"]).get_inputs()[0].name
+    reader = _CalibrationReader(cache, input_name, calib_count)
+    quantize_static(
+        str(source),
+        str(out_path),
+        reader,
+        quant_format=QuantFormat.QDQ,
+        per_channel=True,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+    )
+    prepared.unlink(missing_ok=True)
+
+    # クラス名などのメタデータは量子化で失われるので元のモデルから写す
+    metadata = {p.key: p.value for p in onnx.load(str(fp32_path)).metadata_props}
+    model = onnx.load(str(out_path))
+    onnx.helper.set_model_props(model, metadata)
+    onnx.save(model, str(out_path))
+    print(
+        f"[Export] int8: {out_path} ({len(reader.indices)} calibration images, "
+        f"{fp32_path.stat().st_size / 2**20:.1f} MB -> {out_path.stat().st_size / 2**20:.1f} MB, "
+        f"{time.monotonic() - start:.1f}s)"
+    )
+    return out_path
+
+
+def _measure(name, backend_name, path, cache_dir, imgsz, names, num_threads, camera_size):
+    backend = make_backend(backend_name, str(path), imgsz, num_threads, names=names)
+    result = train_cache.evaluate(backend, cache_dir)
+    p50, p99 = measure_latency(backend, *camera_size)
+    entry = {
+        "name": name,
+        "backend": backend_name,
+        "path": Path(path).name,
+        "accuracy": result["accuracy"],
+        "per_class": result["per_class"],
+        "p50_ms": p50,
+        "p99_ms": p99,
+        "size_mb": Path(path).stat().st_size / 2**20,
+    }
+    return entry, backend.names
+
+
+def export(
+    weights: str,
+    cache_dir: str,
+    formats=DEFAULT_FORMATS,
+    max_drop: float = 0.01,
+    calib_count: int = 300,
+    num_threads: int = None,
+    camera_size=(320, 240),
+) -> dict:
+    """
+    Args:
+        weights: 学習済みの best.pt
+        cache_dir: 学習キャッシュ (train_cache.py)。較正・評価に使い、imgsz もここから取る
+        max_drop: fp32 からの正解率の低下の許容値
+        num_threads: 推論時間の計測に使うスレッド数 (実機の MOUTH_NUM_THREADS に合わせる)
+
+    Returns:
+        manifest の内容
+    """
+    weights = Path(weights)
+    cache = train_cache.TrainCache(cache_dir)
+    imgsz = cache.imgsz
+    reference, names = _measure("fp32", "ultralytics", weights, cache_dir, imgsz, None, num_threads, camera_size)
+    artifacts = []
+
+    onnx_path = None
+    if "onnx" in formats or "onnx-int8" in formats:
+        onnx_path = export_ultralytics(str(weights), "onnx", imgsz)
+    if "onnx" in formats:
+        artifacts.append(_measure("onnx", "onnx", onnx_path, cache_dir, imgsz, names, num_threads, camera_size)[0])
+    if "onnx-int8" in formats:
+        int8_path = quantize_onnx(onnx_path, weights.with_suffix(".int8.onnx"), cache, calib_count)
+        artifacts.append(
+            _measure("onnx-int8", "onnx", int8_path, cache_dir, imgsz, names, num_threads, camera_size)[0]
+        )
+    if "torchscript" in formats:
+        ts_path = export_ultralytics(str(weights), "torchscript", imgsz)
+        artifacts.append(
+            _measure("torchscript", "torchscript", ts_path, cache_dir, imgsz, names, num_threads, camera_size)[0]
+        )
+
+    for artifact in artifacts:
+        artifact["accuracy_drop"] = reference["accuracy"] - artifact["accuracy"]
+        artifact["accepted"] = artifact["accuracy_drop"] <= max_drop
+    accepted = [a for a in artifacts if a["accepted"]]
+    selected = min(accepted, key=lambda a: a["p99_ms"]) if accepted else None
+
+    manifest = {
+        "class_names": names,
+        "imgsz": imgsz,
+        "source": weights.name,
+        # best.pt を学習し直したり差し替えたりしたら、実行時はこの manifest を使わない
+        "source_sha256": weights_digest(weights),
+        "max_drop": max_drop,
+        "reference": reference,
+        "artifacts": artifacts,
+        "selected": {"name": selected["name"], "backend": selected["backend"], "path": selected["path"]}
+        if selected
+        else None,
+    }
+    manifest_path = weights.parent / MANIFEST_NAME
+    if manifest_path.exists():
+        shutil.copy2(manifest_path, manifest_path.with_suffix(".prev.json"))
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    print(f"[Export] {'artifact':<12}{'accuracy':>10}{'drop':>8}{'p50 ms':>9}{'p99 ms':>9}{'MB':>7}")
+    for a in [reference] + artifacts:
+        drop = f"{a['accuracy_drop']:+.3f}" if "accuracy_drop" in a else ""
+        mark = "" if a.get("accepted", True) else "  rejected"
+        if selected and a["name"] == selected["name"]:
+            mark = "  selected"
+        print(
+            f"[Export] {a['name']:<12}{a['accuracy']:>10.3f}{drop:>8}"
+            f"{a['p50_ms']:>9.2f}{a['p99_ms']:>9.2f}{a['size_mb']:>7.1f}{mark}"
+        )
+    if selected:
+        print(f"[Export] manifest: {manifest_path} -> {selected['path']}")
+    else:
+        print(f"[Export] no artifact within {max_drop} of fp32; runtime will fall back to {weights.name}")
+    return manifest
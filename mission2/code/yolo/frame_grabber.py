@@ -0,0 +1,136 @@
+import threading
+import time
+
+import cv2
+
+
+class FrameGrabber:
+    """
+    カメラのバッファを別スレッドで吸い出し続け、最新フレームだけを保持する。
+
+    3 スロットのトリプルバッファ (書き込み中 / 最新 / 読み出し中) を使うので、
+    read_latest() が返すフレームは次の read_latest() 呼び出しまで上書きされない。
+    """
+
+    def __init__(self, cap, name: str = "frame-grabber", stale_after: float = 0.2):
+        self.cap = cap
+        self.name = name
+        self.stale_after = stale_after
+
+        self._slots = [None, None, None]
+        self._stamps = [0.0, 0.0, 0.0]
+        self._seqs = [0, 0, 0]
+        self._write, self._ready, self._read = 0, 1, 2
+
+        self._seq = 0
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread = None
+
+        self.captured = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.stale = 0
+        self.read_failures = 0
+        self.last_age = 0.0
+
+    @classmethod
+    def open(cls, camera_index, width: int, height: int, fps: int = None, **kwargs):
+        cap = cv2.VideoCapture(camera_index)
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+        if fps:
+            cap.set(cv2.CAP_PROP_FPS, fps)
+        # ドライバ側のキューは最小にして、古いフレームを溜めない
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        return cls(cap, **kwargs)
+
+    def isOpened(self) -> bool:
+        return self.cap is not None and self.cap.isOpened()
+
+    def start(self):
+        if self._thread is not None:
+            return self
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._running = False
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+
+    def release(self):
+        self.stop()
+        if self.cap is not None:
+            self.cap.release()
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    def _run(self):
+        while self._running:
+            ret, frame = self.cap.read(self._slots[self._write])
+            timestamp = time.monotonic()
+            if not ret:
+                self.read_failures += 1
+                if not self.cap.isOpened():
+                    break
+                time.sleep(0.005)
+                continue
+
+            with self._cond:
+                self._seq += 1
+                self.captured += 1
+                self._slots[self._write] = frame
+                self._stamps[self._write] = timestamp
+                self._seqs[self._write] = self._seq
+                if self._seqs[self._ready] > self._seqs[self._read]:
+                    # 一度も読まれずに上書きされるフレーム
+                    self.dropped += 1
+                self._write, self._ready = self._ready, self._write
+                self._cond.notify_all()
+
+        self._running = False
+        with self._cond:
+            self._cond.notify_all()
+
+    def read_latest(self, last_seq: int = 0, timeout: float = 1.0):
+        """
+        last_seq より新しいフレームを待って返す。
+
+        Returns:
+            (frame, timestamp, seq)。タイムアウトや停止時は (None, 0.0, last_seq)
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._seqs[self._ready] <= last_seq:
+                remaining = deadline - time.monotonic()
+                if not self._running or remaining <= 0:
+                    return None, 0.0, last_seq
+                self._cond.wait(remaining)
+            self._read, self._ready = self._ready, self._read
+            frame = self._slots[self._read]
+            timestamp = self._stamps[self._read]
+            seq = self._seqs[self._read]
+
+        self.delivered += 1
+        self.last_age = time.monotonic() - timestamp
+        if self.last_age > self.stale_after:
+            self.stale += 1
+        return frame, timestamp, seq
+
+    def stats(self) -> dict:
+        return {
+            "captured": self.captured,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+            "stale": self.stale,
+            "read_failures": self.read_failures,
+            "last_age_ms": self.last_age * 1000,
+        }
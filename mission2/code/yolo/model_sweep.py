@@ -0,0 +1,235 @@
+"""
+口の状態分類モデルの選定スイープ
+
+バックボーン x 入力サイズ x エポック数の組み合わせを学習キャッシュ (train_cache.py) から
+プロセスプールで並列に学習し、学習後に 1 つずつ
+
+- val の正解率
+- CPU での 1 フレームあたりの推論時間 (前処理込み, p50 / p99)
+
+を測って、正解率と p99 のパレート最適な候補を report.json / report.md に書き出す。
+レイテンシ予算 (budget_ms) 内で正解率が最も高い候補を選び、MOUTH_MODEL_PATH が指す
+best.pt にコピーできる。
+"""
+
+import itertools
+import json
+import multiprocessing
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import numpy as np
+
+try:
+    from yolo import train_cache
+    from yolo.backends import MANIFEST_NAME, SELECTION_NAME, make_backend, weights_digest
+except ImportError:
+    import train_cache
+    from backends import MANIFEST_NAME, SELECTION_NAME, make_backend, weights_digest
+
+DEFAULT_MODELS = ["yolov8n-cls.pt", "yolov8s-cls.pt", "yolo11n-cls.pt"]
+DEFAULT_IMGSZ = [128, 160, 224]
+DEFAULT_EPOCHS = [30]
+
+
+def candidate_name(model: str, imgsz: int, epochs: int) -> str:
+    return f"{Path(model).stem}_{imgsz}_e{epochs}"
+
+
+def _train_candidate(cache_dir, model, imgsz, epochs, project, num_threads):
+    """プロセスプールのワーカーで実行する"""
+    start = time.monotonic()
+    weights = train_cache.train_from_cache(
+        cache_dir,
+        epochs,
+        base_model=model,
+        project=project,
+        name=candidate_name(model, imgsz, epochs),
+        num_threads=num_threads,
+    )
+    return str(weights), time.monotonic() - start
+
+
+def measure_latency(backend, width: int, height: int, runs: int = 200, warmup: int = 10, seed: int = 0):
+    """カメラ解像度の合成フレームで predict (前処理込み) の所要時間を測る"""
+    rng = np.random.default_rng(seed)
+    frames = [rng.integers(0, 256, (height, width, 3), dtype=np.uint8) for _ in range(8)]
+    backend.warmup(warmup)
+    durations = []
+    for i in range(runs):
+        start = time.perf_counter()
+        backend.predict(frames[i % len(frames)])
+        durations.append(time.perf_counter() - start)
+    durations = np.array(durations) * 1000
+    return float(np.percentile(durations, 50)), float(np.percentile(durations, 99))
+
+
+def pareto_front(candidates):
+    """正解率が高く p99 が小さい方が良い。他の候補に支配されないものを返す"""
+    front = []
+    for c in candidates:
+        dominated = any(
+            o["accuracy"] >= c["accuracy"]
+            and o["p99_ms"] <= c["p99_ms"]
+            and (o["accuracy"] > c["accuracy"] or o["p99_ms"] < c["p99_ms"])
+            for o in candidates
+        )
+        if not dominated:
+            front.append(c)
+    return sorted(front, key=lambda c: c["p99_ms"])
+
+
+def choose(candidates, budget_ms: float = None):
+    """
+    予算内で正解率最大 (同率なら速い方)。予算内に無ければ最速の候補に over_budget = True を付けて返す
+    (emit は over_budget の候補を force なしでは書き出さない)
+    """
+    if not candidates:
+        return None
+    within = [c for c in candidates if budget_ms is None or c["p99_ms"] <= budget_ms]
+    if not within:
+        return {**min(candidates, key=lambda c: c["p99_ms"]), "over_budget": True}
+    return max(within, key=lambda c: (c["accuracy"], -c["p99_ms"]))
+
+
+def write_report(out_dir: Path, candidates, front, chosen, budget_ms):
+    with open(out_dir / "report.json", "w") as f:
+        json.dump(
+            {"budget_ms": budget_ms, "candidates": candidates, "pareto": front, "chosen": chosen},
+            f,
+            indent=2,
+        )
+
+    lines = [
+        f"# Mouth classifier sweep (budget p99 <= {budget_ms} ms)" if budget_ms else "# Mouth classifier sweep",
+        "",
+        "| candidate | imgsz | epochs | accuracy | p50 ms | p99 ms | train s | pareto |",
+        "|---|---|---|---|---|---|---|---|",
+    ]
+    names = {c["name"] for c in front}
+    for c in sorted(candidates, key=lambda c: c["p99_ms"]):
+        mark = "*" if c["name"] in names else ""
+        if chosen and c["name"] == chosen["name"]:
+            mark += " chosen (over budget)" if chosen.get("over_budget") else " chosen"
+        lines.append(
+            f"| {c['name']} | {c['imgsz']} | {c['epochs']} | {c['accuracy']:.3f} | "
+            f"{c['p50_ms']:.2f} | {c['p99_ms']:.2f} | {c['train_sec']:.0f} | {mark} |"
+        )
+    (out_dir / "report.md").write_text("\n".join(lines) + "\n")
+    print("\n".join(lines))
+
+
+def sweep(
+    source: str,
+    cache_root: str,
+    models=DEFAULT_MODELS,
+    imgsz_list=DEFAULT_IMGSZ,
+    epochs_list=DEFAULT_EPOCHS,
+    class_names=None,
+    workers: int = 2,
+    project: str = "mouth_sweep",
+    budget_ms: float = None,
+    latency_threads: int = None,
+    camera_size=(320, 240),
+):
+    """
+    Args:
+        source: 学習データ (SampleStore またはクラス別フォルダ)。入力サイズごとのキャッシュをここから作る
+        cache_root: <cache_root>/cache_<imgsz> にキャッシュを置く (既にあれば再利用)
+        latency_threads: 推論時間計測時のスレッド数 (実機の MOUTH_NUM_THREADS に合わせる)
+    """
+    out_dir = Path(project)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    cache_root = Path(cache_root)
+
+    caches = {}
+    for imgsz in imgsz_list:
+        cache_dir = cache_root / f"cache_{imgsz}"
+        if not (cache_dir / "cache.json").exists():
+            train_cache.TrainCache.build(source, cache_dir, class_names, imgsz=imgsz)
+        caches[imgsz] = cache_dir
+
+    grid = list(itertools.product(models, imgsz_list, epochs_list))
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    print(f"[Sweep] {len(grid)} candidates, {workers} workers x {threads} threads")
+
+    trained = {}
+    # torch を含むので fork ではなく spawn でワーカーを作る
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        futures = {
+            pool.submit(
+                _train_candidate, str(caches[imgsz]), model, imgsz, epochs, str(out_dir), threads
+            ): (model, imgsz, epochs)
+            for model, imgsz, epochs in grid
+        }
+        for future in as_completed(futures):
+            model, imgsz, epochs = futures[future]
+            name = candidate_name(model, imgsz, epochs)
+            try:
+                trained[(model, imgsz, epochs)] = future.result()
+                print(f"[Sweep] trained {name} ({trained[(model, imgsz, epochs)][1]:.0f}s)")
+            except Exception as e:
+                print(f"[Sweep] {name} failed: {e}")
+
+    # 計測は学習が終わってから 1 つずつ行う (並列に測ると CPU を取り合って値がぶれる)
+    candidates = []
+    for (model, imgsz, epochs), (weights, train_sec) in sorted(trained.items()):
+        backend = make_backend("ultralytics", weights, imgsz, latency_threads)
+        result = train_cache.evaluate(backend, caches[imgsz])
+        p50, p99 = measure_latency(backend, *camera_size)
+        candidates.append(
+            {
+                "name": candidate_name(model, imgsz, epochs),
+                "model": model,
+                "imgsz": imgsz,
+                "epochs": epochs,
+                "weights": weights,
+                "accuracy": result["accuracy"],
+                "per_class": result["per_class"],
+                "p50_ms": p50,
+                "p99_ms": p99,
+                "train_sec": train_sec,
+            }
+        )
+
+    front = pareto_front(candidates)
+    chosen = choose(candidates, budget_ms)
+    write_report(out_dir, candidates, front, chosen, budget_ms)
+    if chosen and chosen.get("over_budget"):
+        print(
+            f"[Sweep] no candidate within p99 <= {budget_ms} ms; "
+            f"fastest is {chosen['name']} (p99 {chosen['p99_ms']:.2f} ms)"
+        )
+    elif chosen:
+        print(f"[Sweep] chosen: {chosen['name']} (accuracy {chosen['accuracy']:.3f}, p99 {chosen['p99_ms']:.2f} ms)")
+    return chosen
+
+
+def emit(chosen: dict, model_path: str, force: bool = False):
+    """
+    選んだ重みを model_path にコピーする (既存のファイルは .prev.pt として残す)
+
+    入力サイズは重みの sha256 と一緒に selected.json に書き、make_backend がそれを読む。
+    前の重みから書き出した manifest.json は manifest.prev.json に退避する (--export で作り直す)。
+    予算を超えた候補 (over_budget) は force=True のときだけ書き出し、それ以外は None を返す。
+    """
+    if chosen.get("over_budget") and not force:
+        print(f"[Sweep] {chosen['name']} is over budget; not emitting (use --emit-over-budget to emit anyway)")
+        return None
+    model_path = Path(model_path)
+    model_path.parent.mkdir(parents=True, exist_ok=True)
+    if model_path.exists():
+        shutil.copy2(model_path, model_path.with_suffix(".prev.pt"))
+    shutil.copy2(chosen["weights"], model_path)
+    with open(model_path.parent / SELECTION_NAME, "w") as f:
+        json.dump({**chosen, "sha256": weights_digest(model_path)}, f, indent=2)
+    manifest = model_path.parent / MANIFEST_NAME
+    if manifest.exists():
+        manifest.replace(manifest.with_suffix(".prev.json"))
+        print(f"[Sweep] moved the old {manifest} aside; run --export to build artifacts for the new weights")
+    print(f"[Sweep] {chosen['weights']} -> {model_path} (imgsz {chosen['imgsz']})")
+    return model_path
@@ -0,0 +1,112 @@
+"""
+フレームの変化が小さいときに分類をスキップするゲート
+
+座って待っている間など、口検出カメラのフレームは直前とほとんど変わらないのに毎回分類している。
+MotionGate はフレームを小さなグレースケールのサムネイル (size) に縮小し、最後に分類したフレームの
+サムネイルと比べて
+
+- 画素 (= 元画像のブロック) の差の平均が mean_threshold を超える
+- 差が block_threshold を超えるブロックの割合が block_fraction を超える (口元だけの小さな変化)
+- 最後に分類してから refresh_interval 秒以上たった
+
+のどれかのときだけ分類させる。それ以外は前回の分類結果を使い回す。
+比較の基準は直前のフレームではなく最後に分類したフレームなので、ゆっくりした変化も積み重なれば検出される。
+"""
+
+import time
+
+import cv2
+import numpy as np
+
+
+class MotionGate:
+    def __init__(
+        self,
+        size=(32, 24),
+        mean_threshold: float = 3.0,
+        block_threshold: float = 20.0,
+        block_fraction: float = 0.02,
+        refresh_interval: float = 0.5,
+    ):
+        """
+        Args:
+            size: 比較に使うサムネイルの (幅, 高さ)
+            mean_threshold: サムネイルの差の平均 (0-255) がこれを超えたら変化あり
+            block_threshold: 1 ブロックの差 (0-255) がこれを超えたら、そのブロックは変化あり
+            block_fraction: 変化ありのブロックの割合がこれを超えたら変化あり
+            refresh_interval: 変化が無くてもこの秒数ごとに分類する
+        """
+        self.size = tuple(size)
+        self.mean_threshold = mean_threshold
+        self.block_threshold = block_threshold
+        self.block_fraction = block_fraction
+        self.refresh_interval = refresh_interval
+
+        self._thumb = np.empty((self.size[1], self.size[0]), dtype=np.uint8)
+        self._reference = None
+        self._diff = np.empty_like(self._thumb)
+        self._last_run = None
+
+        self.executed = 0
+        self.skipped = 0
+        self.refreshed = 0
+        self.check_time = 0.0
+
+    def clone(self) -> "MotionGate":
+        """同じ設定の新しいゲート (カメラごとに 1 つ持たせる)"""
+        return MotionGate(
+            self.size, self.mean_threshold, self.block_threshold, self.block_fraction, self.refresh_interval
+        )
+
+    def reset(self):
+        self._reference = None
+        self._last_run = None
+
+    def _thumbnail(self, frame: np.ndarray) -> np.ndarray:
+        small = cv2.resize(frame, self.size, interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            cv2.cvtColor(small, cv2.COLOR_BGR2GRAY, dst=self._thumb)
+        else:
+            self._thumb[:] = small
+        return self._thumb
+
+    def check(self, frame: np.ndarray, now: float = None) -> bool:
+        """このフレームを分類すべきなら True (そのフレームを次の比較の基準にする)"""
+        now = time.monotonic() if now is None else now
+        start = time.perf_counter()
+        thumb = self._thumbnail(frame)
+
+        run = False
+        if self._reference is None:
+            run = True
+        elif now - self._last_run >= self.refresh_interval:
+            run = True
+            self.refreshed += 1
+        else:
+            cv2.absdiff(thumb, self._reference, dst=self._diff)
+            run = (
+                float(self._diff.mean()) > self.mean_threshold
+                or np.count_nonzero(self._diff > self.block_threshold) > self.block_fraction * self._diff.size
+            )
+
+        if run:
+            if self._reference is None:
+                self._reference = thumb.copy()
+            else:
+                self._reference[:] = thumb
+            self._last_run = now
+            self.executed += 1
+        else:
+            self.skipped += 1
+        self.check_time += time.perf_counter() - start
+        return run
+
+    def stats(self) -> dict:
+        total = self.executed + self.skipped
+        return {
+            "executed": self.executed,
+            "skipped": self.skipped,
+            "refreshed": self.refreshed,
+            "skip_rate": self.skipped / total if total else 0.0,
+            "check_us": round(self.check_time / total * 1e6, 1) if total else 0.0,
+        }
@@ -1,163 +1,400 @@
 import threading
 import time
-import cv2
-from ultralytics import YOLO
 from pathlib import Path
 
+try:
+    from yolo.backends import InferenceBackend, make_backend, resolve_model_path
+    from yolo.frame_grabber import FrameGrabber
+    from yolo import mouth_state
+    from yolo.preview import make_preview
+    from yolo.motion_gate import MotionGate
+except ImportError:
+    from backends import InferenceBackend, make_backend, resolve_model_path
+    from frame_grabber import FrameGrabber
+    import mouth_state
+    from preview import make_preview
+    from motion_gate import MotionGate
+
+
+class MouthStream:
+    """1 台のカメラ (または再生ソース) ごとの状態"""
+
+    def __init__(self, index: int, cap, roi=None, gate=None):
+        self.index = index
+        self.cap = cap
+        self.roi = roi
+        self.gate = gate
+        self.last_prediction = None
+        self.last_box = None
+        self.engine = None
+        self.frame_seq = 0
+        self.last_logged_state = None
+        self.frames = 0
+
 
 class MouthDetector:
     def __init__(
         self,
         model_path: str = "mouth_classification/mouth_cls_model/weights/best.pt",
-        camera_index: int = 5,
+        camera_index=5,
         camera_width: int = 320,
         camera_height: int = 240,
+        backend: str = "ultralytics",
+        imgsz: int = 224,
+        num_threads: int = None,
+        state_config: dict = None,
+        source=None,
+        recorder=None,
+        preview=None,
+        tracer=None,
+        roi=None,
+        scheduler=None,
+        on_stream_event=None,
+        motion_gate=None,
     ):
+        """
+        camera_index / source にリストを渡すと複数カメラを扱う。各カメラの最新フレームを
+        1 回の forward にまとめて推論し、状態判定はカメラごとに行う。
+        recording_started / exit_early は最初に OPEN を検出したカメラの状態で動かし、
+        すべてのカメラのイベントは on_stream_event(stream_index, event, prediction) に渡す。
+        """
         self.model_path = model_path
-        self.camera_index = camera_index
+        self.camera_indices = list(camera_index) if isinstance(camera_index, (list, tuple)) else [camera_index]
+        self.camera_index = self.camera_indices[0]
         self.camera_width = camera_width
         self.camera_height = camera_height
+        self.backend = backend
+        self.imgsz = imgsz
+        self.num_threads = num_threads
+        self.state_config = state_config or {}
+        self.state_engine = None
         self.model = None
-        self.cap = None
+        # source を渡すと (ReplaySource など) カメラの代わりに使う
+        sources = source if isinstance(source, (list, tuple)) else [source]
+        self.sources = [
+            FrameGrabber(s).start() if s is not None and not hasattr(s, "read_latest") else s
+            for s in sources
+        ]
+        self.cap = self.sources[0]
+        self.streams = []
+        # 記録とプレビューは 1 台目のカメラだけ
+        self.recorder = recorder
+        self.preview = preview
+        self.tracer = tracer
+        # MouthRoiTracker (複数カメラならカメラごとのリスト) を渡すと口まわりの切り出しだけを分類する
+        self.roi = roi
+        # InferenceScheduler を渡すと状態に応じて推論頻度を下げる (None なら毎フレーム)
+        self.scheduler = scheduler
+        self.on_stream_event = on_stream_event
+        # MotionGate を渡すとフレームが変わっていないときは分類せず前回の結果を使う (カメラごとに複製する)
+        self.motion_gate = motion_gate
+        # recording_started を立てたカメラ
+        self.active_stream = None
+        # OPEN ごとに増やすエピソード番号。end_episode() はこの番号のエピソードがまだ続いているときだけ効く
+        self.episode = 0
+        self._episode_lock = threading.Lock()
+        self._recording_started = None
+        # end_episode() の要求 (状態のリセットは検出スレッドで行う)
+        self._end_requested = threading.Event()
+        self._end_episode = 0
+
+        self.ticks = 0
+        self.frames = 0
 
         self._load_model()
 
     def _load_model(self):
-        model_path_obj = Path(self.model_path)
+        if isinstance(self.backend, InferenceBackend):
+            # 作成済みのバックエンド (シミュレーション用など) をそのまま使う
+            self.model = self.backend
+            if self.cap is None:
+                self._open_cameras()
+            self._make_streams()
+            return True
+
+        model_path_obj = resolve_model_path(self.backend, self.model_path)
         if not model_path_obj.exists():
-            print(f"Model not found: {self.model_path}")
+            print(f"Model not found: {model_path_obj}")
             print(f"Current directory: {Path.cwd()}")
             return False
 
-        self.model = YOLO(str(model_path_obj))
-        print(f"Model loaded from: {model_path_obj}")
-        print(f"Opening camera index: {self.camera_index}")
-        self.cap = cv2.VideoCapture(self.camera_index)
-        self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.camera_width)
-        self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.camera_height)
-        if not self.cap.isOpened():
-            print(f"Failed to open camera {self.camera_index}")
-        else:
-            print(
-                f"Camera {self.camera_index} opened successfully ({self.camera_width}x{self.camera_height})"
-            )
+        self.model = make_backend(
+            self.backend, str(model_path_obj), self.imgsz, self.num_threads
+        )
+        print(f"Model loaded from: {self.model.model_path} ({self.model.name}, imgsz {self.model.imgsz})")
+        if self.cap is None:
+            self._open_cameras()
+        self._make_streams()
         return True
 
+    def _open_cameras(self):
+        self.sources = []
+        for camera_index in self.camera_indices:
+            print(f"Opening camera index: {camera_index}")
+            cap = FrameGrabber.open(
+                camera_index, self.camera_width, self.camera_height, name=f"camera-{camera_index}"
+            )
+            if not cap.isOpened():
+                print(f"Failed to open camera {camera_index}")
+            else:
+                cap.start()
+                print(
+                    f"Camera {camera_index} opened successfully ({self.camera_width}x{self.camera_height})"
+                )
+            self.sources.append(cap)
+        self.cap = self.sources[0]
+
+    def _make_streams(self):
+        if isinstance(self.roi, (list, tuple)):
+            rois = self.roi
+        else:
+            rois = [
+                (self.roi if i == 0 else self.roi.clone()) if self.roi else None
+                for i in range(len(self.sources))
+            ]
+        gates = [
+            (self.motion_gate if i == 0 else self.motion_gate.clone()) if self.motion_gate else None
+            for i in range(len(self.sources))
+        ]
+        self.streams = [
+            MouthStream(i, cap, roi, gate)
+            for i, (cap, roi, gate) in enumerate(zip(self.sources, rois, gates))
+        ]
+
+    def _collect(self):
+        """新しいフレームが来ているカメラを集める。1 台も無ければ少しだけ待つ"""
+        batch = []
+        for stream in self.streams:
+            if not stream.cap.running:
+                continue
+            frame, frame_time, seq = stream.cap.read_latest(stream.frame_seq, timeout=0)
+            if frame is not None:
+                stream.frame_seq = seq
+                batch.append((stream, frame, frame_time))
+        if batch:
+            return batch
+
+        running = [stream for stream in self.streams if stream.cap.running]
+        if not running:
+            return None
+        # 1 台なら従来どおりフレームを待ち、複数台なら順番に短く待つ
+        stream = running[self.ticks % len(running)]
+        timeout = 0.5 if len(self.streams) == 1 else 0.01
+        frame, frame_time, seq = stream.cap.read_latest(stream.frame_seq, timeout=timeout)
+        if frame is not None:
+            stream.frame_seq = seq
+            batch.append((stream, frame, frame_time))
+        return batch
+
+    def _scheduled_engine(self):
+        """推論頻度は一番注目すべきカメラ (最も高いレートを要求するもの) に合わせる"""
+        engines = [stream.engine for stream in self.streams]
+        if len(engines) == 1:
+            return engines[0]
+        return max(engines, key=lambda e: self.scheduler.rates[self.scheduler.select_mode(e)])
+
     def detect_mouth_state(
         self, events: dict, recording_started: threading.Event, on_chip_confirmed=None
     ):
+        self._recording_started = recording_started
         if self.model is None:
             self._fallback_timer(events, recording_started)
             return
 
-        chip_first_detected_time = None
-        chip_confirmed = False
-        chip_confirmed_time = None
-        last_logged_state = None
-        log_interval = 0.5  # 0.5秒ごとにログ出力
+        for stream in self.streams:
+            stream.engine = mouth_state.MouthStateEngine(
+                self.model.names, clock=time.monotonic, **self.state_config
+            )
+        self.state_engine = self.streams[0].engine
+        multi = len(self.streams) > 1
 
         while not events.get("stop_monitor", False):
-            if not self.cap.isOpened():
+            # 推論が終わった時点で各カメラの一番新しいフレームを取る (古いフレームは捨てる)
+            batch = self._collect()
+            if batch is None:
                 break
-
-            ret, frame = self.cap.read()
-            if not ret:
-                time.sleep(0.1)
+            if not batch:
                 continue
+            if self._end_requested.is_set():
+                self._end_requested.clear()
+                with self._episode_lock:
+                    if self._end_episode == self.episode:
+                        self._reset_episode()
 
-            try:
-                results = self.model(frame, verbose=False)
-
-                if hasattr(results[0], "probs"):
-                    probs = results[0].probs
-                    top_class = probs.top1
-                    confidence = probs.top1conf.item()
-                    class_name = self.model.names[top_class].lower()
-
-                    # リアルタイムログ出力
-                    current_state = f"{class_name} ({confidence:.2f})"
-                    if current_state != last_logged_state:
-                        print(f"[状態] {current_state}")
-                        last_logged_state = current_state
-
-                    # 映像に状態を表示
-                    status_text = f"{class_name.upper()} ({confidence:.2f})"
-                    color = (
-                        (0, 255, 0)
-                        if "open" in class_name
-                        else (0, 165, 255) if "chip" in class_name else (0, 0, 255)
-                    )
-                    cv2.putText(
-                        frame,
-                        status_text,
-                        (10, 50),
-                        cv2.FONT_HERSHEY_SIMPLEX,
-                        1.5,
-                        color,
-                        3,
-                    )
+            if self.scheduler:
+                self.scheduler.begin()
 
-                    if recording_started.is_set():
-                        cv2.putText(
-                            frame,
-                            "RECORDING",
-                            (10, 120),
-                            cv2.FONT_HERSHEY_SIMPLEX,
-                            1.5,
-                            (0, 0, 255),
-                            3,
+            try:
+                inference_start = time.monotonic()
+                inputs, targets = [], []
+                for stream, frame, frame_time in batch:
+                    # 前回からほとんど変わっていないフレームは分類しない
+                    skip = stream.gate and not stream.gate.check(frame, frame_time)
+                    if skip and stream.last_prediction is not None:
+                        continue
+                    if stream.roi:
+                        crop, stream.last_box = stream.roi.crop(frame)
+                        inputs.append(crop)
+                    else:
+                        inputs.append(frame)
+                        stream.last_box = None
+                    targets.append(stream)
+                if inputs:
+                    for stream, prediction in zip(targets, self.model.predict_batch(inputs)):
+                        stream.last_prediction = prediction
+                    self.ticks += 1
+                    self.frames += len(inputs)
+                    if self.tracer:
+                        for stream, _, frame_time in batch:
+                            if stream in targets:
+                                self.tracer.record("frame_age", inference_start - frame_time)
+                        self.tracer.record(
+                            "inference", time.monotonic() - inference_start, inference_start
                         )
+                        if multi:
+                            self.tracer.gauge("inference_batch", len(inputs))
+                predictions = [stream.last_prediction for stream, _, _ in batch]
+                boxes = [stream.last_box for stream, _, _ in batch]
 
-                    if "open" in class_name and not recording_started.is_set():
-                        print(f"[OPEN detected] confidence: {confidence:.2f}")
-                        recording_started.set()
-                        chip_first_detected_time = None
-                        chip_confirmed = False
-
-                    elif "chip" in class_name and recording_started.is_set():
-                        if chip_first_detected_time is None:
-                            chip_first_detected_time = time.time()
-                            print(f"[CHIP detected] confidence: {confidence:.2f}")
-                        elif not chip_confirmed:
-                            elapsed = time.time() - chip_first_detected_time
-                            if elapsed >= 3:
-                                chip_confirmed = True
-                                chip_confirmed_time = time.time()
-                                print("[CHIP confirmed]")
-                                if on_chip_confirmed:
-                                    on_chip_confirmed()
-
-                    elif recording_started.is_set() and "chip" not in class_name:
-                        if chip_first_detected_time is not None and not chip_confirmed:
-                            chip_first_detected_time = None
-
-                    if chip_confirmed and chip_confirmed_time is not None:
-                        elapsed_since_confirmed = time.time() - chip_confirmed_time
-                        if elapsed_since_confirmed >= 2:
-                            print("[Stop recording]")
-                            events["exit_early"] = True
-                            recording_started.clear()
-                            chip_first_detected_time = None
-                            chip_confirmed = False
-                            chip_confirmed_time = None
-
-                # 映像を表示
-                cv2.imshow("Mouth Detection", frame)
-                if cv2.waitKey(1) & 0xFF == ord("q"):
+                for (stream, frame, frame_time), prediction, roi_box in zip(batch, predictions, boxes):
+                    self._dispatch(
+                        stream, frame, frame_time, prediction, roi_box,
+                        events, recording_started, on_chip_confirmed, multi,
+                    )
+
+                if self.preview and self.preview.quit_requested:
                     break
 
             except Exception as e:
                 print(f"Detection error: {e}")
 
-            time.sleep(0.1)
+            if self.scheduler:
+                self._wait(self.scheduler.end(self._scheduled_engine()), events)
 
-        if self.cap:
-            self.cap.release()
-        cv2.destroyAllWindows()
+        for stream in self.streams:
+            if stream.cap:
+                print(f"[Camera {stream.index} stats] {stream.cap.stats()}")
+            if stream.roi:
+                print(f"[ROI {stream.index} stats] {stream.roi.stats()}")
+            if stream.gate:
+                print(f"[Motion gate {stream.index} stats] {stream.gate.stats()}")
+        if multi:
+            print(f"[Batch stats] {self.stats()}")
+        if self.scheduler:
+            print(f"[Scheduler stats] {self.scheduler.stats()}")
+        for stream in self.streams:
+            if stream.cap:
+                stream.cap.release()
+        if self.recorder:
+            self.recorder.close()
+        if self.preview:
+            self.preview.close()
+
+    def _dispatch(
+        self, stream, frame, frame_time, prediction, roi_box,
+        events, recording_started, on_chip_confirmed, multi,
+    ):
+        class_name, confidence, probs = prediction
+        stream.frames += 1
+        prefix = f"[cam{stream.index}]" if multi else ""
+        if self.recorder and stream.index == 0:
+            self.recorder.write(frame, frame_time, stream.frame_seq, probs)
+
+        # リアルタイムログ出力
+        current_state = f"{class_name} ({confidence:.2f})"
+        if current_state != stream.last_logged_state:
+            print(f"{prefix}[状態] {current_state}")
+            stream.last_logged_state = current_state
+
+        # 撮影時刻で状態を更新する (推論時間に左右されない)
+        for event in stream.engine.update(probs, frame_time):
+            if self.on_stream_event:
+                self.on_stream_event(stream.index, event, prediction)
+
+            if event == mouth_state.EVENT_OPEN:
+                print(f"{prefix}[OPEN detected] confidence: {confidence:.2f}")
+                if self.active_stream is None:
+                    self.active_stream = stream.index
+                    # recording_started を見た側が open_frame を読むので、先に mark する
+                    # (DetectorProcess でも mark のメッセージが flag より先に届く)
+                    if self.tracer:
+                        self.tracer.mark("open_frame", frame_time)
+                    with self._episode_lock:
+                        self.episode += 1
+                        recording_started.set()
+                    if self.tracer:
+                        self.tracer.since("open_frame", "open_to_set")
+                continue
+            # エピソードを始めたカメラ以外は recording_started / exit_early を動かさない
+            if stream.index != self.active_stream:
+                continue
+            if event == mouth_state.EVENT_CHIP_DETECTED:
+                print(f"{prefix}[CHIP detected] confidence: {confidence:.2f}")
+            elif event == mouth_state.EVENT_CHIP_CONFIRMED:
+                print(f"{prefix}[CHIP confirmed]")
+                if self.tracer:
+                    self.tracer.mark("chip_confirmed")
+                if on_chip_confirmed:
+                    on_chip_confirmed()
+            elif event == mouth_state.EVENT_STOP:
+                print(f"{prefix}[Stop recording]")
+                events["exit_early"] = True
+                recording_started.clear()
+                self.active_stream = None
+
+        # 描画・表示は別スレッド (ヘッドレス時は何もしない)
+        if self.preview and stream.index == 0:
+            self.preview.publish(
+                frame,
+                class_name,
+                confidence,
+                recording_started.is_set(),
+                roi_box,
+            )
+
+    def end_episode(self, episode: int):
+        """
+        エピソードの録画が終わったときに、そのエピソードを始めた OPEN の番号 (self.episode) を渡して呼ぶ。
+        口の STOP 以外 (アームの停止・時間切れ) で終わっていたら recording_started を下ろし、
+        状態判定を待機に戻して次の OPEN から新しいエピソードを始めさせる。
+        すでに次の OPEN が来ていたら (番号が進んでいたら) 何もしない
+        """
+        with self._episode_lock:
+            if episode != self.episode or self._recording_started is None:
+                return
+            self._recording_started.clear()
+            if self.active_stream is not None:
+                self._end_episode = episode
+                self._end_requested.set()
+
+    def _reset_episode(self):
+        for stream in self.streams:
+            if stream.engine is not None:
+                stream.engine.reset()
+        self.active_stream = None
+
+    def stats(self) -> dict:
+        return {
+            "ticks": self.ticks,
+            "frames": self.frames,
+            "mean_batch": self.frames / self.ticks if self.ticks else 0.0,
+            "per_stream": [stream.frames for stream in self.streams],
+        }
+
+    def _wait(self, delay: float, events: dict):
+        # 終了要求にすぐ反応できるよう細かく分けて待つ
+        deadline = time.monotonic() + delay
+        while not events.get("stop_monitor", False):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            time.sleep(min(remaining, 0.1))
 
     def _fallback_timer(self, events: dict, recording_started: threading.Event):
         time.sleep(3)
-        recording_started.set()
+        with self._episode_lock:
+            self.episode += 1
+            recording_started.set()
         time.sleep(2)
         events["exit_early"] = True
 
@@ -166,21 +403,70 @@ if __name__ == "__main__":
     import argparse
 
     parser = argparse.ArgumentParser(description="Mouth Detection Demo")
-    parser.add_argument("--camera", type=int, default=4, help="Camera index")
+    parser.add_argument(
+        "--camera", type=int, nargs="+", default=[4], help="Camera index (複数指定でバッチ推論)"
+    )
     parser.add_argument(
         "--model",
         type=str,
         default="mouth_classification/mouth_cls_model/weights/best.pt",
         help="Model path",
     )
+    parser.add_argument(
+        "--backend",
+        type=str,
+        default="ultralytics",
+        choices=["auto", "ultralytics", "onnx", "torchscript"],
+        help="Inference backend",
+    )
+    parser.add_argument(
+        "--motion-gate", action="store_true", help="変化の無いフレームの分類をスキップする"
+    )
+    parser.add_argument(
+        "--record", type=str, default=None, help="セッションを .mouthrec に記録する"
+    )
+    parser.add_argument(
+        "--replay", type=str, default=None, help="カメラの代わりに .mouthrec を再生する"
+    )
+    parser.add_argument(
+        "--realtime", action="store_true", help="記録時のタイミングで再生する"
+    )
+    parser.add_argument(
+        "--preview",
+        type=str,
+        default="window",
+        choices=["none", "window", "mjpeg"],
+        help="プレビュー表示 (none でヘッドレス)",
+    )
     args = parser.parse_args()
 
-    detector = MouthDetector(model_path=args.model, camera_index=args.camera)
+    try:
+        from yolo.replay import ReplaySource, SessionRecorder
+    except ImportError:
+        from replay import ReplaySource, SessionRecorder
+
+    source = ReplaySource(args.replay, realtime=args.realtime) if args.replay else None
+    detector = MouthDetector(
+        model_path=args.model,
+        camera_index=args.camera if len(args.camera) > 1 else args.camera[0],
+        backend=args.backend,
+        source=source,
+        preview=make_preview(args.preview),
+        motion_gate=MotionGate() if args.motion_gate else None,
+    )
+    if args.record and detector.model is not None:
+        detector.recorder = SessionRecorder(
+            args.record,
+            detector.model.names,
+            camera_index=args.camera[0],
+            backend=args.backend,
+        )
 
     events = {"stop_monitor": False}
     recording_started = threading.Event()
 
-    print("Press 'q' in the window to quit")
+    if args.preview == "window":
+        print("Press 'q' in the window to quit")
     print("Waiting for mouth detection...")
 
     detector.detect_mouth_state(events, recording_started)
@@ -0,0 +1,155 @@
+"""
+口まわりの ROI を検出・追跡して、分類器には小さな正方形の切り出しだけを渡す
+
+検出: OpenCV 付属の顔 Haar cascade (縮小したグレースケール画像で実行) から口の位置を推定
+追跡: 前フレームの位置周辺をテンプレートマッチング。スコアが下がったら再検出する
+
+注意: 分類モデルは ROI の切り出し画像で学習したものを使うこと
+(train_mouth_detector.py --collect --roi)。
+"""
+
+import cv2
+
+
+class MouthRoiTracker:
+    def __init__(
+        self,
+        min_score: float = 0.6,
+        redetect_interval: int = 30,
+        margin: float = 0.2,
+        search_margin: float = 0.5,
+        detect_width: int = 320,
+        cascade_path: str = None,
+    ):
+        """
+        Args:
+            min_score: テンプレートマッチングのスコアがこれを下回ったら再検出
+            redetect_interval: 追跡中でもこのフレーム数ごとに再検出
+            margin: 口の矩形を正方形にしたあと周囲に足す割合
+            search_margin: 追跡時に前回位置の周囲を探索する割合
+            detect_width: 顔検出を行う画像の幅 (縮小して実行する)
+        """
+        self.min_score = min_score
+        self.redetect_interval = redetect_interval
+        self.margin = margin
+        self.search_margin = search_margin
+        self.detect_width = detect_width
+        cascade_path = cascade_path or (
+            cv2.data.haarcascades + "haarcascade_frontalface_default.xml"
+        )
+        self.cascade_path = cascade_path
+        self.cascade = cv2.CascadeClassifier(cascade_path)
+        if self.cascade.empty():
+            raise ValueError(f"Failed to load cascade: {cascade_path}")
+
+        self.box = None
+        self.score = 0.0
+        self._template = None
+        self._since_detect = 0
+
+        self.detections = 0
+        self.detect_failures = 0
+        self.tracked = 0
+        self.lost = 0
+
+    def clone(self) -> "MouthRoiTracker":
+        """同じ設定の新しいトラッカー (カメラごとに 1 つ持たせる)"""
+        return MouthRoiTracker(
+            self.min_score,
+            self.redetect_interval,
+            self.margin,
+            self.search_margin,
+            self.detect_width,
+            self.cascade_path,
+        )
+
+    def reset(self):
+        self.box = None
+        self.score = 0.0
+        self._template = None
+        # 次のフレームで必ず検出し直す
+        self._since_detect = self.redetect_interval
+
+    def _square(self, x, y, w, h, frame_w, frame_h):
+        side = int(max(w, h) * (1 + self.margin))
+        side = min(side, frame_w, frame_h)
+        cx, cy = x + w / 2, y + h / 2
+        left = int(min(max(cx - side / 2, 0), frame_w - side))
+        top = int(min(max(cy - side / 2, 0), frame_h - side))
+        return left, top, side, side
+
+    def _detect(self, gray):
+        frame_h, frame_w = gray.shape[:2]
+        scale = min(1.0, self.detect_width / frame_w)
+        small = (
+            cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+            if scale < 1.0
+            else gray
+        )
+        faces = self.cascade.detectMultiScale(
+            small, scaleFactor=1.15, minNeighbors=4, minSize=(40, 40)
+        )
+        if len(faces) == 0:
+            self.detect_failures += 1
+            return None
+        fx, fy, fw, fh = max(faces, key=lambda f: f[2] * f[3])
+        fx, fy, fw, fh = (v / scale for v in (fx, fy, fw, fh))
+        # 顔矩形の下側 (鼻の下〜あご) を口の領域とみなす
+        box = self._square(
+            fx + 0.2 * fw, fy + 0.6 * fh, 0.6 * fw, 0.4 * fh, frame_w, frame_h
+        )
+        self.detections += 1
+        return box
+
+    def _track(self, gray):
+        x, y, w, h = self.box
+        frame_h, frame_w = gray.shape[:2]
+        pad_x, pad_y = int(w * self.search_margin), int(h * self.search_margin)
+        left, top = max(x - pad_x, 0), max(y - pad_y, 0)
+        right, bottom = min(x + w + pad_x, frame_w), min(y + h + pad_y, frame_h)
+        search = gray[top:bottom, left:right]
+        if search.shape[0] < h or search.shape[1] < w:
+            return None, 0.0
+        result = cv2.matchTemplate(search, self._template, cv2.TM_CCOEFF_NORMED)
+        _, score, _, loc = cv2.minMaxLoc(result)
+        return (left + loc[0], top + loc[1], w, h), score
+
+    def locate(self, frame):
+        """フレーム中の口の ROI (x, y, w, h) を返す。見つからなければ None"""
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+        if self.box is not None and self._since_detect < self.redetect_interval:
+            box, score = self._track(gray)
+            self._since_detect += 1
+            if box is not None and score >= self.min_score:
+                self.box, self.score = box, score
+                self.tracked += 1
+                return self.box
+            self.lost += 1
+
+        box = self._detect(gray)
+        self._since_detect = 0
+        if box is None:
+            # 顔が見つからない間は直前の位置を使い続ける
+            return self.box
+        x, y, w, h = box
+        self.box, self.score = box, 1.0
+        self._template = gray[y : y + h, x : x + w].copy()
+        return self.box
+
+    def crop(self, frame):
+        """(切り出し画像, box) を返す。ROI が無いときはフレーム全体"""
+        box = self.locate(frame)
+        if box is None:
+            return frame, None
+        x, y, w, h = box
+        return frame[y : y + h, x : x + w], box
+
+    def stats(self) -> dict:
+        return {
+            "detections": self.detections,
+            "detect_failures": self.detect_failures,
+            "tracked": self.tracked,
+            "lost": self.lost,
+            "score": round(self.score, 3),
+        }
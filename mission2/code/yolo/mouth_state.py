@@ -0,0 +1,145 @@
+"""
+口の状態 (open / chip / close) から録画の開始・終了を決める状態機械
+
+カメラやモデルに依存しない純粋なクラスなので、clock を差し替えれば
+合成した確率列をそのまま流してテスト・ベンチマークできる。
+"""
+
+import math
+import time
+
+IDLE = "idle"
+RECORDING = "recording"
+CHIP = "chip"
+CONFIRMED = "confirmed"
+
+EVENT_OPEN = "open"
+EVENT_CHIP_DETECTED = "chip_detected"
+EVENT_CHIP_LOST = "chip_lost"
+EVENT_CHIP_CONFIRMED = "chip_confirmed"
+EVENT_STOP = "stop"
+
+
+class MouthStateEngine:
+    def __init__(
+        self,
+        class_names,
+        clock=time.monotonic,
+        smoothing_tau: float = 0.15,
+        open_on: float = 0.7,
+        open_off: float = 0.4,
+        open_dwell: float = 0.0,
+        chip_on: float = 0.6,
+        chip_off: float = 0.3,
+        chip_dwell: float = 3.0,
+        stop_delay: float = 2.0,
+        max_step: float = 0.1,
+    ):
+        """
+        Args:
+            class_names: モデルのクラス名 ("open" / "chip" を含む名前で判定)
+            clock: 現在時刻 (秒) を返す関数
+            smoothing_tau: EMA の時定数 (秒)。0 で平滑化なし
+            open_on / open_off: 録画開始のしきい値と再アームのしきい値
+            open_dwell: open がこの秒数続いたら録画開始
+            chip_on / chip_off: チップ検出のしきい値と解除のしきい値
+            chip_dwell: チップがこの秒数続いたら確定
+            stop_delay: 確定からこの秒数後に録画終了
+            max_step: EMA の 1 回の更新で考慮する最大の経過時間 (秒)。
+                推論を間引いたときに 1 フレームの重みが大きくなりすぎないようにする
+        """
+        names = [n.lower() for n in class_names]
+        self.open_index = next(i for i, n in enumerate(names) if "open" in n)
+        self.chip_index = next(i for i, n in enumerate(names) if "chip" in n)
+        self.num_classes = len(names)
+
+        self.clock = clock
+        self.smoothing_tau = smoothing_tau
+        self.open_on = open_on
+        self.open_off = open_off
+        self.open_dwell = open_dwell
+        self.chip_on = chip_on
+        self.chip_off = chip_off
+        self.chip_dwell = chip_dwell
+        self.stop_delay = stop_delay
+        self.max_step = max_step
+
+        self.reset()
+
+    def reset(self):
+        self.state = IDLE
+        self.smoothed = None
+        self.open_armed = True
+        self._last_time = None
+        self._open_since = None
+        self._chip_since = None
+        self._confirmed_at = None
+
+    @property
+    def recording(self) -> bool:
+        return self.state != IDLE
+
+    def _smooth(self, probs, now):
+        if self.smoothed is None or self.smoothing_tau <= 0:
+            self.smoothed = [float(probs[i]) for i in range(self.num_classes)]
+        else:
+            dt = min(max(now - self._last_time, 0.0), self.max_step)
+            alpha = 1.0 - math.exp(-dt / self.smoothing_tau)
+            for i in range(self.num_classes):
+                self.smoothed[i] += alpha * (float(probs[i]) - self.smoothed[i])
+        self._last_time = now
+        return self.smoothed
+
+    def update(self, probs, now: float = None) -> list:
+        """
+        1 フレーム分の確率を入力し、このフレームで発生したイベントのリストを返す。
+        """
+        if now is None:
+            now = self.clock()
+        smoothed = self._smooth(probs, now)
+        p_open = smoothed[self.open_index]
+        p_chip = smoothed[self.chip_index]
+        events = []
+
+        if self.state == IDLE:
+            if not self.open_armed:
+                # 前回のエピソード後は一度 open が下がるまで再開しない
+                if p_open < self.open_off:
+                    self.open_armed = True
+            elif p_open >= self.open_on:
+                if self._open_since is None:
+                    self._open_since = now
+                if now - self._open_since >= self.open_dwell:
+                    self.state = RECORDING
+                    self._open_since = None
+                    self._chip_since = None
+                    self.open_armed = False
+                    events.append(EVENT_OPEN)
+            elif p_open < self.open_off:
+                self._open_since = None
+
+        elif self.state == RECORDING:
+            if p_chip >= self.chip_on:
+                self.state = CHIP
+                self._chip_since = now
+                events.append(EVENT_CHIP_DETECTED)
+
+        elif self.state == CHIP:
+            if p_chip < self.chip_off:
+                self.state = RECORDING
+                self._chip_since = None
+                events.append(EVENT_CHIP_LOST)
+            elif now - self._chip_since >= self.chip_dwell:
+                self.state = CONFIRMED
+                self._confirmed_at = now
+                events.append(EVENT_CHIP_CONFIRMED)
+
+        if self.state == CONFIRMED and now - self._confirmed_at >= self.stop_delay:
+            self.state = IDLE
+            self._chip_since = None
+            self._confirmed_at = None
+            if p_open < self.open_off:
+                self.open_armed = True
+            events.append(EVENT_STOP)
+
+        return events
@@ -0,0 +1,180 @@
+"""
+検出結果のプレビュー表示
+
+検出ループは publish() で最新フレームを渡すだけで、描画・表示は別スレッドが
+max_fps を上限に行う。publish() はブロックせず、間引かれたフレームはコピーもしない。
+"""
+
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cv2
+
+
+class Preview:
+    def __init__(self, max_fps: float = 10.0):
+        self.min_interval = 1.0 / max_fps if max_fps > 0 else 0.0
+        self.quit_requested = False
+        self.published = 0
+        self.rendered = 0
+
+        self._latest = None
+        self._last_publish = 0.0
+        self._cond = threading.Condition()
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="preview", daemon=True)
+        self._thread.start()
+
+    def publish(
+        self, frame, class_name: str, confidence: float, recording: bool, box=None
+    ):
+        now = time.monotonic()
+        if now - self._last_publish < self.min_interval:
+            return
+        self._last_publish = now
+        with self._cond:
+            self._latest = (frame.copy(), class_name, confidence, recording, box)
+            self.published += 1
+            self._cond.notify()
+
+    def _run(self):
+        while self._running:
+            with self._cond:
+                while self._latest is None and self._running:
+                    self._cond.wait(0.5)
+                item, self._latest = self._latest, None
+            if item is None:
+                continue
+            frame = self.render(*item)
+            self.show(frame)
+            self.rendered += 1
+        self.cleanup()
+
+    @staticmethod
+    def render(frame, class_name, confidence, recording, box=None):
+        if box is not None:
+            x, y, w, h = box
+            cv2.rectangle(frame, (x, y), (x + w, y + h), (255, 255, 0), 2)
+        # 映像に状態を表示
+        status_text = f"{class_name.upper()} ({confidence:.2f})"
+        color = (
+            (0, 255, 0)
+            if "open" in class_name
+            else (0, 165, 255) if "chip" in class_name else (0, 0, 255)
+        )
+        cv2.putText(
+            frame, status_text, (10, 50), cv2.FONT_HERSHEY_SIMPLEX, 1.5, color, 3
+        )
+        if recording:
+            cv2.putText(
+                frame,
+                "RECORDING",
+                (10, 120),
+                cv2.FONT_HERSHEY_SIMPLEX,
+                1.5,
+                (0, 0, 255),
+                3,
+            )
+        return frame
+
+    def show(self, frame):
+        raise NotImplementedError
+
+    def cleanup(self):
+        pass
+
+    def close(self):
+        self._running = False
+        with self._cond:
+            self._cond.notify()
+        self._thread.join(timeout=1.0)
+
+
+class WindowPreview(Preview):
+    def __init__(self, max_fps: float = 10.0, window_name: str = "Mouth Detection"):
+        self.window_name = window_name
+        super().__init__(max_fps)
+
+    def show(self, frame):
+        cv2.imshow(self.window_name, frame)
+        if cv2.waitKey(1) & 0xFF == ord("q"):
+            self.quit_requested = True
+
+    def cleanup(self):
+        # 複数ステーションでは他のステーションのウィンドウが残っているので、自分のものだけ閉じる
+        if self.rendered:
+            cv2.destroyWindow(self.window_name)
+
+
+class MjpegPreview(Preview):
+    """http://127.0.0.1:<port>/ で MJPEG ストリームを配信する"""
+
+    def __init__(self, max_fps: float = 10.0, host: str = "127.0.0.1", port: int = 8090):
+        self._jpeg = None
+        self._jpeg_cond = threading.Condition()
+        preview = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                self.send_response(200)
+                self.send_header(
+                    "Content-Type", "multipart/x-mixed-replace; boundary=frame"
+                )
+                self.end_headers()
+                last = None
+                try:
+                    while preview._running:
+                        with preview._jpeg_cond:
+                            preview._jpeg_cond.wait_for(
+                                lambda: preview._jpeg is not last or not preview._running,
+                                timeout=1.0,
+                            )
+                            jpeg = last = preview._jpeg
+                        if jpeg is None:
+                            continue
+                        self.wfile.write(
+                            b"--frame\r\nContent-Type: image/jpeg\r\n"
+                            + f"Content-Length: {len(jpeg)}\r\n\r\n".encode()
+                            + jpeg
+                            + b"\r\n"
+                        )
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(
+            target=self.server.serve_forever, name="preview-http", daemon=True
+        ).start()
+        print(f"Preview: http://{host}:{port}/")
+        super().__init__(max_fps)
+
+    def show(self, frame):
+        ok, jpeg = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, 70])
+        if ok:
+            with self._jpeg_cond:
+                self._jpeg = jpeg.tobytes()
+                self._jpeg_cond.notify_all()
+
+    def cleanup(self):
+        with self._jpeg_cond:
+            self._jpeg_cond.notify_all()
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def make_preview(
+    mode: str, max_fps: float = 10.0, port: int = 8090, window_name: str = "Mouth Detection"
+):
+    """mode: "none" (ヘッドレス) | "window" | "mjpeg" """
+    if mode in (None, "none"):
+        return None
+    if mode == "window":
+        return WindowPreview(max_fps, window_name)
+    if mode == "mjpeg":
+        return MjpegPreview(max_fps, port=port)
+    raise ValueError(f"Unknown preview mode: {mode}")
@@ -0,0 +1,211 @@
+"""
+口カメラ映像の記録と再生
+
+.mouthrec ファイル形式:
+    MAGIC (8 bytes) | header_len (u32) | header (JSON)
+    以降フレームごとに:
+        timestamp (f64) | seq (u32) | num_probs (u16) | jpeg_len (u32)
+        | probs (float32 x num_probs) | jpeg
+
+SessionRecorder で書き出し、ReplaySource を MouthDetector の source に渡すと
+cv2.VideoCapture / FrameGrabber の代わりに再生できる。
+"""
+
+import json
+import queue
+import struct
+import threading
+import time
+
+import cv2
+import numpy as np
+
+MAGIC = b"MOUTHREC"
+RECORD = struct.Struct("<dIHI")
+
+
+class SessionRecorder:
+    def __init__(
+        self,
+        path: str,
+        class_names=(),
+        jpeg_quality: int = 85,
+        max_queue: int = 64,
+        **metadata,
+    ):
+        self.path = str(path)
+        self.jpeg_quality = jpeg_quality
+        self.written = 0
+        self.dropped = 0
+
+        self._file = open(self.path, "wb")
+        header = json.dumps(
+            {"class_names": list(class_names), "created": time.time(), **metadata}
+        ).encode()
+        self._file.write(MAGIC + struct.pack("<I", len(header)) + header)
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = threading.Thread(
+            target=self._run, name="session-recorder", daemon=True
+        )
+        self._thread.start()
+
+    def write(self, frame, timestamp: float, seq: int, probs=None):
+        """フレームをコピーしてキューに積む (エンコードは別スレッド)"""
+        probs = np.asarray(probs if probs is not None else (), dtype=np.float32)
+        try:
+            self._queue.put_nowait((frame.copy(), timestamp, seq, probs))
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        params = [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality]
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            frame, timestamp, seq, probs = item
+            ok, jpeg = cv2.imencode(".jpg", frame, params)
+            if not ok:
+                self.dropped += 1
+                continue
+            self._file.write(RECORD.pack(timestamp, seq, len(probs), len(jpeg)))
+            self._file.write(probs.tobytes())
+            self._file.write(jpeg.tobytes())
+            self.written += 1
+
+    def close(self):
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+        self._file.close()
+        print(f"[Recorder] {self.written} frames -> {self.path} (dropped {self.dropped})")
+
+
+def read_session(path: str):
+    """(header, [(timestamp, seq, probs, jpeg_bytes), ...]) を返す"""
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"Not a mouth recording: {path}")
+        (header_len,) = struct.unpack("<I", f.read(4))
+        header = json.loads(f.read(header_len))
+        records = []
+        while True:
+            raw = f.read(RECORD.size)
+            if len(raw) < RECORD.size:
+                break
+            timestamp, seq, num_probs, jpeg_len = RECORD.unpack(raw)
+            probs = np.frombuffer(f.read(4 * num_probs), dtype=np.float32)
+            jpeg = f.read(jpeg_len)
+            if len(jpeg) < jpeg_len:
+                break
+            records.append((timestamp, seq, probs, jpeg))
+    return header, records
+
+
+class ReplaySource:
+    """
+    記録したセッションを再生する。
+
+    realtime=False: 全フレームを順番に最速で返す (フレーム落ちなし・決定的)
+    realtime=True: 記録時のタイミングを再現し、間に合わないフレームは捨てる
+    """
+
+    def __init__(self, path: str, realtime: bool = False, loop: bool = False):
+        self.path = str(path)
+        self.realtime = realtime
+        self.loop = loop
+        self.header, self.records = read_session(self.path)
+        self.class_names = self.header.get("class_names", [])
+
+        self._index = 0
+        self._start_wall = None
+        self._time_offset = 0.0
+        self._running = bool(self.records)
+        self.last_probs = None
+
+        self.delivered = 0
+        self.dropped = 0
+
+    def __len__(self):
+        return len(self.records)
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    def isOpened(self) -> bool:
+        return self._running
+
+    def start(self):
+        return self
+
+    def set(self, prop, value):
+        return False
+
+    def release(self):
+        self._running = False
+
+    def stop(self):
+        self._running = False
+
+    def _next_index(self):
+        if self._index >= len(self.records):
+            if not self.loop:
+                return None
+            # ループ再生でも時刻が巻き戻らないようにずらす
+            first, last = self.records[0][0], self.records[-1][0]
+            self._time_offset += last - first + (last - first) / max(len(self.records) - 1, 1)
+            self._index = 0
+            self._start_wall = None
+
+        if not self.realtime:
+            return self._index
+
+        first = self.records[0][0]
+        if self._start_wall is None:
+            self._start_wall = time.monotonic() - (self.records[self._index][0] - first)
+        # 次のフレームの撮影時刻まで待つ
+        due = self._start_wall + (self.records[self._index][0] - first)
+        delay = due - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        # 処理が遅れていれば、今の時刻までに撮影済みの最新フレームへ飛ばす
+        elapsed = time.monotonic() - self._start_wall
+        index = self._index
+        while (
+            index + 1 < len(self.records)
+            and self.records[index + 1][0] - first <= elapsed
+        ):
+            index += 1
+        self.dropped += index - self._index
+        return index
+
+    def read_latest(self, last_seq: int = 0, timeout: float = 1.0):
+        index = self._next_index() if self._running else None
+        if index is None:
+            self._running = False
+            return None, 0.0, last_seq
+
+        timestamp, seq, probs, jpeg = self.records[index]
+        self._index = index + 1
+        frame = cv2.imdecode(np.frombuffer(jpeg, dtype=np.uint8), cv2.IMREAD_COLOR)
+        self.last_probs = probs
+        self.delivered += 1
+        # ループ再生でも単調増加するシーケンス番号を返す
+        return frame, timestamp + self._time_offset, self.delivered
+
+    def read(self, image=None):
+        frame, _, _ = self.read_latest()
+        return frame is not None, frame
+
+    def stats(self) -> dict:
+        return {
+            "captured": len(self.records),
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+            "stale": 0,
+            "read_failures": 0,
+        }
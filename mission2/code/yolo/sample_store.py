@@ -0,0 +1,210 @@
+"""
+学習用サンプルのシャード化ストア
+
+<root>/
+    store.json              クラス名・画像サイズ・シャードごとの件数・split の seed
+    images_00000.npy        (shard_size, H, W, 3) uint8  (np.load(mmap_mode="r") で読める)
+    labels_00000.npy        (shard_size,) int16
+    splits_00000.npy        (shard_size,) uint8  0 = train, 1 = val
+
+train / val の割り当てはサンプル番号と seed のハッシュで決まるので、
+あとからサンプルを追加しても既存サンプルの split は変わらない。
+"""
+
+import json
+import queue
+import threading
+import zlib
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+TRAIN = 0
+VAL = 1
+
+
+def assign_split(index: int, seed: int, val_ratio: float) -> int:
+    h = zlib.crc32(f"{seed}:{index}".encode()) % 10000
+    return VAL if h < val_ratio * 10000 else TRAIN
+
+
+class SampleStore:
+    def __init__(self, root: str):
+        self.root = Path(root)
+        with open(self.root / "store.json") as f:
+            self.meta = json.load(f)
+        self.class_names = self.meta["class_names"]
+        self.image_shape = tuple(self.meta["image_shape"])
+        self.shard_size = self.meta["shard_size"]
+        self.counts = self.meta["counts"]
+
+    @classmethod
+    def create(
+        cls,
+        root: str,
+        class_names,
+        image_shape,
+        shard_size: int = 512,
+        val_ratio: float = 0.2,
+        seed: int = 0,
+    ):
+        root = Path(root)
+        root.mkdir(parents=True, exist_ok=True)
+        meta_path = root / "store.json"
+        if not meta_path.exists():
+            meta = {
+                "class_names": list(class_names),
+                "image_shape": list(image_shape),
+                "shard_size": shard_size,
+                "val_ratio": val_ratio,
+                "seed": seed,
+                "counts": [],
+            }
+            with open(meta_path, "w") as f:
+                json.dump(meta, f, indent=2)
+        store = cls(root)
+        if store.class_names != list(class_names):
+            raise ValueError(f"Class names mismatch: {store.class_names} != {list(class_names)}")
+        if store.image_shape != tuple(image_shape):
+            # 違うサイズ (--roi の有無やカメラ解像度の違い) のサンプルを同じストアに混ぜない
+            raise ValueError(f"Image shape mismatch: {store.image_shape} != {tuple(image_shape)} in {root}")
+        return store
+
+    def __len__(self):
+        return sum(self.counts)
+
+    def _path(self, kind: str, shard: int) -> Path:
+        return self.root / f"{kind}_{shard:05d}.npy"
+
+    def shard(self, shard: int):
+        """(images, labels, splits) を mmap で返す (有効な件数で切り詰め済み)"""
+        count = self.counts[shard]
+        images = np.load(self._path("images", shard), mmap_mode="r")[:count]
+        labels = np.load(self._path("labels", shard), mmap_mode="r")[:count]
+        splits = np.load(self._path("splits", shard), mmap_mode="r")[:count]
+        return images, labels, splits
+
+    def iter_shards(self):
+        for shard in range(len(self.counts)):
+            yield self.shard(shard)
+
+    def labels(self) -> np.ndarray:
+        return np.concatenate([labels for _, labels, _ in self.iter_shards()] or [np.zeros(0, np.int16)])
+
+    def splits(self) -> np.ndarray:
+        return np.concatenate([splits for _, _, splits in self.iter_shards()] or [np.zeros(0, np.uint8)])
+
+    def class_counts(self) -> dict:
+        labels = self.labels()
+        return {name: int((labels == i).sum()) for i, name in enumerate(self.class_names)}
+
+    def export_folders(self, out_dir: str):
+        """Ultralytics の分類形式 (train/<class>/*.jpg, val/<class>/*.jpg) に書き出す"""
+        out_dir = Path(out_dir)
+        index = 0
+        for images, labels, splits in self.iter_shards():
+            for image, label, split in zip(images, labels, splits):
+                subset = "val" if split == VAL else "train"
+                class_dir = out_dir / subset / self.class_names[label]
+                class_dir.mkdir(parents=True, exist_ok=True)
+                cv2.imwrite(str(class_dir / f"{index:06d}.jpg"), np.asarray(image))
+                index += 1
+        return out_dir
+
+
+class SampleWriter:
+    """
+    フレームを SampleStore に追記する。書き込み位置は呼び出し側で即座に決め、
+    リサイズと mmap へのコピーはワーカースレッドで行う。
+    """
+
+    def __init__(self, store: SampleStore, workers: int = 2, max_queue: int = 256):
+        self.store = store
+        self.meta = store.meta
+        self._lock = threading.Lock()
+        self._shards = {}
+        self._queue = queue.Queue(maxsize=max_queue)
+        self.written = 0
+        self.dropped = 0
+
+        if not self.meta["counts"]:
+            self.meta["counts"].append(0)
+        self._threads = [
+            threading.Thread(target=self._run, name=f"sample-writer-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def _open_shard(self, shard: int):
+        if shard in self._shards:
+            return self._shards[shard]
+        h, w, c = self.store.image_shape
+        size = self.store.shard_size
+        arrays = []
+        for kind, shape, dtype in (
+            ("images", (size, h, w, c), np.uint8),
+            ("labels", (size,), np.int16),
+            ("splits", (size,), np.uint8),
+        ):
+            path = self.store._path(kind, shard)
+            if path.exists():
+                arrays.append(np.load(path, mmap_mode="r+"))
+            else:
+                arrays.append(
+                    np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=shape)
+                )
+        self._shards[shard] = arrays
+        return arrays
+
+    def _allocate(self):
+        counts = self.meta["counts"]
+        if counts[-1] >= self.store.shard_size:
+            counts.append(0)
+        shard = len(counts) - 1
+        slot = counts[-1]
+        counts[-1] += 1
+        global_index = shard * self.store.shard_size + slot
+        return shard, slot, global_index
+
+    def submit(self, frame, label: int) -> bool:
+        """フレームをコピーしてキューに積む。キューが一杯なら捨てて False"""
+        if self._queue.full():
+            self.dropped += 1
+            return False
+        with self._lock:
+            shard, slot, global_index = self._allocate()
+            arrays = self._open_shard(shard)
+        self._queue.put((arrays, slot, global_index, frame.copy(), label))
+        return True
+
+    def _run(self):
+        h, w, _ = self.store.image_shape
+        val_ratio, seed = self.meta["val_ratio"], self.meta["seed"]
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            (images, labels, splits), slot, global_index, frame, label = item
+            if frame.shape[:2] != (h, w):
+                frame = cv2.resize(frame, (w, h), interpolation=cv2.INTER_AREA)
+            images[slot] = frame
+            labels[slot] = label
+            splits[slot] = assign_split(global_index, seed, val_ratio)
+            with self._lock:
+                self.written += 1
+
+    def close(self):
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        for arrays in self._shards.values():
+            for array in arrays:
+                array.flush()
+        if self.meta["counts"] and self.meta["counts"][-1] == 0:
+            self.meta["counts"].pop()
+        with open(self.store.root / "store.json", "w") as f:
+            json.dump(self.meta, f, indent=2)
+        self.store.counts = self.meta["counts"]
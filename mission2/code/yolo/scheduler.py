@@ -0,0 +1,90 @@
+"""
+MouthStateEngine の状態に合わせて推論の頻度を切り替えるスケジューラ
+
+- 待機中 (IDLE) / エピソード中 (RECORDING, CONFIRMED): 低頻度
+- 口が開きかけている / チップが見えかけている / チップ確定待ち (CHIP): カメラのフルレート
+
+「開きかけ」「見えかけ」は平滑化後の確率が suspect_threshold を超えたかで判定する。
+cpu_budget を指定すると、推論時間 / 周期 がその割合を超えないよう周期を伸ばす。
+"""
+
+import time
+
+try:
+    from yolo import mouth_state
+except ImportError:
+    import mouth_state
+
+IDLE = "idle"
+EPISODE = "episode"
+ACTIVE = "active"
+
+
+class InferenceScheduler:
+    def __init__(
+        self,
+        idle_fps: float = 5.0,
+        episode_fps: float = 3.0,
+        active_fps: float = 30.0,
+        suspect_threshold: float = 0.2,
+        cpu_budget: float = None,
+        clock=time.monotonic,
+    ):
+        """
+        Args:
+            idle_fps: OPEN 待ちの推論頻度
+            episode_fps: エピソード中 (チップの兆候なし) の推論頻度
+            active_fps: 遷移しそうなときの推論頻度 (カメラ FPS 以上なら毎フレーム)
+            suspect_threshold: open / chip の確率がこれを超えたらフルレートにする
+            cpu_budget: 検出スレッドが使ってよい CPU 1 コアあたりの割合 (例: 0.5)
+        """
+        self.rates = {IDLE: idle_fps, EPISODE: episode_fps, ACTIVE: active_fps}
+        self.suspect_threshold = suspect_threshold
+        self.cpu_budget = cpu_budget
+        self.clock = clock
+
+        self.mode = ACTIVE
+        self.inference_time = 0.0
+        self._last_start = None
+        self.ticks = {IDLE: 0, EPISODE: 0, ACTIVE: 0}
+
+    def select_mode(self, engine) -> str:
+        if engine is None or engine.smoothed is None:
+            return ACTIVE
+        p_open = engine.smoothed[engine.open_index]
+        p_chip = engine.smoothed[engine.chip_index]
+        if engine.state == mouth_state.IDLE:
+            suspected = engine.open_armed and p_open >= self.suspect_threshold
+            return ACTIVE if suspected else IDLE
+        if engine.state == mouth_state.CHIP:
+            return ACTIVE
+        if engine.state == mouth_state.RECORDING and p_chip >= self.suspect_threshold:
+            return ACTIVE
+        return EPISODE
+
+    def interval(self) -> float:
+        interval = 1.0 / self.rates[self.mode]
+        if self.cpu_budget:
+            interval = max(interval, self.inference_time / self.cpu_budget)
+        return interval
+
+    def begin(self):
+        """推論の直前に呼ぶ"""
+        self._last_start = self.clock()
+
+    def end(self, engine):
+        """推論と状態更新のあとに呼び、次の推論までの待ち時間 (秒) を返す"""
+        now = self.clock()
+        elapsed = now - self._last_start
+        # 推論時間は EMA で平滑化しておく
+        self.inference_time += 0.2 * (elapsed - self.inference_time)
+        self.mode = self.select_mode(engine)
+        self.ticks[self.mode] += 1
+        return max(self.interval() - elapsed, 0.0)
+
+    def stats(self) -> dict:
+        return {
+            "mode": self.mode,
+            "ticks": dict(self.ticks),
+            "inference_ms": round(self.inference_time * 1000, 2),
+        }
@@ -0,0 +1,269 @@
+"""
+プロセス間でカメラフレームを受け渡す共有メモリのリングバッファ
+
+親プロセスの ShmFrameWriter がカメラから共有メモリのスロットへ直接読み込み
+(cap.read(dst) に共有メモリ上の配列を渡すのでコピーしない)、
+検出プロセスの ShmFrameReader が FrameGrabber と同じ read_latest() で最新スロットを参照する。
+
+スロットの受け渡しは FrameGrabber のトリプルバッファと同じ考え方で、
+書き込み側は「最新」と「読み出し側が保持中」のスロットを避けて書く。
+ヘッダの更新だけを multiprocessing.Condition で保護し、画素データはロックの外で読み書きする。
+
+共有メモリのレイアウト:
+    header  int64[4]      最新スロット, 読み出し中スロット, 書き込み側が動作中か, 予約
+    seqs    int64[slots]  スロットごとのシーケンス番号
+    stamps  float64[slots] スロットごとの撮影時刻 (time.monotonic, プロセス間で共通)
+    images  uint8[slots, H, W, 3]  (64 バイト境界から)
+"""
+
+import multiprocessing
+import threading
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+LATEST = 0
+HELD = 1
+RUNNING = 2
+HEADER_SIZE = 4
+
+
+class ShmFrameRing:
+    def __init__(self, shape, slots: int = 4, name: str = None, create: bool = False, cond=None):
+        if slots < 3:
+            raise ValueError("ShmFrameRing needs at least 3 slots")
+        self.shape = tuple(shape)
+        self.slots = slots
+        header_bytes = 8 * (HEADER_SIZE + 2 * slots)
+        header_bytes = (header_bytes + 63) // 64 * 64
+        frame_bytes = int(np.prod(self.shape))
+        size = header_bytes + slots * frame_bytes
+
+        self.shm = shared_memory.SharedMemory(name=name, create=create, size=size if create else 0)
+        self.name = self.shm.name
+        buf = self.shm.buf
+        self.header = np.ndarray((HEADER_SIZE,), np.int64, buf, 0)
+        self.seqs = np.ndarray((slots,), np.int64, buf, 8 * HEADER_SIZE)
+        self.stamps = np.ndarray((slots,), np.float64, buf, 8 * (HEADER_SIZE + slots))
+        self.images = np.ndarray((slots, *self.shape), np.uint8, buf, header_bytes)
+        self.cond = cond if cond is not None else multiprocessing.get_context("spawn").Condition()
+
+        if create:
+            self.header[:] = (-1, -1, 1, 0)
+            self.seqs[:] = 0
+            self.stamps[:] = 0.0
+
+    @classmethod
+    def create(cls, shape, slots: int = 4):
+        return cls(shape, slots, create=True)
+
+    @classmethod
+    def attach(cls, spec: dict):
+        return cls(spec["shape"], spec["slots"], name=spec["name"], cond=spec["cond"])
+
+    def spec(self) -> dict:
+        """子プロセスに渡す情報 (Process の引数として渡せばロックも共有される)"""
+        return {"name": self.name, "shape": self.shape, "slots": self.slots, "cond": self.cond}
+
+    def reset_sync(self):
+        """
+        ロックを作り直す。ロックを持ったまま子プロセスが落ちた場合に備え、
+        子プロセスを再起動するときに呼ぶ。
+        """
+        self.cond = multiprocessing.get_context("spawn").Condition()
+        self.header[HELD] = -1
+
+    @property
+    def running(self) -> bool:
+        return bool(self.header[RUNNING])
+
+    def close(self):
+        self.header = self.seqs = self.stamps = self.images = None
+        try:
+            self.shm.close()
+        except BufferError:
+            # 返したフレーム (ビュー) がまだ参照されている。プロセス終了時に解放される
+            pass
+
+    def unlink(self):
+        try:
+            self.shm.unlink()
+        except FileNotFoundError:
+            pass
+
+
+class ShmFrameWriter:
+    """FrameGrabber と同じくカメラを別スレッドで読み続け、共有メモリのリングに直接書き込む"""
+
+    def __init__(self, cap, ring: ShmFrameRing, name: str = "shm-frame-writer", lock_timeout: float = 0.5):
+        self.cap = cap
+        self.ring = ring
+        self.name = name
+        self.lock_timeout = lock_timeout
+        self._seq = 0
+        self._running = False
+        self._thread = None
+
+        self.captured = 0
+        self.read_failures = 0
+        self.lock_timeouts = 0
+
+    def start(self):
+        if self._thread is not None:
+            return self
+        self._running = True
+        self.ring.header[RUNNING] = 1
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+        self._publish_stopped()
+
+    def release(self):
+        self.stop()
+        if self.cap is not None:
+            self.cap.release()
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    def _publish_stopped(self):
+        if self.ring.header is None:
+            return
+        cond = self.ring.cond
+        if cond.acquire(timeout=self.lock_timeout):
+            try:
+                self.ring.header[RUNNING] = 0
+                cond.notify_all()
+            finally:
+                cond.release()
+        else:
+            self.ring.header[RUNNING] = 0
+
+    def _free_slot(self) -> int:
+        latest, held = self.ring.header[LATEST], self.ring.header[HELD]
+        for slot in range(self.ring.slots):
+            if slot != latest and slot != held:
+                return slot
+        return 0
+
+    def _run(self):
+        ring = self.ring
+        while self._running:
+            cond = ring.cond
+            if not cond.acquire(timeout=self.lock_timeout):
+                self.lock_timeouts += 1
+                continue
+            try:
+                slot = self._free_slot()
+            finally:
+                cond.release()
+
+            target = ring.images[slot]
+            ret, frame = self.cap.read(target)
+            timestamp = time.monotonic()
+            if not ret:
+                self.read_failures += 1
+                if not self.cap.isOpened():
+                    break
+                time.sleep(0.005)
+                continue
+            if frame is not None and not np.shares_memory(frame, target):
+                # 解像度がリングと違うなどで cv2 が別の配列を返した場合だけコピーする
+                if frame.shape != target.shape:
+                    raise ValueError(f"Frame shape {frame.shape} != ring shape {target.shape}")
+                np.copyto(target, frame)
+
+            cond = ring.cond
+            if not cond.acquire(timeout=self.lock_timeout):
+                self.lock_timeouts += 1
+                continue
+            try:
+                self._seq += 1
+                self.captured += 1
+                ring.seqs[slot] = self._seq
+                ring.stamps[slot] = timestamp
+                ring.header[LATEST] = slot
+                cond.notify_all()
+            finally:
+                cond.release()
+
+        self._running = False
+        self._publish_stopped()
+
+    def stats(self) -> dict:
+        return {
+            "captured": self.captured,
+            "read_failures": self.read_failures,
+            "lock_timeouts": self.lock_timeouts,
+        }
+
+
+class ShmFrameReader:
+    """
+    検出プロセス側。FrameGrabber と同じインターフェースで、返すフレームは共有メモリ上のビュー
+    (次の read_latest() を呼ぶまで書き込み側は上書きしない)
+    """
+
+    def __init__(self, ring: ShmFrameRing, stale_after: float = 0.2):
+        self.ring = ring
+        self.stale_after = stale_after
+        self.delivered = 0
+        self.dropped = 0
+        self.stale = 0
+        self.last_age = 0.0
+
+    def isOpened(self) -> bool:
+        return self.ring.header is not None
+
+    def start(self):
+        return self
+
+    def stop(self):
+        pass
+
+    def release(self):
+        self.ring.close()
+
+    @property
+    def running(self) -> bool:
+        return self.ring.header is not None and self.ring.running
+
+    def read_latest(self, last_seq: int = 0, timeout: float = 1.0):
+        ring = self.ring
+        deadline = time.monotonic() + timeout
+        with ring.cond:
+            while True:
+                latest = ring.header[LATEST]
+                if latest >= 0 and ring.seqs[latest] > last_seq:
+                    break
+                remaining = deadline - time.monotonic()
+                if not ring.header[RUNNING] or remaining <= 0:
+                    return None, 0.0, last_seq
+                ring.cond.wait(remaining)
+            ring.header[HELD] = latest
+            seq = int(ring.seqs[latest])
+            timestamp = float(ring.stamps[latest])
+
+        if last_seq and seq > last_seq + 1:
+            self.dropped += seq - last_seq - 1
+        self.delivered += 1
+        self.last_age = time.monotonic() - timestamp
+        if self.last_age > self.stale_after:
+            self.stale += 1
+        return ring.images[latest], timestamp, seq
+
+    def stats(self) -> dict:
+        return {
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+            "stale": self.stale,
+            "last_age_ms": self.last_age * 1000,
+        }
@@ -0,0 +1,374 @@
+"""
+口の状態分類モデル用の前処理済み学習キャッシュ
+
+収集した画像を一度だけデコードし、推論時と同じ前処理 (backends.resize_rgb: 中央切り出し -> imgsz にリサイズ -> RGB)
+をかけた uint8 配列として保存する。学習・評価はこの配列を mmap で読むだけなので、
+エポックごとの JPEG デコードとリサイズが無くなる。
+
+<cache>/
+    cache.json      クラス名・画像サイズ・有効件数・重複除去の結果
+    images.npy      (N, 3, imgsz, imgsz) uint8 RGB
+    labels.npy      (N,) int16
+    splits.npy      (N,) uint8  0 = train, 1 = val
+
+数秒おきに撮った似たフレームは、クラスごとに 64bit の差分ハッシュ (dHash) を比べて
+ハミング距離が hash_threshold 以下なら重複として除く。
+"""
+
+import json
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+try:
+    from yolo.backends import resize_rgb
+    from yolo.sample_store import TRAIN, VAL, SampleStore, assign_split
+except ImportError:
+    from backends import resize_rgb
+    from sample_store import TRAIN, VAL, SampleStore, assign_split
+
+IMAGE_SUFFIXES = (".jpg", ".jpeg", ".png")
+
+# 1 バイトごとの立っているビット数
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def dhash(rgb: np.ndarray) -> np.ndarray:
+    """HWC RGB 画像の 64bit 差分ハッシュを (8,) uint8 で返す"""
+    gray = cv2.cvtColor(rgb, cv2.COLOR_RGB2GRAY)
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+    return np.packbits(small[:, 1:] > small[:, :-1])
+
+
+def hamming(hashes: np.ndarray, h: np.ndarray) -> np.ndarray:
+    """(K, 8) のハッシュ群と (8,) のハッシュのハミング距離"""
+    return _POPCOUNT[np.bitwise_xor(hashes, h)].sum(axis=1)
+
+
+def _iter_store(root: Path, class_names):
+    """SampleStore の画像を (BGR 画像, ラベル, split) で返す"""
+    store = SampleStore(root)
+    mapping = [class_names.index(name) for name in store.class_names]
+    for images, labels, splits in store.iter_shards():
+        for image, label, split in zip(images, labels, splits):
+            yield np.asarray(image), mapping[label], int(split)
+
+
+def _iter_folders(root: Path, class_names, val_ratio: float, seed: int):
+    """
+    <root>/<class>/*.jpg または <root>/{train,val}/<class>/*.jpg を読む。
+    train/val に分かれていなければ assign_split で割り当てる。
+    """
+    if (root / "train").is_dir():
+        subsets = [(root / "train", TRAIN), (root / "val", VAL)]
+    else:
+        subsets = [(root, None)]
+
+    index = 0
+    for subset_dir, split in subsets:
+        for label, name in enumerate(class_names):
+            class_dir = subset_dir / name
+            if not class_dir.is_dir():
+                continue
+            for path in sorted(class_dir.iterdir()):
+                if path.suffix.lower() not in IMAGE_SUFFIXES:
+                    continue
+                image = cv2.imread(str(path))
+                if image is None:
+                    print(f"[TrainCache] 読み込めません: {path}")
+                    continue
+                yield image, label, assign_split(index, seed, val_ratio) if split is None else split
+                index += 1
+
+
+def _count_source(root: Path) -> int:
+    if (root / "store.json").exists():
+        return len(SampleStore(root))
+    return sum(1 for p in root.rglob("*") if p.suffix.lower() in IMAGE_SUFFIXES)
+
+
+class TrainCache:
+    def __init__(self, root: str):
+        self.root = Path(root)
+        with open(self.root / "cache.json") as f:
+            self.meta = json.load(f)
+        self.class_names = self.meta["class_names"]
+        self.imgsz = self.meta["imgsz"]
+        count = self.meta["count"]
+        self.images = np.load(self.root / "images.npy", mmap_mode="r")[:count]
+        self.labels = np.load(self.root / "labels.npy", mmap_mode="r")[:count]
+        self.splits = np.load(self.root / "splits.npy", mmap_mode="r")[:count]
+
+    def __len__(self):
+        return len(self.labels)
+
+    def indices(self, split: int = None) -> np.ndarray:
+        if split is None:
+            return np.arange(len(self))
+        return np.flatnonzero(self.splits == split)
+
+    def class_counts(self, split: int = None) -> dict:
+        labels = np.asarray(self.labels)[self.indices(split)]
+        return {name: int((labels == i).sum()) for i, name in enumerate(self.class_names)}
+
+    def report(self):
+        train, val = self.class_counts(TRAIN), self.class_counts(VAL)
+        total = max(len(self), 1)
+        print(f"[TrainCache] {self.root}: {len(self)} 枚 ({self.imgsz}x{self.imgsz})")
+        print(f"[TrainCache] {'class':<8}{'train':>7}{'val':>7}{'ratio':>8}{'dup':>6}")
+        for name in self.class_names:
+            n = train[name] + val[name]
+            dup = self.meta["duplicates"].get(name, 0)
+            print(f"[TrainCache] {name:<8}{train[name]:>7}{val[name]:>7}{n / total:>8.1%}{dup:>6}")
+
+    @classmethod
+    def build(
+        cls,
+        source: str,
+        out_dir: str,
+        class_names,
+        imgsz: int = 224,
+        hash_threshold: int = 4,
+        val_ratio: float = 0.2,
+        seed: int = 0,
+    ):
+        """
+        source (SampleStore のディレクトリ、またはクラス別フォルダ) からキャッシュを作る
+
+        Args:
+            hash_threshold: 同じクラスの既存画像とのハミング距離がこれ以下なら重複として捨てる (負なら除去しない)
+        """
+        source, out_dir = Path(source), Path(out_dir)
+        class_names = list(class_names)
+        out_dir.mkdir(parents=True, exist_ok=True)
+
+        if (source / "store.json").exists():
+            samples = _iter_store(source, class_names)
+        else:
+            samples = _iter_folders(source, class_names, val_ratio, seed)
+
+        capacity = _count_source(source)
+        images = np.lib.format.open_memmap(
+            out_dir / "images.npy", mode="w+", dtype=np.uint8, shape=(max(capacity, 1), 3, imgsz, imgsz)
+        )
+        labels = np.lib.format.open_memmap(
+            out_dir / "labels.npy", mode="w+", dtype=np.int16, shape=(max(capacity, 1),)
+        )
+        splits = np.lib.format.open_memmap(
+            out_dir / "splits.npy", mode="w+", dtype=np.uint8, shape=(max(capacity, 1),)
+        )
+
+        hashes = {label: np.zeros((0, 8), dtype=np.uint8) for label in range(len(class_names))}
+        duplicates = {name: 0 for name in class_names}
+        resized = np.empty((imgsz, imgsz, 3), dtype=np.uint8)
+        rgb = np.empty((imgsz, imgsz, 3), dtype=np.uint8)
+        count = 0
+        start = time.monotonic()
+
+        for image, label, split in samples:
+            if count >= capacity:
+                break
+            resize_rgb(image, imgsz, resized, rgb)
+
+            h = dhash(rgb)
+            known = hashes[label]
+            if hash_threshold >= 0 and len(known) and hamming(known, h).min() <= hash_threshold:
+                duplicates[class_names[label]] += 1
+                continue
+            hashes[label] = np.vstack([known, h])
+
+            images[count] = rgb.transpose(2, 0, 1)
+            labels[count] = label
+            splits[count] = split
+            count += 1
+
+        for array in (images, labels, splits):
+            array.flush()
+        del images, labels, splits
+
+        meta = {
+            "class_names": class_names,
+            "imgsz": imgsz,
+            "count": count,
+            "source": str(source),
+            "hash_threshold": hash_threshold,
+            "duplicates": duplicates,
+        }
+        with open(out_dir / "cache.json", "w") as f:
+            json.dump(meta, f, indent=2)
+
+        print(
+            f"[TrainCache] {count} 枚をキャッシュ, 重複 {sum(duplicates.values())} 枚を除去 "
+            f"({time.monotonic() - start:.1f}s)"
+        )
+        cache = cls(out_dir)
+        cache.report()
+        return cache
+
+
+def _batches(indices: np.ndarray, batch_size: int):
+    for i in range(0, len(indices), batch_size):
+        # mmap の読み出しが連続するよう、バッチ内は番号順に並べる
+        yield np.sort(indices[i : i + batch_size])
+
+
+def train_from_cache(
+    cache_dir: str,
+    epochs: int = 50,
+    batch_size: int = 32,
+    lr: float = 1e-3,
+    base_model: str = "yolov8n-cls.pt",
+    project: str = "mouth_classification",
+    name: str = "mouth_cls_model",
+    num_threads: int = None,
+    seed: int = 0,
+):
+    """
+    キャッシュから yolov8n-cls を学習する。重みは Ultralytics と同じ形式
+    (<project>/<name>/weights/best.pt) で保存するので、YOLO(best.pt) やバックエンドからそのまま読める。
+    """
+    import copy
+
+    import torch
+    from ultralytics import YOLO
+    from ultralytics.nn.tasks import ClassificationModel
+
+    if num_threads:
+        torch.set_num_threads(num_threads)
+    torch.manual_seed(seed)
+    rng = np.random.default_rng(seed)
+
+    cache = TrainCache(cache_dir)
+    cache.report()
+    train_idx, val_idx = cache.indices(TRAIN), cache.indices(VAL)
+    if not len(train_idx):
+        raise ValueError(f"No training samples in {cache_dir}")
+
+    model = YOLO(base_model).model
+    ClassificationModel.reshape_outputs(model, len(cache.class_names))
+    model.names = dict(enumerate(cache.class_names))
+    model.float()
+    for p in model.parameters():
+        p.requires_grad_(True)
+
+    optimizer = torch.optim.AdamW(model.parameters(), lr=lr, weight_decay=5e-4)
+    scheduler = torch.optim.lr_scheduler.CosineAnnealingLR(optimizer, T_max=epochs)
+    loss_fn = torch.nn.CrossEntropyLoss()
+
+    weights_dir = Path(project) / name / "weights"
+    weights_dir.mkdir(parents=True, exist_ok=True)
+    train_args = {
+        "task": "classify",
+        "model": base_model,
+        "data": str(cache_dir),
+        "epochs": epochs,
+        "batch": batch_size,
+        "imgsz": cache.imgsz,
+    }
+    best_acc = -1.0
+
+    def save(path, epoch, acc):
+        torch.save(
+            {
+                "epoch": epoch,
+                "best_fitness": acc,
+                "model": copy.deepcopy(model).half(),
+                "train_args": train_args,
+                "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            },
+            path,
+        )
+
+    for epoch in range(epochs):
+        model.train()
+        start = time.monotonic()
+        total_loss = 0.0
+        for idx in _batches(rng.permutation(train_idx), batch_size):
+            x = torch.from_numpy(cache.images[idx]).float().div_(255.0)
+            y = torch.from_numpy(cache.labels[idx].astype(np.int64))
+            # 軽いデータ拡張: 左右反転と明るさ
+            flip = torch.from_numpy(rng.random(len(idx)) < 0.5)
+            x[flip] = x[flip].flip(-1)
+            gain = torch.from_numpy(rng.uniform(0.8, 1.2, (len(idx), 1, 1, 1)).astype(np.float32))
+            x = (x * gain).clamp_(0.0, 1.0)
+
+            optimizer.zero_grad()
+            loss = loss_fn(model(x), y)
+            loss.backward()
+            optimizer.step()
+            total_loss += loss.item() * len(idx)
+        scheduler.step()
+
+        model.eval()
+        correct = 0
+        with torch.inference_mode():
+            for idx in _batches(val_idx, batch_size * 2):
+                x = torch.from_numpy(cache.images[idx]).float().div_(255.0)
+                pred = model(x)
+                pred = pred[0] if isinstance(pred, (list, tuple)) else pred
+                correct += int((pred.argmax(1).numpy() == cache.labels[idx]).sum())
+        acc = correct / len(val_idx) if len(val_idx) else 0.0
+
+        print(
+            f"[Train] epoch {epoch + 1}/{epochs} loss {total_loss / len(train_idx):.4f} "
+            f"val_acc {acc:.3f} ({time.monotonic() - start:.1f}s)"
+        )
+        save(weights_dir / "last.pt", epoch, acc)
+        if acc > best_acc:
+            best_acc = acc
+            save(weights_dir / "best.pt", epoch, acc)
+
+    print(f"\nトレーニング完了! (val_acc {best_acc:.3f})")
+    print(f"モデル保存先: {weights_dir / 'best.pt'}")
+    return weights_dir / "best.pt"
+
+
+def evaluate(backend, cache_dir: str, split: int = VAL, batch_size: int = 32) -> dict:
+    """
+    キャッシュの画像をそのまま backend.infer に渡して正解率と混同行列を返す
+
+    backend.preprocess と同じ前処理を済ませてあるので、推論時と同じ入力で評価できる。
+    """
+    cache = TrainCache(cache_dir)
+    if cache.imgsz != backend.imgsz:
+        raise ValueError(f"Cache imgsz {cache.imgsz} != backend imgsz {backend.imgsz}")
+    missing = [n for n in cache.class_names if n not in backend.names]
+    if missing:
+        raise ValueError(f"Classes {missing} not in model names {backend.names}")
+    # モデルの出力順 -> キャッシュのラベル番号
+    to_cache = np.array([cache.class_names.index(n) if n in cache.class_names else -1 for n in backend.names])
+
+    n = len(cache.class_names)
+    confusion = np.zeros((n, n), dtype=np.int64)
+    indices = cache.indices(split)
+    batch = np.empty((batch_size, 3, cache.imgsz, cache.imgsz), dtype=np.float32)
+    start = time.monotonic()
+    for idx in _batches(indices, batch_size):
+        x = batch[: len(idx)]
+        np.multiply(cache.images[idx], 1.0 / 255.0, out=x)
+        pred = to_cache[backend.infer(x).argmax(axis=1)]
+        for truth, p in zip(cache.labels[idx], pred):
+            if p >= 0:
+                confusion[truth, p] += 1
+    elapsed = time.monotonic() - start
+
+    total = max(int(confusion.sum()), 1)
+    result = {
+        "samples": len(indices),
+        "accuracy": float(np.trace(confusion)) / total,
+        "per_class": {
+            name: float(confusion[i, i]) / max(int(confusion[i].sum()), 1)
+            for i, name in enumerate(cache.class_names)
+        },
+        "confusion": confusion.tolist(),
+        "ms_per_image": elapsed * 1000 / max(len(indices), 1),
+    }
+
+    print(f"[Eval] {backend.name} {backend.model_path}: {len(indices)} 枚, accuracy {result['accuracy']:.3f}")
+    print("[Eval] " + " " * 8 + "".join(f"{name:>8}" for name in cache.class_names) + "  recall")
+    for i, name in enumerate(cache.class_names):
+        row = "".join(f"{v:>8}" for v in confusion[i])
+        print(f"[Eval] {name:<8}{row}  {result['per_class'][name]:.3f}")
+    return result
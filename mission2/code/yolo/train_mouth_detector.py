@@ -2,53 +2,141 @@
 口の開閉検出モデルのトレーニングスクリプト
 
 使い方:
-1. データセット収集: python train_mouth_detector.py --collect
+1. データセット収集: python train_mouth_detector.py --collect [--burst 10]
+   (保存先は <dataset>/store。--export-folders で <dataset>/images_split の train/val フォルダに書き出せる)
 2. アノテーション: RoboflowやLabelImgでラベル付け
 3. トレーニング: python train_mouth_detector.py --train
+   (--prepare-cache で前処理済みキャッシュを作ると --train-cls --cache / --eval が使える)
+4. モデル選定: python train_mouth_detector.py --sweep --budget-ms 15 --emit
+5. 書き出し: python train_mouth_detector.py --export
+   (ONNX / int8 ONNX / TorchScript と manifest.json を書き、MOUTH_BACKEND = "auto" で使われる)
 """
 
 import cv2
 import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import argparse
 from ultralytics import YOLO
 import yaml
 
+try:
+    from yolo.mouth_roi import MouthRoiTracker
+    from yolo.sample_store import SampleStore, SampleWriter
+    from yolo import export_model, model_sweep, train_cache
+    from yolo.backends import selected_imgsz
+except ImportError:
+    from mouth_roi import MouthRoiTracker
+    from sample_store import SampleStore, SampleWriter
+    import export_model
+    import model_sweep
+    import train_cache
+    from backends import selected_imgsz
 
-def collect_data(output_dir="yolo/mouth_dataset", num_samples=100, camera_index=5):
-    """カメラから口の画像を収集"""
+
+CLASS_KEYS = {"o": "open", "c": "close", "p": "chip"}
+CLASS_NAMES = ["chip", "close", "open"]  # Ultralytics と同じくフォルダ名のアルファベット順
+EXPORT_DIR = "images_split"  # <dataset>/store を train/val フォルダに書き出す先
+
+
+def export_store(dataset_path) -> Path:
+    """<dataset>/store を <dataset>/images_split に書き出し直す (前回の書き出しは消す)"""
+    dataset_path = Path(dataset_path)
+    store = SampleStore(dataset_path / "store")
+    out_dir = dataset_path / EXPORT_DIR
+    if out_dir.exists():
+        shutil.rmtree(out_dir)
+    store.export_folders(out_dir)
+    print(f"書き出し完了: {out_dir} {store.class_counts()}")
+    return out_dir
+
+
+def collect_data(
+    output_dir="yolo/mouth_dataset",
+    num_samples=100,
+    camera_index=5,
+    roi=False,
+    burst=1,
+    fmt="store",
+    writers=2,
+    roi_size=224,
+):
+    """
+    カメラから口の画像を収集 (roi=True なら口まわりの切り出しを保存)
+
+    キーを押すたびに burst 枚をカメラのフレームレートで連続保存する。
+    保存は別スレッドで行うのでプレビューは止まらない。
+    fmt="store": <output_dir>/store にシャード化した uint8 配列として保存 (sample_store.py)
+    fmt="jpeg": 従来どおり <output_dir>/images/<class>/*.jpg に保存
+    """
     output_dir = Path(output_dir)
-    open_dir = output_dir / "images" / "open"
-    close_dir = output_dir / "images" / "close"
-    chip_dir = output_dir / "images" / "chip"
 
-    open_dir.mkdir(parents=True, exist_ok=True)
-    close_dir.mkdir(parents=True, exist_ok=True)
-    chip_dir.mkdir(parents=True, exist_ok=True)
+    cap = cv2.VideoCapture(camera_index)
+    tracker = MouthRoiTracker() if roi else None
 
-    cap = cv2.VideoCapture(5)
+    if fmt == "store":
+        ret, frame = cap.read()
+        if not ret:
+            print(f"カメラ {camera_index} から読み込めません")
+            return
+        image_shape = (roi_size, roi_size, 3) if roi else frame.shape
+        store = SampleStore.create(output_dir / "store", CLASS_NAMES, image_shape)
+        sample_writer = SampleWriter(store, workers=writers)
+        counts = store.class_counts()
+        pool = None
+    else:
+        for name in CLASS_NAMES:
+            (output_dir / "images" / name).mkdir(parents=True, exist_ok=True)
+        counts = {
+            name: len(list((output_dir / "images" / name).glob("*.jpg")))
+            for name in CLASS_NAMES
+        }
+        pool = ThreadPoolExecutor(max_workers=writers)
 
     print("データ収集モード")
-    print("'o' キー: 口を開けた状態で保存")
-    print("'c' キー: 口を閉じた状態で保存")
-    print("'p' キー: ポテトチップスを咥えた状態で保存")
+    print(f"'o' キー: 口を開けた状態で保存 ({burst} 枚)")
+    print(f"'c' キー: 口を閉じた状態で保存 ({burst} 枚)")
+    print(f"'p' キー: ポテトチップスを咥えた状態で保存 ({burst} 枚)")
     print("'q' キー: 終了")
 
-    open_count = 0
-    close_count = 0
-    chip_count = 0
+    burst_class = None
+    burst_remaining = 0
 
-    while (
-        open_count < num_samples
-        or close_count < num_samples
-        or chip_count < num_samples
-    ):
+    while any(counts[name] < num_samples for name in CLASS_NAMES):
         ret, frame = cap.read()
         if not ret:
             break
 
+        sample = frame
+        if tracker:
+            sample, box = tracker.crop(frame)
+            sample = sample.copy()
+            if box is not None:
+                x, y, w, h = box
+                cv2.rectangle(frame, (x, y), (x + w, y + h), (255, 255, 0), 2)
+
+        # 連写中なら保存 (ファイル書き込みは別スレッド)
+        if burst_remaining > 0 and counts[burst_class] < num_samples:
+            if pool is None:
+                saved = sample_writer.submit(sample, CLASS_NAMES.index(burst_class))
+            else:
+                filename = (
+                    output_dir / "images" / burst_class
+                    / f"{burst_class}_{counts[burst_class]:04d}.jpg"
+                )
+                pool.submit(cv2.imwrite, str(filename), sample.copy())
+                saved = True
+            if saved:
+                counts[burst_class] += 1
+            burst_remaining -= 1
+        else:
+            burst_remaining = 0
+
         # 状態を表示
-        status = f"Open: {open_count}/{num_samples} | Close: {close_count}/{num_samples} | Chip: {chip_count}/{num_samples}"
+        status = " | ".join(
+            f"{name.capitalize()}: {counts[name]}/{num_samples}" for name in ("open", "close", "chip")
+        )
         cv2.putText(
             frame, status, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2
         )
@@ -57,37 +145,25 @@ def collect_data(output_dir="yolo/mouth_dataset", num_samples=100, camera_index=
 
         key = cv2.waitKey(1) & 0xFF
 
-        if key == ord("o") and open_count < num_samples:
-            # 口を開けた画像を保存
-            filename = open_dir / f"open_{open_count:04d}.jpg"
-            cv2.imwrite(str(filename), frame)
-            print(f"保存: {filename}")
-            open_count += 1
-
-        elif key == ord("c") and close_count < num_samples:
-            # 口を閉じた画像を保存
-            filename = close_dir / f"close_{close_count:04d}.jpg"
-            cv2.imwrite(str(filename), frame)
-            print(f"保存: {filename}")
-            close_count += 1
-
-        elif key == ord("p") and chip_count < num_samples:
-            # ポテトチップスを咥えた画像を保存
-            filename = chip_dir / f"chip_{chip_count:04d}.jpg"
-            cv2.imwrite(str(filename), frame)
-            print(f"保存: {filename}")
-            chip_count += 1
-
-        elif key == ord("q"):
+        if key == ord("q"):
             break
+        elif chr(key) in CLASS_KEYS and burst_remaining == 0:
+            burst_class = CLASS_KEYS[chr(key)]
+            burst_remaining = burst
+            print(f"保存: {burst_class} x {burst}")
 
     cap.release()
     cv2.destroyAllWindows()
+    if pool is None:
+        sample_writer.close()
+        print(f"保存先: {store.root} (書き込み {sample_writer.written}, 欠落 {sample_writer.dropped})")
+    else:
+        pool.shutdown(wait=True)
 
     print(f"\nデータ収集完了!")
-    print(f"口を開けた画像: {open_count}枚")
-    print(f"口を閉じた画像: {close_count}枚")
-    print(f"ポテトチップスを咥えた画像: {chip_count}枚")
+    print(f"口を開けた画像: {counts['open']}枚")
+    print(f"口を閉じた画像: {counts['close']}枚")
+    print(f"ポテトチップスを咥えた画像: {counts['chip']}枚")
     print(f"\n次のステップ:")
     print("python train_mouth_detector.py --train-cls でモデルをトレーニング")
 
@@ -180,16 +256,166 @@ def main():
     parser.add_argument(
         "--camera", type=int, default=4, help="使用するカメラインデックス"
     )
+    parser.add_argument(
+        "--roi", action="store_true", help="口まわりの切り出しを収集する"
+    )
+    parser.add_argument(
+        "--burst", type=int, default=1, help="1 回のキー入力で連続保存する枚数"
+    )
+    parser.add_argument(
+        "--format",
+        type=str,
+        default="store",
+        choices=["store", "jpeg"],
+        help="保存形式 (store: シャード化 uint8 配列, jpeg: クラス別フォルダ)",
+    )
+    parser.add_argument(
+        "--export-folders",
+        action="store_true",
+        help="<dataset>/store を Ultralytics の train/val フォルダ形式に書き出す",
+    )
+    parser.add_argument(
+        "--prepare-cache",
+        action="store_true",
+        help="<dataset>/store (なければ <dataset>/images) から前処理・重複除去済みキャッシュを作る",
+    )
+    parser.add_argument(
+        "--cache",
+        type=str,
+        default=None,
+        help="キャッシュのパス (既定: <dataset>/cache)。--train-cls と併用するとキャッシュから学習する",
+    )
+    parser.add_argument(
+        "--hash-threshold",
+        type=int,
+        default=4,
+        help="重複とみなす dHash のハミング距離 (負なら重複除去しない)",
+    )
+    parser.add_argument(
+        "--eval", type=str, default=None, help="キャッシュの val で評価するモデルのパス"
+    )
+    parser.add_argument(
+        "--backend", type=str, default="ultralytics", help="--eval で使う推論バックエンド"
+    )
+    parser.add_argument(
+        "--sweep", action="store_true", help="バックボーン・入力サイズ・エポック数を総当たりで比較する"
+    )
+    parser.add_argument("--sweep-models", nargs="+", default=model_sweep.DEFAULT_MODELS)
+    parser.add_argument("--sweep-imgsz", nargs="+", type=int, default=model_sweep.DEFAULT_IMGSZ)
+    parser.add_argument("--sweep-epochs", nargs="+", type=int, default=model_sweep.DEFAULT_EPOCHS)
+    parser.add_argument("--sweep-workers", type=int, default=2, help="並列に学習する候補の数")
+    parser.add_argument(
+        "--budget-ms", type=float, default=None, help="1 フレームあたりの推論時間 (p99) の上限"
+    )
+    parser.add_argument(
+        "--latency-threads", type=int, default=None, help="推論時間の計測に使うスレッド数"
+    )
+    parser.add_argument(
+        "--emit",
+        nargs="?",
+        const="mouth_classification/mouth_cls_model/weights/best.pt",
+        default=None,
+        help="選んだ重みのコピー先 (既定: MOUTH_MODEL_PATH が指す best.pt)",
+    )
+    parser.add_argument(
+        "--emit-over-budget",
+        action="store_true",
+        help="--budget-ms を満たす候補が無くても最速の候補を --emit で書き出す",
+    )
+    parser.add_argument(
+        "--export",
+        nargs="?",
+        const="mouth_classification/mouth_cls_model/weights/best.pt",
+        default=None,
+        help="学習済みの重みを ONNX / int8 ONNX / TorchScript に書き出し、manifest.json を作る",
+    )
+    parser.add_argument(
+        "--export-formats", nargs="+", default=export_model.DEFAULT_FORMATS, help="書き出す形式"
+    )
+    parser.add_argument(
+        "--max-drop", type=float, default=0.01, help="fp32 からの正解率の低下の許容値"
+    )
+    parser.add_argument(
+        "--calib-count", type=int, default=300, help="int8 量子化の較正に使う画像の枚数"
+    )
 
     args = parser.parse_args()
+    cache_dir = Path(args.cache) if args.cache else Path(args.dataset) / "cache"
 
     if args.collect:
         # データ収集
-        collect_data(args.dataset, args.samples, args.camera)
+        collect_data(
+            args.dataset, args.samples, args.camera, args.roi, args.burst, args.format
+        )
+
+    elif args.export_folders:
+        export_store(args.dataset)
+
+    elif args.prepare_cache:
+        source = Path(args.dataset) / "store"
+        if not source.exists():
+            source = Path(args.dataset) / "images"
+        train_cache.TrainCache.build(
+            source, cache_dir, CLASS_NAMES, hash_threshold=args.hash_threshold
+        )
+
+    elif args.eval:
+        try:
+            from yolo.backends import make_backend
+        except ImportError:
+            from backends import make_backend
+        backend = make_backend(args.backend, args.eval)
+        train_cache.evaluate(backend, cache_dir)
+
+    elif args.export:
+        # --sweep --emit で選んだ重みは、その入力サイズのキャッシュ (スイープが作った cache_<imgsz>) で書き出す
+        imgsz = selected_imgsz(args.export)
+        if imgsz and not args.cache:
+            cache_dir = Path(args.dataset) / f"cache_{imgsz}"
+        if not (cache_dir / "cache.json").exists():
+            source = Path(args.dataset) / "store"
+            if not source.exists():
+                source = Path(args.dataset) / "images"
+            train_cache.TrainCache.build(
+                source, cache_dir, CLASS_NAMES, imgsz=imgsz or 224, hash_threshold=args.hash_threshold
+            )
+        export_model.export(
+            args.export,
+            cache_dir,
+            args.export_formats,
+            max_drop=args.max_drop,
+            calib_count=args.calib_count,
+            num_threads=args.latency_threads,
+        )
+
+    elif args.sweep:
+        source = Path(args.dataset) / "store"
+        if not source.exists():
+            source = Path(args.dataset) / "images"
+        chosen = model_sweep.sweep(
+            source,
+            args.dataset,
+            args.sweep_models,
+            args.sweep_imgsz,
+            args.sweep_epochs,
+            CLASS_NAMES,
+            workers=args.sweep_workers,
+            budget_ms=args.budget_ms,
+            latency_threads=args.latency_threads,
+        )
+        if chosen and args.emit:
+            model_sweep.emit(chosen, args.emit, force=args.emit_over_budget)
+
+    elif args.train_cls and args.cache:
+        train_cache.train_from_cache(cache_dir, args.epochs)
 
     elif args.train_cls:
         # 分類モデルのトレーニング（推奨・簡単）
-        data_dir = Path(args.dataset) / "images"
+        # --format store で集めたデータは train/val フォルダに書き出してから学習する
+        if (Path(args.dataset) / "store").exists():
+            data_dir = export_store(args.dataset)
+        else:
+            data_dir = Path(args.dataset) / "images"
         if not data_dir.exists():
             print(f"エラー: データセットが見つかりません: {data_dir}")
             return
@@ -204,6 +430,11 @@ def main():
         print("使い方:")
         print("  データ収集: python train_mouth_detector.py --collect")
         print("  分類モデル学習: python train_mouth_detector.py --train-cls")
+        print("  キャッシュ作成: python train_mouth_detector.py --prepare-cache")
+        print("  キャッシュから学習: python train_mouth_detector.py --train-cls --cache <dataset>/cache")
+        print("  評価: python train_mouth_detector.py --eval <best.pt>")
+        print("  モデル選定: python train_mouth_detector.py --sweep --budget-ms 15 --emit")
+        print("  書き出し: python train_mouth_detector.py --export [best.pt]")
         print("  検出モデル学習: python train_mouth_detector.py --train-detect")
 
 